@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 from src.graph.workflow import Workflow
+from src.service.client import AnalyticsClient
+from src.utils.context import ConversationContext
 from src.utils.data_loader import data_loader
 from src.config import config
 import plotly.express as px
@@ -40,14 +42,45 @@ st.markdown("""
 # Initialize
 @st.cache_resource
 def init_workflow():
-    """Initialize the workflow (cached)"""
+    """Initialize the workflow (cached); uses the shared analytics service when configured"""
+    if config.ANALYTICS_SERVICE_URL:
+        return AnalyticsClient(config.ANALYTICS_SERVICE_URL)
     return Workflow()
 
 @st.cache_data
 def load_sample_data():
     """Load sample data for display"""
-    df = data_loader.load_data()
-    return df.head(100)
+    return data_loader.get_sample_data(100)
+
+def show_more_rows(rows: dict, key: str):
+    """Row-returning answers only carry their first page; further pages are fetched on demand"""
+    pages = st.session_state.row_pages.setdefault(key, {'data': [], 'next_offset': rows['next_offset']})
+    if pages['data']:
+        st.dataframe(pd.DataFrame(pages['data']), use_container_width=True)
+    if pages['next_offset'] is not None:
+        label = f"Load more rows ({pages['next_offset']:,} of {rows['available_rows']:,} loaded, {rows['total_rows']:,} matched)"
+        if st.button(label, key=f"more_rows_{key}"):
+            page = st.session_state.workflow.fetch_page(rows['cursor'], pages['next_offset'])
+            if page.get('success'):
+                pages['data'].extend(page['data'])
+                pages['next_offset'] = page['next_offset']
+            else:
+                st.error(page.get('error'))
+            st.rerun()
+
+def show_chart(chart: dict, key: str):
+    """Draw the chart spec that came with an answer (already aggregated and downsampled server-side)"""
+    data = pd.DataFrame(chart['data'])
+    if chart['kind'] == 'line':
+        fig = px.line(data, x=chart['x'], y=chart['y'], color=chart.get('color'), title=chart['title'])
+        fig.update_traces(mode='lines+markers' if chart['points'] <= 60 else 'lines')
+    else:
+        # Side by side, not stacked: rates and averages don't add up
+        fig = px.bar(data, x=chart['x'], y=chart['y'], color=chart.get('color'), title=chart['title'], barmode='group')
+    st.plotly_chart(fig, use_container_width=True, key=f"chart_{key}")
+    if chart.get('downsampled'):
+        method = {'lttb': 'LTTB', 'min_max': 'min-max', 'top_n': 'top categories'}.get(chart['downsampled'], chart['downsampled'])
+        st.caption(f"Showing {chart['points']:,} of {chart['source_points']:,} points ({method})")
 
 # Header
 st.markdown('<p class="main-header">💡 PayInsight AI</p>', unsafe_allow_html=True)
@@ -58,13 +91,19 @@ with st.sidebar:
     st.header("📊 Dataset Info")
     
     try:
-        df = data_loader.load_data()
-        st.metric("Total Transactions", f"{len(df):,}")
-        st.metric("Date Range", f"{df.shape[0]} records")
-        st.metric("Columns", df.shape[1])
+        # The profile is computed once per dataset version, so reruns don't rescan the data
+        if config.ANALYTICS_SERVICE_URL:
+            profile = init_workflow().dataset_info()
+        else:
+            profile = data_loader.get_profile()
+        
+        st.metric("Total Transactions", f"{profile['rows']:,}")
+        if profile.get('date_range'):
+            st.metric("Date Range", f"{profile['date_range']['min'][:10]} → {profile['date_range']['max'][:10]}")
+        st.metric("Columns", len(profile['columns']))
         
         with st.expander("View Sample Data"):
-            st.dataframe(df.head(10), use_container_width=True)
+            st.dataframe(pd.DataFrame(profile['sample']), use_container_width=True)
         
         with st.expander("Column Descriptions"):
             for col, desc in config.TRANSACTION_COLUMNS.items():
@@ -94,15 +133,23 @@ with st.sidebar:
 # Initialize session state
 if 'messages' not in st.session_state:
     st.session_state.messages = []
+if 'context' not in st.session_state:
+    st.session_state.context = ConversationContext()
+if 'row_pages' not in st.session_state:
+    st.session_state.row_pages = {}
 if 'workflow' not in st.session_state:
     with st.spinner("Initializing AI agents..."):
         st.session_state.workflow = init_workflow()
     st.success("✅ AI system ready!")
 
 # Display chat history
-for message in st.session_state.messages:
+for i, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("chart"):
+            show_chart(message["chart"], str(i))
+        if message.get("rows"):
+            show_more_rows(message["rows"], str(i))
 
 # Handle selected question from sidebar
 if 'selected_question' in st.session_state:
@@ -122,27 +169,29 @@ if user_input:
     with st.chat_message("assistant"):
         with st.spinner("Analyzing data..."):
             try:
-                # Prepare conversation history
-                conv_history = [
-                    {"question": msg["content"], "response": st.session_state.messages[i+1]["content"]}
-                    for i, msg in enumerate(st.session_state.messages[:-1])
-                    if msg["role"] == "user" and i+1 < len(st.session_state.messages)
-                ]
-                
-                # Run workflow
+                # Run workflow (the session context is updated with this turn)
                 response = st.session_state.workflow.run(
                     user_input,
-                    conv_history
+                    context=st.session_state.context
                 )
                 
                 st.markdown(response)
+                rows = st.session_state.context.last_rows()
+                chart = st.session_state.context.last_chart()
                 
             except Exception as e:
                 response = f"⚠️ I encountered an error: {str(e)}\n\nPlease try rephrasing your question."
+                rows = None
+                chart = None
                 st.error(response)
+        
+        if chart:
+            show_chart(chart, str(len(st.session_state.messages)))
+        if rows:
+            show_more_rows(rows, str(len(st.session_state.messages)))
     
     # Add assistant message
-    st.session_state.messages.append({"role": "assistant", "content": response})
+    st.session_state.messages.append({"role": "assistant", "content": response, "rows": rows, "chart": chart})
 
 # Footer
 st.divider()
@@ -0,0 +1,125 @@
+# BENCHMARK: DataLoader, the query tool and the stats tools at controlled dataset sizes
+# - data comes from benchmarks.synthetic_data (same seed -> same rows), generated once per size
+#   into <data-dir>/rows_<n>/ and reused by later runs
+# - every plan runs in exact mode with the result cache and cubes off, so the numbers are scans
+# - query plans run on both storage backends (pandas frame and memory-mapped columns)
+# - reported time per step = median of --repeats runs
+#
+# RUN: python -m benchmarks.bench_scale --rows 1000000,10000000 [--data-dir /tmp/payinsight_bench] [--workers 4]
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from src.config import config
+from src.utils.data_loader import data_loader
+from src.tools.data_tools import DataQueryTool
+from src.tools.stats_tools import StatisticalTools
+from benchmarks.synthetic_data import generate
+
+QUERY_PLANS = {
+    'count by state': {
+        'groupby': ['sender_state'],
+        'aggregations': [{'column': 'transaction_id', 'function': 'count', 'alias': 'transactions'}],
+    },
+    'filtered mean': {
+        'filters': [{'column': 'transaction_type', 'operator': '==', 'value': 'P2P'},
+                    {'column': 'amount_inr', 'operator': '>', 'value': 1000}],
+        'groupby': ['device_type', 'network_type'],
+        'aggregations': [{'column': 'amount_inr', 'function': 'mean', 'alias': 'avg_amount'}],
+    },
+    'top banks': {
+        'filters': [{'column': 'transaction_status', 'operator': '==', 'value': 'FAILED'}],
+        'groupby': ['sender_bank'],
+        'aggregations': [{'column': 'amount_inr', 'function': 'sum', 'alias': 'failed_amount'}],
+        'sort': {'by': 'failed_amount', 'ascending': False},
+        'limit': 5,
+    },
+    'daily volume': {
+        'aggregations': [{'column': 'amount_inr', 'function': 'sum', 'alias': 'volume'}],
+        'resample': {'freq': 'day'},
+    },
+}
+
+STATS_CALLS = {
+    'failure rate by network': ('failure_rate', {'segment_by': 'network_type'}),
+    'fraud rate by device': ('fraud_rate', {'segment_by': 'device_type'}),
+    'compare states': ('comparison', {'segment_by': 'sender_state', 'metrics': ['failure_rate']}),
+}
+
+
+def timed(func, repeats: int) -> float:
+    """Median milliseconds of `repeats` calls"""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def check(output: str) -> str:
+    result = json.loads(output)
+    if result.get('error') or result.get('success') is False:
+        raise RuntimeError(result.get('error'))
+    return output
+
+
+def bench_size(rows: int, data_dir: str, repeats: int, workers: int):
+    size_dir = os.path.join(data_dir, f"rows_{rows}")
+    config.DATA_PATH = os.path.join(size_dir, "transactions.csv")
+    config.CACHE_DIR = os.path.join(size_dir, ".cache")
+
+    if not os.path.exists(config.DATA_PATH):
+        started = time.perf_counter()
+        generate(rows, size_dir, ("csv", "columnar"), workers=workers)
+        print(f"  generated {rows:,} rows in {time.perf_counter() - started:.1f}s")
+
+    results = {'load csv': timed(lambda: data_loader.load_data(force_reload=True), 1)}
+    results['profile'] = timed(data_loader.get_profile, 1)
+    results['open column store'] = timed(data_loader.get_column_store, 1)
+
+    # The tools keep a reference to the frame, so they are created after the load
+    query_tool, stats_tools = DataQueryTool(), StatisticalTools()
+
+    for backend in ('pandas', 'columnar'):
+        config.STORAGE_BACKEND = backend
+        for name, plan in QUERY_PLANS.items():
+            payload = json.dumps(plan)
+            results[f"query [{backend}] {name}"] = timed(lambda: check(query_tool.execute_query(payload)), repeats)
+    config.STORAGE_BACKEND = 'pandas'
+
+    for name, (analysis_type, params) in STATS_CALLS.items():
+        payload = json.dumps(params)
+        results[f"stats {name}"] = timed(lambda: check(stats_tools.analyze(analysis_type, payload)), repeats)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the data layer at controlled sizes")
+    parser.add_argument('--rows', default="1000000", help="comma separated dataset sizes")
+    parser.add_argument('--data-dir', default="/tmp/payinsight_bench")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=1, help="processes used to generate missing data")
+    args = parser.parse_args()
+
+    # Measure the scans themselves: no result cache, no cubes, no approximation, no prefetching
+    config.CACHE_ENABLED = False
+    config.CUBE_BUILD_AFTER = float('inf')
+    config.QUERY_MODE = 'exact'
+    config.PREFETCH_ENABLED = False
+    config.VERBOSE = False
+
+    sizes = [int(n) for n in args.rows.split(",")]
+    table = {}
+    for rows in sizes:
+        print(f"Benchmarking {rows:,} rows...")
+        table[rows] = bench_size(rows, args.data_dir, args.repeats, args.workers)
+
+    steps = list(table[sizes[0]])
+    width = max(len(step) for step in steps)
+    print(f"\n{'ms (median)':<{width}} " + " ".join(f"{rows:>12,}" for rows in sizes))
+    for step in steps:
+        print(f"{step:<{width}} " + " ".join(f"{table[rows][step]:>12.1f}" for rows in sizes))
@@ -0,0 +1,162 @@
+# BENCHMARK: two-call (understand, then plan) vs merged (one structured-output call)
+# - replays recorded llm responses through the real agents, so parsing, validation and
+#   the repair loop run exactly as in the app, without network or api key
+# - latency per question = recorded llm latency of every call made + measured local time
+# - parse failure = the agent fell back to a default plan (two_call) or exhausted its repairs (merged);
+#   a merged run that needs more calls than were recorded counts as a failure too
+#
+# RUN:    python -m benchmarks.bench_understand_plan [--responses benchmarks/recorded/understand_plan.json]
+# RECORD: python -m benchmarks.bench_understand_plan --record   (needs GROQ_API_KEY, overwrites the file)
+
+import argparse
+import json
+import time
+
+from langchain_core.messages import AIMessage
+
+from src.config import config
+from src.agents.query_agent import QueryUnderstandingAgent
+from src.agents.planner_agent import PlannerAgent
+from src.agents.understand_plan_agent import UnderstandAndPlanAgent, PlanOutputError
+from src.utils.data_loader import data_loader
+
+DEFAULT_RESPONSES = "benchmarks/recorded/understand_plan.json"
+
+QUESTIONS = [
+    "What is the average transaction amount?",
+    "Which age group uses P2P most?",
+    "Compare failure rates between Android and iOS",
+    "Which states have the most transactions?",
+    "How has the fraud rate changed day by day?",
+    "What is the total amount spent on Food in Delhi?",
+    "Top 5 banks by failed transactions on 4G",
+    "Which device type has the highest failure rate?",
+]
+
+
+class RecordingExhausted(Exception):
+    """The agent asked for more responses than were recorded"""
+
+
+class RecordedLLM:
+    """Stands in for the chat model: returns recorded responses in order"""
+
+    def __init__(self, responses: list):
+        self.responses = list(responses)
+        self.latency_ms = 0.0
+        self.calls = 0
+
+    def invoke(self, messages):
+        if self.calls >= len(self.responses):
+            raise RecordingExhausted(f"only {len(self.responses)} responses recorded")
+        response = self.responses[self.calls]
+        self.calls += 1
+        self.latency_ms += response['latency_ms']
+        return AIMessage(content=response['content'])
+
+
+class RecordingLLM:
+    """Wraps the real chat model and keeps every response with its latency"""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.responses = []
+
+    def invoke(self, messages):
+        started = time.perf_counter()
+        content = self.llm.invoke(messages).content
+        self.responses.append({'latency_ms': round((time.perf_counter() - started) * 1000), 'content': content})
+        return AIMessage(content=content)
+
+
+def run_two_call(question: str, history: str, responses: list):
+    """Returns (llm calls, llm latency ms, local ms, parse failed)"""
+    understanding, planning = RecordedLLM(responses[:1]), RecordedLLM(responses[1:2])
+    query_agent, planner = QueryUnderstandingAgent(llm=understanding), PlannerAgent(llm=planning)
+
+    started = time.perf_counter()
+    query_plan = query_agent.understand_query(question, history)
+    planner.create_execution_plan(query_plan.model_dump())
+    local_ms = (time.perf_counter() - started) * 1000
+
+    failed = query_agent.parse_failures + planner.parse_failures > 0
+    return understanding.calls + planning.calls, understanding.latency_ms + planning.latency_ms, local_ms, failed
+
+
+def run_merged(question: str, history: str, responses: list):
+    llm = RecordedLLM(responses)
+    agent = UnderstandAndPlanAgent(llm=llm)
+
+    started = time.perf_counter()
+    try:
+        agent.understand_and_plan(question, history)
+        failed = False
+    except (PlanOutputError, RecordingExhausted):
+        failed = True
+    local_ms = (time.perf_counter() - started) * 1000
+    return llm.calls, llm.latency_ms, local_ms, failed
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def replay(path: str):
+    with open(path) as f:
+        recorded = json.load(f)
+
+    print(f"Replaying {len(recorded['questions'])} recorded questions from {path}")
+    print(f"{'mode':<10} {'calls/q':>8} {'mean ms':>9} {'p95 ms':>9} {'local ms':>9} {'parse fail':>11}")
+    for mode, runner in (('two_call', run_two_call), ('merged', run_merged)):
+        calls, totals, local, failures = 0, [], [], 0
+        for item in recorded['questions']:
+            n, llm_ms, local_ms, failed = runner(item['question'], item.get('history', ''), item[mode])
+            calls += n
+            totals.append(llm_ms + local_ms)
+            local.append(local_ms)
+            failures += failed
+        count = len(recorded['questions'])
+        print(f"{mode:<10} {calls / count:>8.2f} {sum(totals) / count:>9.0f} {percentile(totals, 0.95):>9.0f} "
+              f"{sum(local) / count:>9.1f} {failures / count:>10.0%}")
+
+
+def record(path: str):
+    questions = []
+    for question in QUESTIONS:
+        understanding = RecordingLLM(QueryUnderstandingAgent().llm)
+        planning = RecordingLLM(PlannerAgent().llm)
+        query_plan = QueryUnderstandingAgent(llm=understanding).understand_query(question, "")
+        PlannerAgent(llm=planning).create_execution_plan(query_plan.model_dump())
+
+        merged = RecordingLLM(UnderstandAndPlanAgent().llm)
+        try:
+            UnderstandAndPlanAgent(llm=merged).understand_and_plan(question, "")
+        except PlanOutputError:
+            pass
+
+        questions.append({
+            'question': question,
+            'history': "",
+            'two_call': understanding.responses + planning.responses,
+            'merged': merged.responses,
+        })
+        print(f"  recorded: {question}")
+
+    with open(path, 'w') as f:
+        json.dump({'model': config.MODEL_NAME, 'note': "Recorded with --record", 'questions': questions}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark two-call vs merged understanding + planning")
+    parser.add_argument('--responses', default=DEFAULT_RESPONSES)
+    parser.add_argument('--record', action='store_true', help="call the real model and overwrite the responses file")
+    args = parser.parse_args()
+
+    # Every call must really be parsed, not served from the llm cache
+    config.CACHE_ENABLED = False
+    data_loader.load_data()
+
+    if args.record:
+        record(args.responses)
+    replay(args.responses)
@@ -0,0 +1,419 @@
+# SYNTHETIC TRANSACTION DATA for scale testing
+# - same schema and value domains as the real data (config.TRANSACTION_COLUMNS), raw CSV headers included
+# - realistic skews: amounts per transaction type, failure rate by network / device,
+#   fraud flags concentrated on high amounts and night hours, a daily traffic curve
+# - fully vectorized NumPy, generated in chunks (constant memory), optionally on several processes
+# - deterministic: the same --rows / --chunk-rows / --seed always give the same rows
+# - rows come out in timestamp order, exactly like DataLoader keeps them
+#
+# FORMATS
+#   csv      -> <out-dir>/transactions.csv (what DataLoader reads)
+#   columnar -> a ColumnStore directory (one .npy per column, what STORAGE_BACKEND=columnar mmaps).
+#               Written with the csv, it goes to <out-dir>/.cache/columns_<version> so the loader
+#               opens it instead of building it; on its own it goes to <out-dir>/columns
+#   partitioned -> <out-dir>/transactions/dt=YYYY-MM/[sender_state=.../]part-NNNNN.csv (one file per chunk
+#               and partition); point DATA_PATH at <out-dir>/transactions to load it partition by partition
+#
+# RUN: python -m benchmarks.synthetic_data --rows 10000000 --out-dir data --formats csv,columnar --workers 4
+#      python -m benchmarks.synthetic_data --rows 10000000 --out-dir data --formats partitioned --partition-by dt,sender_state
+
+import argparse
+import json
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from src.utils.data_loader import dataset_version
+
+START = pd.Timestamp("2024-01-01")
+END = pd.Timestamp("2025-01-01")
+
+# column -> (labels, weights); weights None = uniform
+DOMAINS = {
+    'transaction_type': (['P2P', 'P2M', 'Bill Payment', 'Recharge'], [0.45, 0.35, 0.12, 0.08]),
+    'merchant_category': (['Food', 'Grocery', 'Fuel', 'Entertainment', 'Shopping', 'Healthcare',
+                           'Education', 'Transport', 'Utilities', 'Other'],
+                          [0.22, 0.18, 0.08, 0.08, 0.16, 0.05, 0.04, 0.07, 0.05, 0.07]),
+    'age_group': (['18-25', '26-35', '36-45', '46-55', '56+'], [0.24, 0.34, 0.22, 0.13, 0.07]),
+    'sender_state': (['Maharashtra', 'Uttar Pradesh', 'Karnataka', 'Tamil Nadu', 'Delhi', 'Telangana',
+                      'Gujarat', 'Andhra Pradesh', 'Rajasthan', 'West Bengal'],
+                     [0.16, 0.14, 0.12, 0.11, 0.10, 0.08, 0.08, 0.07, 0.07, 0.07]),
+    'bank': (['SBI', 'HDFC', 'ICICI', 'Axis', 'PNB', 'Kotak', 'IndusInd', 'Yes Bank'],
+             [0.25, 0.17, 0.15, 0.12, 0.10, 0.09, 0.07, 0.05]),
+    'device_type': (['Android', 'iOS', 'Web'], [0.75, 0.20, 0.05]),
+    'network_type': (['4G', '5G', 'WiFi'], [0.55, 0.25, 0.20]),
+    'transaction_status': (['SUCCESS', 'FAILED', 'PENDING'], None),
+}
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+
+# Share of the day's transactions per hour (quiet nights, lunch and evening peaks)
+HOUR_WEIGHTS = np.array([1, 0.6, 0.4, 0.3, 0.3, 0.5, 1.2, 2.5, 4, 5, 5.5, 6,
+                         6.5, 6, 5.5, 5.5, 5.5, 6, 6.5, 7, 6.5, 5, 3.5, 2])
+
+# lognormal (mu, sigma) of amount_inr per transaction type, in DOMAINS order
+AMOUNT_PARAMS = np.array([[6.9, 1.1], [6.1, 1.0], [7.2, 0.7], [5.6, 0.5]])
+AMOUNT_MAX = 200_000.0
+
+FAILURE_BY_NETWORK = np.array([0.055, 0.03, 0.025])   # 4G, 5G, WiFi
+FAILURE_WEB_EXTRA = 0.01
+PENDING_RATE = 0.008
+FRAUD_BASE = 0.0008
+FRAUD_BY_AMOUNT = [(10_000, 0.01), (50_000, 0.05)]    # rate once the amount is above the threshold
+FRAUD_NIGHT_FACTOR = 2.0                              # 00:00 - 05:59
+
+CSV_COLUMNS = [
+    ('transaction id', 'transaction_id'), ('timestamp', 'timestamp'),
+    ('transaction type', 'transaction_type'), ('merchant_category', 'merchant_category'),
+    ('amount (INR)', 'amount_inr'), ('transaction_status', 'transaction_status'),
+    ('sender_age_group', 'sender_age_group'), ('receiver_age_group', 'receiver_age_group'),
+    ('sender_state', 'sender_state'), ('sender_bank', 'sender_bank'), ('receiver_bank', 'receiver_bank'),
+    ('device_type', 'device_type'), ('network_type', 'network_type'), ('fraud_flag', 'fraud_flag'),
+    ('hour_of_day', 'hour_of_day'), ('day_of_week', 'day_of_week'), ('is_weekend', 'is_weekend'),
+]
+
+# Loaded column -> domain of its codes (the column store keeps labels sorted, like pandas categories)
+CATEGORY_DOMAINS = {
+    'transaction_type': 'transaction_type', 'merchant_category': 'merchant_category',
+    'transaction_status': 'transaction_status', 'sender_age_group': 'age_group',
+    'receiver_age_group': 'age_group', 'sender_state': 'sender_state', 'sender_bank': 'bank',
+    'receiver_bank': 'bank', 'device_type': 'device_type', 'network_type': 'network_type',
+}
+ID_WIDTH = 10   # TXN + 10 digits
+
+
+def _draw(rng: np.random.Generator, domain: str, rows: int) -> np.ndarray:
+    """Codes into DOMAINS[domain] labels, drawn with its weights"""
+    labels, weights = DOMAINS[domain]
+    if weights is None:
+        return rng.integers(0, len(labels), rows, dtype=np.int8)
+    cumulative = np.cumsum(weights) / np.sum(weights)
+    return np.searchsorted(cumulative, rng.random(rows), side='right').astype(np.int8)
+
+
+def _transaction_ids(first_id: int, rows: int) -> np.ndarray:
+    """'TXN0000000042'-style ids as fixed-width bytes, without a Python loop"""
+    ids = np.arange(first_id, first_id + rows, dtype=np.int64)
+    digits = (ids[:, None] // 10 ** np.arange(ID_WIDTH - 1, -1, -1, dtype=np.int64)) % 10
+    raw = np.empty((rows, ID_WIDTH + 3), dtype=np.uint8)
+    raw[:, :3] = np.frombuffer(b'TXN', dtype=np.uint8)
+    raw[:, 3:] = digits + ord('0')
+    return raw.view(f'S{ID_WIDTH + 3}').ravel()
+
+
+def generate_chunk(seed_sequence: np.random.SeedSequence, first_id: int, rows: int,
+                   start_ns: int, end_ns: int) -> dict:
+    """One chunk of rows with timestamps in [start_ns, end_ns), in timestamp order.
+    Categorical columns are int8 codes into their DOMAINS labels (-1 = null)."""
+    rng = np.random.default_rng(seed_sequence)
+
+    # Timestamps: uniform day, hour from the daily curve, uniform second within the hour
+    day_ns = 24 * 3600 * 10 ** 9
+    first_day, last_day = start_ns // day_ns, -(-end_ns // day_ns)
+    days = rng.integers(first_day, last_day, rows)
+    hours = np.searchsorted(np.cumsum(HOUR_WEIGHTS) / HOUR_WEIGHTS.sum(), rng.random(rows), side='right')
+    seconds = rng.integers(0, 3600, rows)
+    timestamps = days * day_ns + hours * 3600 * 10 ** 9 + seconds * 10 ** 9
+    # Slices that don't start / end on midnight: rows drawn outside go anywhere in the slice
+    outside = (timestamps < start_ns) | (timestamps >= end_ns)
+    timestamps[outside] = rng.integers(start_ns // 10 ** 9, end_ns // 10 ** 9, int(outside.sum())) * 10 ** 9
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order]
+    seconds_of_day = (timestamps // 10 ** 9) % (24 * 3600)
+    hour_of_day = seconds_of_day // 3600
+    # 1970-01-01 was a Thursday (dayofweek 3)
+    day_of_week = ((timestamps // day_ns) + 3) % 7
+
+    transaction_type = _draw(rng, 'transaction_type', rows)
+    is_p2p = transaction_type == 0
+    is_p2m = transaction_type == 1
+
+    params = AMOUNT_PARAMS[transaction_type]
+    amount = np.exp(params[:, 0] + params[:, 1] * rng.standard_normal(rows))
+    amount = np.round(np.clip(amount, 1.0, AMOUNT_MAX), 2)
+
+    device_type = _draw(rng, 'device_type', rows)
+    network_type = _draw(rng, 'network_type', rows)
+
+    failure_rate = FAILURE_BY_NETWORK[network_type] + FAILURE_WEB_EXTRA * (device_type == 2)
+    roll = rng.random(rows)
+    status = np.zeros(rows, dtype=np.int8)
+    status[roll < failure_rate] = 1
+    status[(roll >= failure_rate) & (roll < failure_rate + PENDING_RATE)] = 2
+
+    fraud_rate = np.full(rows, FRAUD_BASE)
+    for threshold, rate in FRAUD_BY_AMOUNT:
+        fraud_rate[amount > threshold] = rate
+    fraud_rate[hour_of_day < 6] *= FRAUD_NIGHT_FACTOR
+    fraud_flag = rng.random(rows) < fraud_rate
+
+    return {
+        'transaction_id': _transaction_ids(first_id, rows),
+        'timestamp': timestamps,
+        'transaction_type': transaction_type,
+        'merchant_category': np.where(is_p2m, _draw(rng, 'merchant_category', rows), -1).astype(np.int8),
+        'amount_inr': amount,
+        'transaction_status': status,
+        'sender_age_group': _draw(rng, 'age_group', rows),
+        'receiver_age_group': np.where(is_p2p, _draw(rng, 'age_group', rows), -1).astype(np.int8),
+        'sender_state': _draw(rng, 'sender_state', rows),
+        'sender_bank': _draw(rng, 'bank', rows),
+        'receiver_bank': _draw(rng, 'bank', rows),
+        'device_type': device_type,
+        'network_type': network_type,
+        'fraud_flag': fraud_flag,
+        'hour_of_day': hour_of_day,
+        'day_of_week': day_of_week,
+        'is_weekend': day_of_week >= 5,
+    }
+
+
+def _lookup_tables() -> dict:
+    """Every distinct text a CSV field can take, so formatting a chunk is array indexing"""
+    clock = np.arange(24 * 3600)
+    two_digits = np.array([f"{i:02d}" for i in range(100)], dtype='S2')
+    return {
+        'first_day': START.value // (24 * 3600 * 10 ** 9),
+        'dates': np.array(pd.date_range(START, END, freq='D').strftime('%Y-%m-%d '), dtype='S'),
+        'clock': np.array([f"{h:02d}:{m:02d}:{s:02d}" for h, m, s in
+                           zip(clock // 3600, clock // 60 % 60, clock % 60)], dtype='S8'),
+        'rupees': np.arange(int(AMOUNT_MAX) + 1).astype('S'),
+        'cents': np.char.add(b'.', two_digits),
+        'hours': np.arange(24).astype('S'),
+        'flags': np.array([b'0', b'1']),
+        'day_names': DAY_NAMES.astype('S'),
+        # index -1 (null) -> empty field
+        'labels': {domain: np.array(labels + [''], dtype='S') for domain, (labels, _) in DOMAINS.items()},
+    }
+
+
+_TABLES = None
+
+
+def chunk_to_csv(chunk: dict) -> bytes:
+    """CSV bytes for a chunk (no header), in the raw file's column order and formats.
+    Every field is a fixed-width, NUL-padded bytes array; they are laid side by side in
+    one byte matrix and the padding is dropped, which is much faster than pandas' to_csv."""
+    global _TABLES
+    if _TABLES is None:
+        _TABLES = _lookup_tables()
+    tables = _TABLES
+    rows = len(chunk['timestamp'])
+
+    fields = []
+    for _, col in CSV_COLUMNS:
+        values = chunk[col]
+        if col in CATEGORY_DOMAINS:
+            parts = [tables['labels'][CATEGORY_DOMAINS[col]][values]]
+        elif col == 'timestamp':
+            seconds = values // 10 ** 9
+            parts = [tables['dates'][seconds // (24 * 3600) - tables['first_day']],
+                     tables['clock'][seconds % (24 * 3600)]]
+        elif col == 'amount_inr':
+            cents = np.round(values * 100).astype(np.int64)
+            parts = [tables['rupees'][cents // 100], tables['cents'][cents % 100]]
+        elif col == 'hour_of_day':
+            parts = [tables['hours'][values]]
+        elif col == 'day_of_week':
+            parts = [tables['day_names'][values]]
+        elif values.dtype == bool:
+            parts = [tables['flags'][values.view(np.int8)]]
+        else:
+            parts = [values]
+        fields.append(parts)
+
+    comma = np.full((rows, 1), ord(','), dtype=np.uint8)
+    newline = np.full((rows, 1), ord('\n'), dtype=np.uint8)
+    matrix = []
+    for parts in fields:
+        matrix.extend(part.view(np.uint8).reshape(rows, part.dtype.itemsize) for part in parts)
+        matrix.append(comma)
+    matrix[-1] = newline
+    raw = np.concatenate(matrix, axis=1).ravel()
+    return raw[raw != 0].tobytes()
+
+
+def chunk_partitions(chunk: dict, partition_by=('dt',)) -> list:
+    """(hive-style directory, CSV bytes) for every partition the chunk's rows fall in.
+    Rows keep their timestamp order inside each partition."""
+    keys = [np.asarray(chunk['timestamp']).view('datetime64[ns]').astype('datetime64[M]').astype(str)]
+    if 'sender_state' in partition_by:
+        keys.append(np.array(DOMAINS['sender_state'][0], dtype=object)[chunk['sender_state']])
+
+    parts = []
+    for key, positions in pd.Series(np.arange(len(keys[0]))).groupby(keys, sort=True).indices.items():
+        key = key if isinstance(key, tuple) else (key,)
+        directory = os.path.join(f"dt={key[0]}", *[f"sender_state={quote(state, safe=' ')}" for state in key[1:]])
+        parts.append((directory, chunk_to_csv({col: values[positions] for col, values in chunk.items()})))
+    return parts
+
+
+class ColumnWriter:
+    """Writes chunks straight into a ColumnStore layout (preallocated .npy files, filled in place)"""
+
+    def __init__(self, path: str, rows: int):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.rows = rows
+        self.offset = 0
+        self.arrays = {}
+        self.manifest = {'version': None, 'rows': rows, 'columns': {}}
+        # Codes are stored against the sorted labels, like pandas categories
+        self.remap = {}
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+
+    def _open(self, col: str, values: np.ndarray):
+        if col in CATEGORY_DOMAINS:
+            labels = DOMAINS[CATEGORY_DOMAINS[col]][0]
+            order = sorted(range(len(labels)), key=lambda i: labels[i])
+            remap = np.empty(len(labels) + 1, dtype=np.int8)
+            remap[np.array(order)] = np.arange(len(labels), dtype=np.int8)
+            remap[-1] = -1    # index -1 keeps nulls null
+            self.remap[col] = remap
+            with open(os.path.join(self.tmp_path, f"{col}.categories.json"), 'w') as f:
+                json.dump(sorted(labels), f)
+            kind, dtype = 'category', np.dtype(np.int8)
+        elif col == 'timestamp':
+            kind, dtype = 'datetime', np.dtype(np.int64)
+        elif col == 'transaction_id':
+            kind, dtype = 'text', values.dtype
+        elif values.dtype == bool:
+            kind, dtype = 'bool', np.dtype(bool)
+        else:
+            kind, dtype = 'numeric', np.dtype(np.float64 if values.dtype.kind == 'f' else np.int64)
+        self.arrays[col] = np.lib.format.open_memmap(
+            os.path.join(self.tmp_path, f"{col}.npy"), mode='w+', dtype=dtype, shape=(self.rows,))
+        self.manifest['columns'][col] = {'kind': kind, 'dtype': str(dtype)}
+
+    def write(self, chunk: dict):
+        rows = len(chunk['timestamp'])
+        for col, values in chunk.items():
+            if col not in self.arrays:
+                self._open(col, values)
+            if col in self.remap:
+                values = self.remap[col][values]
+            self.arrays[col][self.offset:self.offset + rows] = values
+        self.offset += rows
+
+    def close(self, version: str = None) -> str:
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays = {}
+        self.manifest['version'] = version
+        with open(os.path.join(self.tmp_path, 'manifest.json'), 'w') as f:
+            json.dump(self.manifest, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp_path, self.path)
+        return self.path
+
+
+def _make_chunk(task: tuple):
+    """Worker: generate one chunk (and its CSV text / partition files when asked for)"""
+    seed_sequence, first_id, rows, start_ns, end_ns, want_csv, want_columns, partition_by = task
+    chunk = generate_chunk(seed_sequence, first_id, rows, start_ns, end_ns)
+    return ((chunk if want_columns else None), (chunk_to_csv(chunk) if want_csv else None),
+            (chunk_partitions(chunk, partition_by) if partition_by else None))
+
+
+def generate(rows: int, out_dir: str = "data", formats=("csv",), seed: int = 42,
+             chunk_rows: int = 1_000_000, workers: int = 1, partition_by=('dt',)) -> dict:
+    """Generate `rows` transactions into out_dir; returns the paths written"""
+    os.makedirs(out_dir, exist_ok=True)
+    want_csv, want_columns = 'csv' in formats, 'columnar' in formats
+    partition_by = tuple(partition_by) if 'partitioned' in formats else ()
+    n_chunks = max(1, -(-rows // chunk_rows))
+    # Each chunk gets its own time slice and seed, so chunks are independent and ordered.
+    # Slices are whole days when there are enough days, and rows are split in proportion
+    # to slice length so the daily volume stays even.
+    days = (END - START).days
+    if n_chunks <= days:
+        offsets = np.round(np.linspace(0, days, n_chunks + 1)).astype(np.int64) * (24 * 3600 * 10 ** 9)
+    else:
+        offsets = np.linspace(0, END.value - START.value, n_chunks + 1).astype(np.int64)
+        offsets -= offsets % 10 ** 9
+    bounds = START.value + offsets
+    row_bounds = np.round(rows * (offsets / offsets[-1])).astype(np.int64)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    tasks = [(seeds[i], int(row_bounds[i]), int(row_bounds[i + 1] - row_bounds[i]),
+              int(bounds[i]), int(bounds[i + 1]), want_csv, want_columns, partition_by) for i in range(n_chunks)]
+
+    header = ",".join(raw for raw, _ in CSV_COLUMNS).encode() + b"\n"
+    csv_path = os.path.join(out_dir, "transactions.csv")
+    csv_file = None
+    if want_csv:
+        csv_file = open(csv_path, 'wb')
+        csv_file.write(header)
+    columns = ColumnWriter(os.path.join(out_dir, "columns"), rows) if want_columns else None
+    partition_root = os.path.join(out_dir, "transactions")
+    if partition_by:
+        shutil.rmtree(partition_root, ignore_errors=True)
+    chunks_written = [0]
+
+    def consume(result):
+        chunk, text, parts = result
+        if csv_file is not None:
+            csv_file.write(text)
+        if columns is not None:
+            columns.write(chunk)
+        for directory, part_text in parts or []:
+            os.makedirs(os.path.join(partition_root, directory), exist_ok=True)
+            with open(os.path.join(partition_root, directory, f"part-{chunks_written[0]:05d}.csv"), 'wb') as f:
+                f.write(header + part_text)
+        chunks_written[0] += 1
+
+    if workers <= 1:
+        for task in tasks:
+            consume(_make_chunk(task))
+    else:
+        # Keep a bounded number of chunks in flight, written back in order
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(_make_chunk, task))
+                if len(pending) >= 2 * workers:
+                    consume(pending.popleft().result())
+            while pending:
+                consume(pending.popleft().result())
+
+    written = {}
+    if partition_by:
+        written['partitioned'] = partition_root
+    if csv_file is not None:
+        csv_file.close()
+        written['csv'] = csv_path
+    if columns is not None:
+        if want_csv:
+            # Where DataLoader looks for the column store of this csv (CACHE_DIR = <data dir>/.cache)
+            version = dataset_version(csv_path)
+            os.makedirs(os.path.join(out_dir, ".cache"), exist_ok=True)
+            columns.path = os.path.join(out_dir, ".cache", f"columns_{version}")
+            written['columnar'] = columns.close(version)
+        else:
+            written['columnar'] = columns.close()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic UPI transactions")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--out-dir', default="data")
+    parser.add_argument('--formats', default="csv", help="comma separated: csv, columnar, partitioned")
+    parser.add_argument('--partition-by', default="dt", help="partitioned format: dt or dt,sender_state")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    paths = generate(args.rows, args.out_dir, args.formats.split(","), args.seed, args.chunk_rows, args.workers,
+                     args.partition_by.split(","))
+    elapsed = time.perf_counter() - started
+    print(f"Generated {args.rows:,} rows in {elapsed:.1f}s ({args.rows / elapsed / 1e6:.2f}M rows/s)")
+    for fmt, path in paths.items():
+        print(f"  {fmt}: {path}")
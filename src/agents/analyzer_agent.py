@@ -5,6 +5,7 @@ from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from src.config import config
 from src.tools.data_tools import create_data_query_tool
 from src.tools.stats_tools import create_stats_tool
+from src.utils.prefetch import prefetcher
 import json
 
 class AnalyzerAgent:
@@ -35,8 +36,8 @@ Use the appropriate tools to execute the plan.
 Return the final results clearly.
 
 Available tools:
-- query_transaction_data: Execute queries on transaction data. Input: execution_plan (JSON string with filters, groupby, aggregations, sort, limit)
-- statistical_analysis: Perform statistical analysis. Input: analysis_type (failure_rate, fraud_rate, correlation, distribution, comparison) and parameters (JSON string)
+- query_transaction_data: Execute queries on transaction data. Input: execution_plan (JSON string with filters, groupby, aggregations, sort, limit, resample)
+- statistical_analysis: Perform statistical analysis. Input: analysis_type (failure_rate, fraud_rate, correlation, distribution, comparison, trend, anomaly) and parameters (JSON string)
 """),
             ("human", "{input}")
         ])
@@ -59,6 +60,16 @@ Available tools:
     def analyze(self, execution_plan: dict):
         """Execute analysis based on execution plan"""
 
+        # A speculatively prefetched result for this exact plan skips the LLM and the query
+        prefetched = prefetcher.lookup(execution_plan)
+        if prefetched is not None:
+            print(f"  ⚡ Using prefetched result (hit rate {prefetcher.hit_rate():.0%})")
+            return {
+                "tool_calls": 1,
+                "results": [{"tool": "query_transaction_data", "result": prefetched}],
+                "prefetched": True
+            }
+
         input_text = f"""
 Execute this analysis plan:
 
@@ -25,4 +25,61 @@ class InsightAgent:
             "stats_context": json.dumps(stats_context or {}, indent=2)
         })
         
-        return response.content
\ No newline at end of file
+        return response.content
+
+
+def templated_answer(question: str, analysis_results: dict, timed_out: bool = True, max_rows: int = 10) -> str:
+    """Deterministic answer built straight from the tool results (no LLM call).
+    Used when the request deadline leaves no time for the narrative."""
+    sections = []
+    for item in (analysis_results or {}).get('results', []):
+        try:
+            result = json.loads(item.get('result', ''))
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(result, dict) or not result.get('success'):
+            continue
+
+        rows = result.get('data')
+        if rows is None and isinstance(result.get('results'), dict):
+            # statistical results are keyed by segment
+            rows = [{'segment': key, **value} if isinstance(value, dict) else {'segment': key, 'value': value}
+                    for key, value in result['results'].items()]
+        if not rows:
+            continue
+
+        table = _markdown_table(rows[:max_rows])
+        if len(rows) > max_rows:
+            table += f"\n\n_Showing {max_rows} of {len(rows)} rows._"
+        if result.get('approximate'):
+            table += f"\n\n_Estimated from a sample ({result.get('confidence', config.APPROX_CONFIDENCE):.0%} confidence intervals shown)._"
+        sections.append(table)
+
+    if not sections and not timed_out:
+        return "⚠️ I couldn't work out how to answer this from the transaction data. Please try rephrasing your question."
+    if not sections:
+        return ("⏱️ I couldn't finish analysing this question in time. "
+                "Please try again, or narrow the question down (e.g. one segment or a shorter period).")
+
+    header = f"📊 **Results for:** {question}"
+    footer = "_Answered from the raw results to stay within the response time limit._"
+    return "\n\n".join([header] + sections + [footer])
+
+
+def _markdown_table(rows: list) -> str:
+    columns = list(dict.fromkeys(col for row in rows for col, value in row.items() if not isinstance(value, (dict, list))))
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    for row in rows:
+        lines.append("| " + " | ".join(_format_value(row.get(col)) for col in columns) + " |")
+    return "\n".join(lines)
+
+
+def _format_value(value) -> str:
+    if isinstance(value, bool) or value is None:
+        return "" if value is None else str(value)
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
@@ -8,6 +8,7 @@ from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
 import json
 from src.config import config
+from src.utils.cache import llm_cache, llm_cache_key
 from src.utils.prompts import PLANNER_PROMPT
 
 class ExecutionPlan(BaseModel):
@@ -17,28 +18,35 @@ class ExecutionPlan(BaseModel):
     computations: List[Dict] = Field(default_factory=list)
     sort: Optional[Dict] = None
     limit: Optional[int] = None
+    resample: Optional[Dict] = None
 
 class PlannerAgent:
-    def __init__(self):
-        self.llm = ChatGroq(
+    def __init__(self, llm=None):
+        self.llm = llm or ChatGroq(
             temperature=config.TEMPERATURE,
             model_name=config.MODEL_NAME,
             groq_api_key=config.GROQ_API_KEY
         )
+        self.parse_failures = 0
     
     def create_execution_plan(self, query_plan: dict) -> ExecutionPlan:
         """Create execution plan from query understanding"""
         
         prompt = ChatPromptTemplate.from_template(PLANNER_PROMPT)
         
-        chain = prompt | self.llm
+        messages = prompt.format_messages(
+            query_plan=json.dumps(query_plan, indent=2)
+        )
         
-        response = chain.invoke({
-            "query_plan": json.dumps(query_plan, indent=2)
-        })
+        # Identical query plans with the same model settings reuse the cached plan
+        cache_key = llm_cache_key(messages, config.MODEL_NAME, config.TEMPERATURE)
+        raw_content = llm_cache.get(cache_key)
+        from_cache = raw_content is not None
+        if not from_cache:
+            raw_content = self.llm.invoke(messages).content
         
         try:
-            content = response.content
+            content = raw_content
             
             # Extract JSON from markdown
             if "```json" in content:
@@ -47,8 +55,13 @@ class PlannerAgent:
                 content = content.split("```")[1].split("```")[0].strip()
             
             parsed = json.loads(content)
-            return ExecutionPlan(**parsed)
+            execution_plan = ExecutionPlan(**parsed)
+            
+            if not from_cache:
+                llm_cache.set(cache_key, raw_content)
+            return execution_plan
         except Exception as e:
+            self.parse_failures += 1
             print(f"Error creating execution plan: {e}")
-            print(f"Response: {response.content}")
+            print(f"Response: {raw_content}")
             return ExecutionPlan()
\ No newline at end of file
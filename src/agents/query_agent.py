@@ -3,7 +3,7 @@
 # - converting vague user query into structured data
 # - then agents will work on this structured data 
 # - the better we can convert user query to structured data, the more accurate analysis we can get 
-# - prompt used : QUERY_UNDERSTANDING_PROMPT 
+# - prompt used : QUERY_UNDERSTANDING_PROMPT (schema filled in from the cached dataset profile)
 
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
@@ -11,7 +11,9 @@ from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional, Any
 from src.config import config
-from src.utils.prompts import QUERY_UNDERSTANDING_PROMPT
+from src.utils.cache import llm_cache, llm_cache_key
+from src.utils.data_loader import data_loader
+from src.utils.prompts import build_query_understanding_prompt
 import json
 
 
@@ -25,36 +27,58 @@ class QueryPlan(BaseModel):
     is_followup: bool = Field(description="Whether this is a follow-up question")
 
 class QueryUnderstandingAgent:
-    def __init__(self):
-        self.llm = ChatGroq(
+    def __init__(self, llm=None):
+        self.llm = llm or ChatGroq(
             temperature=config.TEMPERATURE,
             model_name=config.MODEL_NAME,
             groq_api_key=config.GROQ_API_KEY
         )
+        self.parse_failures = 0
         self.parser = PydanticOutputParser(pydantic_object=QueryPlan)
+        self._system_prompt = None
+        self._profile_version = None
+    
+    def _get_system_prompt(self) -> str:
+        """System prompt built from the dataset profile, rebuilt only when the dataset changes"""
+        try:
+            profile = data_loader.get_profile()
+        except Exception as e:
+            print(f"Dataset profile unavailable, using static schema: {e}")
+            profile = None
+        
+        version = profile['version'] if profile else None
+        if self._system_prompt is None or version != self._profile_version:
+            self._system_prompt = build_query_understanding_prompt(profile)
+            self._profile_version = version
+        return self._system_prompt
         
     def understand_query(self, question: str, history: str = "") -> QueryPlan:
         """Understand user query and extract structured information"""
         
         prompt = ChatPromptTemplate.from_messages([
-            ("system", QUERY_UNDERSTANDING_PROMPT),
+            ("system", self._get_system_prompt()),
             ("human", "User Question: {question}"),
             ("human", "Conversation History: {history}"),
             ("system", "{format_instructions}")
         ])
         
-        chain = prompt | self.llm 
+        messages = prompt.format_messages(
+            question=question,
+            history=history,
+            format_instructions=self.parser.get_format_instructions()
+        )
         
-        response = chain.invoke({
-            "question": question,
-            "history": history,
-            "format_instructions": self.parser.get_format_instructions()
-        })
+        # Identical prompts (same question, history, schema and model settings) reuse the cached answer
+        cache_key = llm_cache_key(messages, config.MODEL_NAME, config.TEMPERATURE)
+        raw_content = llm_cache.get(cache_key)
+        from_cache = raw_content is not None
+        if not from_cache:
+            raw_content = self.llm.invoke(messages).content
         
         try:
             # Parse the JSON response
             
-            content = response.content
+            content = raw_content
             
             # Try to extract JSON from markdown code blocks
             if "```json" in content:
@@ -63,10 +87,16 @@ class QueryUnderstandingAgent:
                 content = content.split("```")[1].split("```")[0].strip()
             
             parsed = json.loads(content)
-            return QueryPlan(**parsed)
+            query_plan = QueryPlan(**parsed)
+            
+            # Only cache answers that parsed, so a bad response is not replayed forever
+            if not from_cache:
+                llm_cache.set(cache_key, raw_content)
+            return query_plan
         except Exception as e:
+            self.parse_failures += 1
             print(f"Error parsing query plan: {e}")
-            print(f"Response: {response.content}")
+            print(f"Response: {raw_content}")
             # Return a default plan
             return QueryPlan(
                 intent="descriptive",
@@ -0,0 +1,101 @@
+# WHAT DOES THIS AGENT DO?
+# - optional single-call replacement for query_agent + planner_agent (config.PIPELINE_MODE = "merged")
+# - asks the llm for the QueryPlan AND the ExecutionPlan in one JSON-mode response
+# - validates the response locally (pydantic schema + plan compiler against the loaded data)
+# - on a validation error, sends the error back and asks for a corrected response (bounded repair loop)
+# - saves one full llm round-trip per question
+# - prompt used : UNDERSTAND_AND_PLAN prompt (schema filled in from the cached dataset profile)
+
+from langchain_groq import ChatGroq
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import AIMessage, HumanMessage
+from pydantic import BaseModel, ValidationError
+from src.config import config
+from src.agents.query_agent import QueryPlan
+from src.agents.planner_agent import ExecutionPlan
+from src.utils.cache import llm_cache, llm_cache_key
+from src.utils.data_loader import data_loader
+from src.utils.plan_compiler import plan_compiler, PlanValidationError
+from src.utils.prompts import build_understand_and_plan_prompt, UNDERSTAND_AND_PLAN_REPAIR_PROMPT
+
+
+class UnderstandAndPlan(BaseModel):
+    query_plan: QueryPlan
+    execution_plan: ExecutionPlan
+
+
+class PlanOutputError(ValueError):
+    """Raised when the model did not return a valid plan within the repair budget"""
+
+
+class UnderstandAndPlanAgent:
+    def __init__(self, llm=None):
+        # JSON mode: the model must answer with a single JSON object (no prose, no code fences)
+        self.llm = llm or ChatGroq(
+            temperature=config.TEMPERATURE,
+            model_name=config.MODEL_NAME,
+            groq_api_key=config.GROQ_API_KEY
+        ).bind(response_format={"type": "json_object"})
+        self._system_prompt = None
+        self._profile_version = None
+        self.stats = {'calls': 0, 'repairs': 0, 'failures': 0}
+
+    def _get_system_prompt(self) -> str:
+        """System prompt built from the dataset profile, rebuilt only when the dataset changes"""
+        try:
+            profile = data_loader.get_profile()
+        except Exception as e:
+            print(f"Dataset profile unavailable, using static schema: {e}")
+            profile = None
+
+        version = profile['version'] if profile else None
+        if self._system_prompt is None or version != self._profile_version:
+            self._system_prompt = build_understand_and_plan_prompt(profile)
+            self._profile_version = version
+        return self._system_prompt
+
+    def validate(self, raw_content: str) -> UnderstandAndPlan:
+        """Parse and check a response; raises ValidationError / PlanValidationError with a readable message"""
+        result = UnderstandAndPlan.model_validate_json(raw_content)
+        # The plan must also make sense for the loaded data (columns, operators, value types, formulas)
+        plan_compiler.compile(result.execution_plan.model_dump(), strict=True)
+        return result
+
+    def understand_and_plan(self, question: str, history: str = "") -> UnderstandAndPlan:
+        """Understand the question and plan its execution in one llm call"""
+
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", self._get_system_prompt()),
+            ("human", "User Question: {question}"),
+            ("human", "Conversation History: {history}")
+        ])
+        messages = prompt.format_messages(question=question, history=history)
+
+        cache_key = llm_cache_key(messages, config.MODEL_NAME, config.TEMPERATURE)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            try:
+                return self.validate(cached)
+            except (ValidationError, PlanValidationError):
+                pass
+
+        error = None
+        for attempt in range(config.PLAN_REPAIR_ATTEMPTS + 1):
+            self.stats['calls'] += 1
+            raw_content = self.llm.invoke(messages).content
+            try:
+                result = self.validate(raw_content)
+                llm_cache.set(cache_key, raw_content)
+                return result
+            except (ValidationError, PlanValidationError) as e:
+                error = e
+                print(f"  🔧 Plan response invalid (attempt {attempt + 1}): {str(e).splitlines()[0]}")
+                if attempt < config.PLAN_REPAIR_ATTEMPTS:
+                    self.stats['repairs'] += 1
+                    messages = messages + [
+                        AIMessage(content=raw_content),
+                        HumanMessage(content=UNDERSTAND_AND_PLAN_REPAIR_PROMPT.format(error=e))
+                    ]
+
+        self.stats['failures'] += 1
+        raise PlanOutputError(f"No valid plan after {config.PLAN_REPAIR_ATTEMPTS + 1} attempts: {error}")
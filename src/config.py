@@ -10,12 +10,123 @@ class Config:
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0.1"))
     
     # Data Configuration
-    DATA_PATH = "data/transactions.csv"
+    DATA_PATH = os.getenv("DATA_PATH", "data/transactions.csv")   # a file, or a directory of dt=YYYY-MM/ partitions
+    CACHE_DIR = "data/.cache"          # derived artifacts (dataset profile, ...) keyed by dataset version
+    PROFILE_MAX_DISTINCT = 200         # columns with more distinct values only get a distinct count
+    PROFILE_CATEGORICAL_NUMERIC = ['hour_of_day', 'day_of_week']
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "pandas")   # pandas or columnar (memory-mapped NumPy columns)
+    PROFILE_CHUNK_ROWS = 1_000_000 # columnar backend: rows decoded at a time when profiling the column store
+    CATEGORICAL_COLUMNS = [
+        'transaction_type', 'merchant_category', 'transaction_status',
+        'sender_age_group', 'receiver_age_group', 'sender_state',
+        'sender_bank', 'receiver_bank', 'device_type', 'network_type'
+    ]
     
+    # Partitioned Dataset Configuration (DATA_PATH is a directory, see src/utils/partitions.py)
+    PARTITION_STATS_COLUMNS = ['timestamp', 'sender_state', 'transaction_type']   # min/max/distinct kept per partition for pruning
+    PARTITION_MAX_DISTINCT = 1_000 # columns with more distinct values in a partition only keep min/max (or nothing)
+    PARTITION_READ_COST = 2        # relative cost of reading one row from a partition's memory-mapped columns
+
     # Agent Configuration
     MAX_ITERATIONS = 5
     VERBOSE = True
-    
+    PIPELINE_MODE = os.getenv("PIPELINE_MODE", "two_call")   # two_call (understand, then plan) or merged (one call)
+    PLAN_REPAIR_ATTEMPTS = 2       # merged mode: corrections requested after an invalid response
+
+    # Deadline Configuration
+    REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "30"))   # every question is answered within this
+    INSIGHT_MIN_BUDGET_S = 4       # less time than this left after analysis -> templated answer, no insight LLM call
+    WORKFLOW_WORKERS = 8           # threads running LLM / tool stages (a timed-out call finishes in the background)
+
+    # Profiling Configuration
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))   # share of tool calls profiled without asking
+    PROFILE_TRACE_MEMORY = True    # record allocations per operator with tracemalloc (slows profiled calls down)
+    PROFILE_REPORT_MAX_SHAPES = 500
+
+    # Time-Series Configuration
+    TREND_DEFAULT_FREQ = "day"
+    TREND_DEFAULT_WINDOW = 7       # rolling window, in buckets
+    TREND_MAX_POINTS = 500         # most recent buckets returned per query
+
+    # Anomaly Detection Configuration (EWMA baselines per segment, see src/utils/anomaly.py)
+    ANOMALY_DIMENSIONS = ['device_type', 'network_type', 'sender_bank', 'sender_state']
+    ANOMALY_FREQ = "day"           # hour, day or week: the bucket the newest data is judged in
+    ANOMALY_ALPHA = 0.1            # EWMA weight of the newest closed bucket
+    ANOMALY_MIN_BUCKET_ROWS = 20   # quieter (segment, bucket) cells neither update nor get scored
+    ANOMALY_MIN_HISTORY = 7        # closed buckets a segment needs before it is scored
+    ANOMALY_Z_THRESHOLD = 3.0
+    ANOMALY_MAX_RESULTS = 20
+
+    # Top-K Configuration
+    HEAVY_HITTER_MIN_GROUPS = 100_000    # estimated groups before sort+limit count plans skip the groupby (counted from codes)
+    HEAVY_HITTER_CAPACITY = 2_000        # counters kept by the Space-Saving summary
+    HEAVY_HITTER_CHUNK_ROWS = 1_000_000  # rows folded into the summary per step
+    HEAVY_HITTER_DENSE_KEYS = 10_000_000 # group-code spaces up to this size are counted exactly (one bincount)
+
+    # Result Paging Configuration (plans that return raw rows)
+    RESULT_PAGE_ROWS = 100         # rows per page; the first page comes back with the query
+    RESULT_MAX_ROWS = 10_000       # hard cap on the rows one query can page through
+    CURSOR_MAX_OPEN = 64           # cursors kept in memory per process (older ones are rebuilt on demand)
+
+    # Chart Configuration (chart specs sent to the UI next to the answer)
+    CHART_MAX_POINTS = 400         # points per chart after downsampling, whatever the dataset size
+    CHART_TOP_N = 10               # categories drawn per axis; the rest become "Other" (or are dropped)
+
+    # Approximate Query Configuration
+    QUERY_MODE = os.getenv("QUERY_MODE", "auto")   # exact, approximate or auto
+    LATENCY_BUDGET_MS = 250        # auto mode goes approximate when an exact scan is estimated above this
+    SCAN_NS_PER_CELL = 5           # rough cost of scanning one value of one column
+    SAMPLE_STRATA = ['transaction_type', 'device_type', 'sender_state']
+    SAMPLE_FRACTION = 0.01
+    SAMPLE_MIN_PER_STRATUM = 50    # rare strata keep at least this many rows (or all of them)
+    SAMPLE_SEED = 42
+    APPROX_CONFIDENCE = 0.95
+
+    # Plan Optimizer Configuration
+    INDEX_GATHER_COST = 2          # relative cost of gathering one row through a posting list
+    CUBE_MEASURES = ['amount_inr'] # numeric columns pre-aggregated in cubes
+    CUBE_BUILD_AFTER = 2           # build a cube once the same dimension set has been queried this often
+    CUBE_MAX_CELLS = 200_000       # never build cubes estimated larger than this
+
+    # Cache Configuration
+    CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+    CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "data/.cache/cache.sqlite3")   # shared by all processes on the host
+    CACHE_MAX_BYTES = 256 * 1024 * 1024
+    CACHE_EVICT_EVERY = 100        # run size-based eviction every N writes
+    LLM_CACHE_TTL_S = 7 * 24 * 3600
+    RESULT_CACHE_TTL_S = 24 * 3600
+    MEMORY_CACHE_ENTRIES = 256     # in-process LRU in front of the disk tier
+
+    # Conversation Context Configuration
+    CONTEXT_MAX_TURNS = 5          # compact turn records kept per session
+    CONTEXT_MAX_CHARS = 2_000      # rendered context handed to the understanding agent
+    CONTEXT_MAX_TEXT = 160         # questions / answer headlines / key-number lines are clipped to this
+    CONTEXT_KEY_ROWS = 3           # result rows kept as key numbers per tool call
+
+    # Prefetch Configuration
+    PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+    PREFETCH_DIMENSIONS = [        # sibling / drill-down dimensions, most useful first
+        'device_type', 'network_type', 'transaction_type', 'sender_bank',
+        'sender_state', 'sender_age_group', 'merchant_category'
+    ]
+    PREFETCH_SIBLINGS = 2          # sibling dimensions tried per answer
+    PREFETCH_MAX_PLANS = 4         # follow-up plans queued per answer
+    PREFETCH_QUEUE_SIZE = 16       # further predictions are dropped while this many are pending
+    PREFETCH_MAX_COST = 50_000_000 # skip plans whose cheapest access path touches more cells than this
+    PREFETCH_CPU_SHARE = 0.25      # background thread uses at most this share of one core
+
+    # Comparison Configuration
+    COMPARISON_MAX_PAIRS = 50      # pairwise tests returned per metric (most significant first)
+
+    # Analytics Service Configuration
+    ANALYTICS_SERVICE_URL = os.getenv("ANALYTICS_SERVICE_URL", "")   # empty = run the workflow in-process
+    SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+    SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8765"))
+    SERVICE_MAX_CONCURRENT = 4     # requests executing at once
+    SERVICE_MAX_QUEUE = 32         # requests allowed to wait for a worker
+    SERVICE_QUEUE_TIMEOUT_S = 60
+    SERVICE_CLIENT_TIMEOUT_S = 180
+
     # Column Definitions
     TRANSACTION_COLUMNS = {
         'transaction_id': 'Unique identifier for each transaction',
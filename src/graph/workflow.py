@@ -4,23 +4,44 @@
 from typing import TypedDict, Annotated
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage, AIMessage
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import json
+import time
 
 from src.agents.query_agent import QueryUnderstandingAgent
 from src.agents.planner_agent import PlannerAgent
 from src.agents.analyzer_agent import AnalyzerAgent
-from src.agents.insight_agent import InsightAgent
+from src.agents.insight_agent import InsightAgent, templated_answer
+from src.agents.understand_plan_agent import UnderstandAndPlanAgent, PlanOutputError
+from src.config import config
+from src.utils.charts import build_chart
+from src.utils.context import ConversationContext
+from src.utils.prefetch import prefetcher
 
 # SHARED STATE
 # this is the common state which will be shared by all the agents to work together
 class AgentState(TypedDict):
     question: str
     conversation_history: list
+    context_text: str
+    previous_plan: dict
     query_plan: dict
     execution_plan: dict
     analysis_results: dict
+    chart: dict          # chart spec built from the analysis results (src/utils/charts.py)
     final_response: str
     error: str
+    deadline: float      # time.monotonic() by which the answer must be returned
+    degraded: bool       # answered from the template instead of the insight agent
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage would run past the request deadline"""
+
+
+# LLM / tool calls run here so a slow call can be abandoned at the deadline
+_stage_executor = ThreadPoolExecutor(max_workers=config.WORKFLOW_WORKERS, thread_name_prefix="stage")
+
 
 class Workflow:
     # initializing the 4 agents in constructor 
@@ -29,6 +50,8 @@ class Workflow:
         self.planner_agent = PlannerAgent()
         self.analyzer_agent = AnalyzerAgent()
         self.insight_agent = InsightAgent()
+        self.understand_plan_agent = UnderstandAndPlanAgent() if config.PIPELINE_MODE == "merged" else None
+        self._data_tool = None
         
         # Build the graph
         self.workflow = self._build_workflow()
@@ -39,33 +62,93 @@ class Workflow:
         workflow = StateGraph(AgentState)
         
         # Add nodes
-        workflow.add_node("understand_query", self.understand_query)
-        workflow.add_node("create_plan", self.create_plan)
+        if self.understand_plan_agent is not None:
+            workflow.add_node("understand_and_plan", self.understand_and_plan)
+        else:
+            workflow.add_node("understand_query", self.understand_query)
+            workflow.add_node("create_plan", self.create_plan)
         workflow.add_node("analyze_data", self.analyze_data)
         workflow.add_node("generate_insights", self.generate_insights)
+        workflow.add_node("templated_answer", self.answer_from_template)
+        workflow.add_node("prefetch_followups", self.prefetch_followups)
         
-        # Add edges
-        workflow.set_entry_point("understand_query")
-        workflow.add_edge("understand_query", "create_plan")
-        workflow.add_edge("create_plan", "analyze_data")
-        workflow.add_edge("analyze_data", "generate_insights")
-        workflow.add_edge("generate_insights", END)
+        # Add edges: every stage can short-circuit to the templated answer on an error,
+        # an empty plan or a deadline at risk instead of running the remaining LLM calls
+        if self.understand_plan_agent is not None:
+            workflow.set_entry_point("understand_and_plan")
+            workflow.add_conditional_edges("understand_and_plan", self._route_after_planning,
+                                           ["analyze_data", "templated_answer"])
+        else:
+            workflow.set_entry_point("understand_query")
+            workflow.add_conditional_edges("understand_query", self._route_after_understanding,
+                                           ["create_plan", "templated_answer"])
+            workflow.add_conditional_edges("create_plan", self._route_after_planning,
+                                           ["analyze_data", "templated_answer"])
+        workflow.add_conditional_edges("analyze_data", self._route_after_analysis,
+                                       ["generate_insights", "templated_answer"])
+        workflow.add_edge("generate_insights", "prefetch_followups")
+        workflow.add_edge("templated_answer", "prefetch_followups")
+        workflow.add_edge("prefetch_followups", END)
         
         return workflow.compile()
     
+    # ---------- deadlines and routing ----------
+    
+    def _remaining(self, state: AgentState) -> float:
+        """Seconds left before the request deadline"""
+        return state['deadline'] - time.monotonic()
+    
+    def _call_with_deadline(self, state: AgentState, func, *args):
+        """Run a stage call, giving up (not waiting for it) once the deadline passes"""
+        remaining = self._remaining(state)
+        if remaining <= 0:
+            raise DeadlineExceeded("request deadline reached")
+        future = _stage_executor.submit(func, *args)
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeout:
+            future.cancel()
+            raise DeadlineExceeded(f"stage did not finish within the {remaining:.1f}s left")
+    
+    def _route_after_understanding(self, state: AgentState) -> str:
+        if state.get('error') or self._remaining(state) <= 0:
+            return "templated_answer"
+        return "create_plan"
+    
+    def _route_after_planning(self, state: AgentState) -> str:
+        if state.get('error') or self._remaining(state) <= 0:
+            return "templated_answer"
+        return "analyze_data"
+    
+    def _route_after_analysis(self, state: AgentState) -> str:
+        results = state.get('analysis_results') or {}
+        if state.get('error') or not results or 'error' in results:
+            return "templated_answer"
+        if self._remaining(state) < config.INSIGHT_MIN_BUDGET_S:
+            print(f"⏱️ {self._remaining(state):.1f}s left, answering from the template")
+            return "templated_answer"
+        return "generate_insights"
+    
+    def _check_plan(self, state: AgentState):
+        """An empty plan would only make the analyzer and insight LLM calls guess"""
+        plan = state.get('execution_plan') or {}
+        # Any field counts: a plan with only sort + limit is a valid raw-row query ("10 largest transactions")
+        if not any(plan.values()):
+            state['error'] = "Planning produced an empty plan"
+    
+    # ---------- stages ----------
+    
     def understand_query(self, state: AgentState) -> AgentState:
         """Step 1: Understand the query"""
         print("\n🔍 Step 1: Understanding query...")
         
         try:
-            history = "\n".join([
-                f"Q: {msg['question']}\nA: {msg['response']}"
-                for msg in state.get('conversation_history', [])[-3:]
-            ])
-            
-            query_plan = self.query_agent.understand_query(
+            # Compact structured memory of earlier turns instead of full previous answers
+            query_plan = self._call_with_deadline(
+                state,
+                self.query_agent.understand_query,
                 state['question'],
-                history
+                state.get('context_text', '')
             )
             
             state['query_plan'] = query_plan.model_dump()
@@ -82,11 +165,15 @@ class Workflow:
         print("\n📋 Step 2: Creating execution plan...")
         
         try:
-            execution_plan = self.planner_agent.create_execution_plan(
-                state['query_plan']
-            )
+            query_plan = state['query_plan']
+            # Follow-ups start from the previous plan rather than re-deriving it
+            if query_plan.get('is_followup') and state.get('previous_plan'):
+                query_plan = {**query_plan, 'previous_execution_plan': state['previous_plan']}
+            
+            execution_plan = self._call_with_deadline(state, self.planner_agent.create_execution_plan, query_plan)
             
             state['execution_plan'] = execution_plan.dict()
+            self._check_plan(state)
             print(f"✓ Execution plan created")
             print(f"  Filters: {len(execution_plan.filters)}")
             print(f"  Grouping: {execution_plan.groupby}")
@@ -98,18 +185,56 @@ class Workflow:
         
         return state
     
+    def understand_and_plan(self, state: AgentState) -> AgentState:
+        """Steps 1+2 in one structured-output call (PIPELINE_MODE=merged)"""
+        print("\n🔍 Step 1+2: Understanding query and creating plan...")
+        
+        try:
+            result = self._call_with_deadline(
+                state,
+                self.understand_plan_agent.understand_and_plan,
+                state['question'],
+                state.get('context_text', '')
+            )
+            state['query_plan'] = result.query_plan.model_dump()
+            state['execution_plan'] = result.execution_plan.model_dump()
+            self._check_plan(state)
+            print(f"✓ Query understood: Intent={result.query_plan.intent}")
+            print(f"✓ Execution plan created")
+            
+        except PlanOutputError as e:
+            # Fall back to the two-call path rather than running an empty plan
+            print(f"⚠️ {e}; falling back to separate understanding and planning")
+            state = self.understand_query(state)
+            if not state.get('error'):
+                # Same early exit as the two-call graph: no planner call after a failed understanding
+                state = self.create_plan(state)
+
+        except Exception as e:
+            state['error'] = f"Query understanding failed: {str(e)}"
+            print(f"✗ Error: {state['error']}")
+
+        return state
+    
     def analyze_data(self, state: AgentState) -> AgentState:
         """Step 3: Analyze data"""
         print("\n📊 Step 3: Analyzing data...")
         
         try:
-            results = self.analyzer_agent.analyze(state['execution_plan'])
+            results = self._call_with_deadline(state, self.analyzer_agent.analyze, state['execution_plan'])
             state['analysis_results'] = results
             print(f"✓ Analysis completed")
             
         except Exception as e:
             state['error'] = f"Analysis failed: {str(e)}"
             print(f"✗ Error: {state['error']}")
+            return state
+        
+        try:
+            # Drawn from the aggregated rows the tools returned, no second scan
+            state['chart'] = build_chart(state['analysis_results'])
+        except Exception as e:
+            print(f"⚠️ No chart for this answer: {e}")
         
         return state
     
@@ -118,7 +243,9 @@ class Workflow:
         print("\n💡 Step 4: Generating insights...")
         
         try:
-            insights = self.insight_agent.generate_insights(
+            insights = self._call_with_deadline(
+                state,
+                self.insight_agent.generate_insights,
                 state['question'],
                 state['analysis_results']
             )
@@ -126,6 +253,12 @@ class Workflow:
             state['final_response'] = insights
             print(f"✓ Insights generated")
             
+        except DeadlineExceeded as e:
+            # The numbers are already there; don't make the user wait for the narrative
+            print(f"⏱️ Insight generation abandoned: {e}")
+            state['final_response'] = templated_answer(state['question'], state['analysis_results'])
+            state['degraded'] = True
+            
         except Exception as e:
             state['error'] = f"Insight generation failed: {str(e)}"
             state['final_response'] = "I encountered an error generating insights. Please try rephrasing your question."
@@ -133,17 +266,50 @@ class Workflow:
         
         return state
     
-    def run(self, question: str, conversation_history: list = None) -> str:
-        """Run the complete workflow"""
+    def answer_from_template(self, state: AgentState) -> AgentState:
+        """Step 4 (fallback): deterministic answer from whatever results exist, no LLM call"""
+        print("\n📝 Step 4: Answering from the template...")
+        timed_out = not state.get('error') or self._remaining(state) <= 0
+        state['final_response'] = templated_answer(state['question'], state.get('analysis_results'), timed_out)
+        state['degraded'] = True
+        return state
+    
+    def prefetch_followups(self, state: AgentState) -> AgentState:
+        """Step 5: Queue likely follow-up plans in the background (does not wait for them)"""
+        if state.get('error') or not state.get('execution_plan'):
+            return state
+        
+        try:
+            prefetcher.submit(state['execution_plan'], state.get('analysis_results'))
+        except Exception as e:
+            print(f"⚠️ Prefetch skipped: {e}")
+        
+        return state
+    
+    def run(self, question: str, conversation_history: list = None,
+            context: ConversationContext = None, deadline_s: float = None) -> str:
+        """Run the complete workflow.
+        Pass the session's ConversationContext to have it updated with this turn
+        (its last_chart() / last_rows() then hold the chart spec and row cursor of the answer);
+        a plain conversation_history list is still accepted and compressed on the fly.
+        The answer is returned within deadline_s (default REQUEST_DEADLINE_S)."""
+        
+        if context is None:
+            context = ConversationContext.from_history(conversation_history)
         
         initial_state = {
             "question": question,
             "conversation_history": conversation_history or [],
+            "context_text": context.render(),
+            "previous_plan": context.last_plan() or {},
             "query_plan": {},
             "execution_plan": {},
             "analysis_results": {},
+            "chart": None,
             "final_response": "",
-            "error": ""
+            "error": "",
+            "deadline": time.monotonic() + (deadline_s or config.REQUEST_DEADLINE_S),
+            "degraded": False
         }
         
         print(f"\n{'='*60}")
@@ -153,8 +319,26 @@ class Workflow:
         final_state = self.workflow.invoke(initial_state)
         
         if final_state.get('error'):
-            print(f"\n⚠️ Workflow completed with errors")
+            print(f"\n⚠️ Workflow completed with errors: {final_state['error']}")
+        elif final_state.get('degraded'):
+            print(f"\n⏱️ Workflow completed with a templated answer")
         else:
             print(f"\n✅ Workflow completed successfully")
         
-        return final_state['final_response']
\ No newline at end of file
+        context.update(
+            question,
+            final_state.get('query_plan'),
+            final_state.get('execution_plan'),
+            final_state.get('analysis_results'),
+            final_state.get('final_response'),
+            final_state.get('chart')
+        )
+        
+        return final_state['final_response']
+    
+    def fetch_page(self, cursor: str, offset: int, page_size: int = None) -> dict:
+        """More rows of a row-returning answer (the UI's "load more"); same as AnalyticsClient.fetch_page"""
+        if self._data_tool is None:
+            from src.tools.data_tools import DataQueryTool
+            self._data_tool = DataQueryTool()
+        return json.loads(self._data_tool.fetch_page(cursor, offset, page_size))
@@ -0,0 +1,86 @@
+# Thin client for the local analytics service (src/service/server.py)
+# - exposes the same `run(question, history)` call as Workflow so the UI can use either
+# - batch jobs can send execution plans / statistical analyses directly,
+#   and page through row-returning results (iter_rows)
+
+import json
+import urllib.error
+import urllib.request
+
+from src.config import config
+
+
+class ServiceError(Exception):
+    """Raised when the analytics service returns an error"""
+
+
+class AnalyticsClient:
+    def __init__(self, base_url: str = None, timeout: float = None):
+        self.base_url = (base_url or config.ANALYTICS_SERVICE_URL).rstrip('/')
+        self.timeout = timeout or config.SERVICE_CLIENT_TIMEOUT_S
+
+    def _request(self, path: str, payload: dict = None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            headers={'Content-Type': 'application/json'},
+            method='POST' if payload is not None else 'GET'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', str(e))
+            except Exception:
+                message = str(e)
+            raise ServiceError(f"{e.code}: {message}") from e
+
+    def run(self, question: str, conversation_history: list = None, context=None) -> str:
+        """Same contract as Workflow.run (the context is updated in place)"""
+        payload = {
+            'question': question,
+            'conversation_history': conversation_history or []
+        }
+        if context is not None:
+            payload['context'] = context.to_dict()
+        result = self._request('/ask', payload)
+        if context is not None and 'context' in result:
+            context.load(result['context'])
+        return result['response']
+
+    def query(self, execution_plan: dict) -> dict:
+        """Run an execution plan on the shared dataset"""
+        return self._request('/query', {'execution_plan': json.dumps(execution_plan)})
+
+    def fetch_page(self, cursor: str, offset: int = 0, page_size: int = None) -> dict:
+        """Another page of a row-returning query (its result carries 'cursor' and 'next_offset')"""
+        return self._request('/page', {'cursor': cursor, 'offset': offset, 'page_size': page_size})
+
+    def iter_rows(self, result: dict, page_size: int = None):
+        """All rows of a query result, fetching further pages only as they are consumed"""
+        while True:
+            yield from result.get('data', [])
+            if not result.get('cursor'):
+                return
+            result = self.fetch_page(result['cursor'], result['next_offset'], page_size)
+            if not result.get('success', True):
+                raise ServiceError(result.get('error'))
+
+    def analyze(self, analysis_type: str, parameters: dict) -> dict:
+        """Run a statistical analysis on the shared dataset"""
+        return self._request('/analyze', {
+            'analysis_type': analysis_type,
+            'parameters': json.dumps(parameters)
+        })
+
+    def dataset_info(self) -> dict:
+        return self._request('/dataset')
+
+    def profile_report(self) -> dict:
+        """Slowest profiled plan shapes on the service"""
+        return self._request('/profile')
+
+    def health(self) -> dict:
+        return self._request('/health')
@@ -0,0 +1,196 @@
+# THIS IS THE LOCAL ANALYTICS SERVICE
+# - one process owns the dataset, its indexes/caches and the agent workflow
+# - Streamlit front-ends and batch clients talk to it over a small local JSON API
+#   instead of each holding their own copy of the data
+# - requests are queued with admission control so a burst can't overload the process
+#
+# RUN: python -m src.service.server [--host 127.0.0.1] [--port 8765]
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.config import config
+from src.utils.context import ConversationContext
+from src.utils.data_loader import data_loader
+from src.utils.prefetch import prefetcher
+from src.utils.profiling import profile_report
+
+
+class ServiceBusy(Exception):
+    """Raised when the request queue is full or the wait for a worker timed out"""
+
+
+class AnalyticsService:
+    def __init__(self):
+        # A partitioned dataset only opens its catalog here
+        data_loader.open()
+        self._workflow = None
+        self._workflow_lock = threading.Lock()
+        self._data_tool = None
+        self._stats_tool = None
+
+        # Admission control: at most N requests execute, at most M more may wait
+        self._workers = threading.BoundedSemaphore(config.SERVICE_MAX_CONCURRENT)
+        self._queue_lock = threading.Lock()
+        self._waiting = 0
+        self.stats = {'served': 0, 'rejected': 0, 'timed_out': 0}
+
+    @property
+    def workflow(self):
+        """The agent workflow, built once on first use"""
+        with self._workflow_lock:
+            if self._workflow is None:
+                from src.graph.workflow import Workflow
+                self._workflow = Workflow()
+        return self._workflow
+
+    def _admit(self):
+        """Wait for a worker slot, or raise ServiceBusy"""
+        with self._queue_lock:
+            if self._waiting >= config.SERVICE_MAX_QUEUE:
+                self.stats['rejected'] += 1
+                raise ServiceBusy("Request queue is full, try again shortly")
+            self._waiting += 1
+        try:
+            if not self._workers.acquire(timeout=config.SERVICE_QUEUE_TIMEOUT_S):
+                with self._queue_lock:
+                    self.stats['timed_out'] += 1
+                raise ServiceBusy("Timed out waiting for a free worker")
+        finally:
+            with self._queue_lock:
+                self._waiting -= 1
+
+    def run_admitted(self, func, *args):
+        """Run `func` under admission control"""
+        self._admit()
+        try:
+            result = func(*args)
+            with self._queue_lock:
+                self.stats['served'] += 1
+            return result
+        finally:
+            self._workers.release()
+
+    def ask(self, question: str, conversation_history: list = None, context: dict = None) -> dict:
+        """Answer a natural-language question through the agent workflow.
+        The session's conversation context travels with the request and comes back updated."""
+        session_context = ConversationContext.from_dict(context) if context is not None else None
+        if session_context is None:
+            session_context = ConversationContext.from_history(conversation_history)
+        response = self.run_admitted(self.workflow.run, question, conversation_history or [], session_context)
+        return {'response': response, 'context': session_context.to_dict()}
+
+    def query(self, execution_plan: str) -> str:
+        """Run a raw execution plan through the data query tool (batch clients)"""
+        if self._data_tool is None:
+            from src.tools.data_tools import DataQueryTool
+            self._data_tool = DataQueryTool()
+        return self.run_admitted(self._data_tool.execute_query, execution_plan)
+
+    def fetch_page(self, cursor: str, offset: int = 0, page_size: int = None) -> str:
+        """Another page of a row-returning query (cursor from its first page)"""
+        if self._data_tool is None:
+            from src.tools.data_tools import DataQueryTool
+            self._data_tool = DataQueryTool()
+        return self.run_admitted(self._data_tool.fetch_page, cursor, offset, page_size)
+
+    def analyze(self, analysis_type: str, parameters: str) -> str:
+        """Run a statistical analysis (batch clients)"""
+        if self._stats_tool is None:
+            from src.tools.stats_tools import StatisticalTools
+            self._stats_tool = StatisticalTools()
+        return self.run_admitted(self._stats_tool.analyze, analysis_type, parameters)
+
+    def dataset_info(self) -> dict:
+        """Cached dataset profile for the UI sidebar"""
+        return data_loader.get_profile()
+
+    def profile_report(self) -> dict:
+        """Slowest profiled plan shapes (see src/utils/profiling.py)"""
+        return {'slowest': profile_report.slowest(20)}
+
+    def health(self) -> dict:
+        with self._queue_lock:
+            waiting = self._waiting
+        return {'status': 'ok', 'waiting': waiting, **self.stats,
+                'prefetch': {**prefetcher.stats, 'hit_rate': round(prefetcher.hit_rate(), 3)}}
+
+
+def make_handler(service: AnalyticsService):
+    """Build the HTTP handler bound to a service instance"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload):
+            body = payload if isinstance(payload, str) else json.dumps(payload, default=str)
+            body = body.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get('Content-Length', 0))
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, service.health())
+            elif self.path == '/dataset':
+                self._send(200, service.dataset_info())
+            elif self.path == '/profile':
+                self._send(200, service.profile_report())
+            else:
+                self._send(404, {'error': f'Unknown path: {self.path}'})
+
+        def do_POST(self):
+            try:
+                body = self._read_json()
+                if self.path == '/ask':
+                    self._send(200, service.ask(body['question'], body.get('conversation_history'), body.get('context')))
+                elif self.path == '/query':
+                    self._send(200, service.query(body['execution_plan']))
+                elif self.path == '/page':
+                    self._send(200, service.fetch_page(body['cursor'], body.get('offset', 0), body.get('page_size')))
+                elif self.path == '/analyze':
+                    self._send(200, service.analyze(body['analysis_type'], body['parameters']))
+                else:
+                    self._send(404, {'error': f'Unknown path: {self.path}'})
+            except ServiceBusy as e:
+                self._send(429, {'error': str(e)})
+            except (KeyError, json.JSONDecodeError) as e:
+                self._send(400, {'error': f'Bad request: {e}'})
+            except Exception as e:
+                self._send(500, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            if config.VERBOSE:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def serve(host: str = None, port: int = None):
+    """Start the analytics service and block"""
+    host = host or config.SERVICE_HOST
+    port = port or config.SERVICE_PORT
+
+    service = AnalyticsService()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"📡 Analytics service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the shared analytics service")
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -2,104 +2,689 @@ from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
 import pandas as pd
 import json
-from typing import Any, Dict, List
+import numpy as np
+from typing import Any, Dict, List, Optional
+from src.config import config
+from src.utils.cache import make_key, result_cache
+from src.utils.column_store import UnsupportedByKernel
+from src.utils.cube import cube_store
+from src.utils.cursor import RowCursor, row_cursors
 from src.utils.data_loader import data_loader
+from src.utils.expressions import apply_computations
+from src.utils.plan_compiler import PlanValidationError, cube_dimensions, plan_compiler
+from src.utils import profiling
+from src.utils.sampling import stratified_sampler
+from src.utils.sketches import SpaceSaving
+from src.utils.timeseries import timeseries_engine
 
 class QueryDataInput(BaseModel):
     execution_plan: str = Field(description="JSON string containing the execution plan with filters, groupby, aggregations")
 
 class DataQueryTool:
     def __init__(self):
-        self.df = data_loader.load_data()
+        # A partitioned dataset only opens its catalog: queries read the partitions they need
+        data_loader.open()
+        self._cardinality = {}
+    
+    @property
+    def df(self) -> pd.DataFrame:
+        """The in-memory frame (only used by the scan / index paths of a single-file dataset)"""
+        return data_loader.load_data()
     
     def execute_query(self, execution_plan: str) -> str:
         """Execute data query based on execution plan"""
+        profile = None
         try:
             plan = json.loads(execution_plan)
-            result_df = self.df.copy()
-            
-            # Apply filters
-            if 'filters' in plan and plan['filters']:
-                for filter_condition in plan['filters']:
-                    column = filter_condition['column']
-                    operator = filter_condition['operator']
-                    value = filter_condition['value']
-                    
-                    if operator == '==':
-                        result_df = result_df[result_df[column] == value]
-                    elif operator == '!=':
-                        result_df = result_df[result_df[column] != value]
-                    elif operator == '>':
-                        result_df = result_df[result_df[column] > value]
-                    elif operator == '<':
-                        result_df = result_df[result_df[column] < value]
-                    elif operator == '>=':
-                        result_df = result_df[result_df[column] >= value]
-                    elif operator == '<=':
-                        result_df = result_df[result_df[column] <= value]
-                    elif operator == 'in':
-                        result_df = result_df[result_df[column].isin(value)]
-            
-            # Apply grouping and aggregations
-            if 'groupby' in plan and plan['groupby']:
-                agg_dict = {}
-                for agg in plan.get('aggregations', []):
-                    col = agg['column']
-                    func = agg['function']
-                    alias = agg.get('alias', f"{func}_{col}")
-                    agg_dict[alias] = (col, func)
+            # "profile": true asks for an operator-level profile of this request
+            requested = bool(plan.pop('profile', False))
+            
+            # Same plan on the same dataset version, mode and backend -> reuse the result (shared across processes)
+            cache_key = make_key('query', plan, data_loader.version, plan.get('mode') or config.QUERY_MODE, data_loader.backend)
+            cached = None if requested else result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            profile = profiling.begin('query', requested)
+            
+            # Validate against the schema and pick an access path before touching any rows
+            with profiling.operator('compile'):
+                compiled = plan_compiler.compile(plan)
+            plan = compiled['plan']
+            access_path = compiled['access_path']
+            
+            if plan.get('resample'):
+                # Time-bucketed plans are answered from the time-series engine's partial aggregates
+                with profiling.operator('resample') as op:
+                    result = self._execute_resample(plan)
+                    op.rows_out = result['row_count']
+            elif self._use_approximate(plan):
+                # Exploratory plans over very large scans can be answered from the stratified sample
+                with profiling.operator('approximate') as op:
+                    result = self._execute_approximate(plan, compiled)
+                    op.rows_out = result['row_count']
+                # The trace reports what ran, not the cheapest full-data path
+                access_path = 'sample'
+            else:
+                result = self._execute_exact(plan, compiled)
+            
+            # Keep what the optimizer decided next to the result for tracing
+            result['optimized_plan'] = plan
+            result['optimizer'] = {key: compiled[key] for key in ('access_path', 'estimated_rows', 'cost', 'columns', 'filter_selectivity', 'partitions', 'warnings')}
+            result['optimizer']['access_path'] = access_path
+            
+            with profiling.operator('json_dump', rows_in=result['row_count']):
+                output = json.dumps(result, default=str)
+            result_cache.set(cache_key, output)
+            
+            if profile is not None:
+                result['profile'] = profiling.end(profile, profiling.plan_shape(plan, access_path))
+                profile = None
+                output = json.dumps(result, default=str)
+            return output
+            
+        except PlanValidationError as e:
+            return json.dumps({
+                'success': False,
+                'error': f"Invalid plan: {e}",
+                'data': []
+            })
+        except Exception as e:
+            return json.dumps({
+                'success': False,
+                'error': str(e),
+                'data': []
+            })
+        finally:
+            if profile is not None:
+                profiling.end(profile, {'error': True})
+    
+    def _execute_exact(self, plan: dict, compiled: dict) -> dict:
+        """Run a compiled plan on the full data via its chosen access path"""
+        if not plan['groupby'] and not plan['aggregations']:
+            # Raw rows: first page now, the rest through a cursor
+            return self._page_result(self._open_cursor(plan, compiled), 0, config.RESULT_PAGE_ROWS)
+        
+        if compiled['access_path'] != 'cube' and self._use_heavy_hitters(plan):
+            # "Top N groups by count" straight from the group columns' codes: no frame is materialised
+            with profiling.operator('heavy_hitters') as op:
+                result = self._execute_heavy_hitters(plan, compiled)
+                op.rows_out = result['row_count'] if result is not None else None
+            if result is not None:
+                return result
+        
+        dimensions = cube_dimensions(data_loader.get_schema(), data_loader.get_profile(), plan['filters'], plan['groupby'], plan['aggregations'])
+        columnar_df = None
+        if data_loader.backend == 'columnar' and compiled['access_path'] not in ('cube', 'partitions'):
+            with profiling.operator('columnar') as op:
+                columnar_df = self._execute_columnar(plan, compiled)
+                op.rows_out = len(columnar_df) if columnar_df is not None else None
+        
+        if compiled['access_path'] == 'cube':
+            with profiling.operator('cube') as op:
+                result_df = cube_store.get(dimensions).query(plan['filters'], plan['groupby'], plan['aggregations'])
+                op.rows_out = len(result_df)
+        elif columnar_df is not None:
+            result_df = columnar_df
+            if dimensions is not None:
+                cube_store.record_demand(dimensions, self._estimated_groups(list(dimensions)))
+        else:
+            if compiled['access_path'] == 'partitions':
+                # Only the partitions that can match are opened, and only the plan's columns are read
+                with profiling.operator('partitions', rows_in=compiled['partitions']['rows']) as op:
+                    result_df = data_loader.get_partitions().read(plan['filters'], compiled['columns'])
+                    op.rows_out = len(result_df)
+            else:
+                with profiling.operator('filter', rows_in=data_loader.row_count()) as op:
+                    positions = self._filter_positions(plan['filters'], compiled['access_path'])
+                    op.rows_out = data_loader.row_count() if positions is None else len(positions)
+                with profiling.operator('materialize', rows_in=op.rows_out):
+                    result_df = self._materialize(positions, compiled['columns'])
+            
+            # Apply grouping and aggregations (computations' conditional aggregates in the same pass)
+            with profiling.operator('aggregate', rows_in=len(result_df)) as op:
+                aggregations, result_df = self._conditional_aggregations(result_df, plan.get('aggregations', []))
+                if 'groupby' in plan and plan['groupby']:
+                    agg_dict = {}
+                    for agg in aggregations:
+                        col = agg['column']
+                        func = agg['function']
+                        alias = agg.get('alias', f"{func}_{col}")
+                        agg_dict[alias] = (col, func)
                 
-                result_df = result_df.groupby(plan['groupby']).agg(**agg_dict).reset_index()
-            
-            elif 'aggregations' in plan and plan['aggregations']:
-                # Global aggregation without grouping
-                result_dict = {}
-                for agg in plan['aggregations']:
-                    col = agg['column']
-                    func = agg['function']
-                    alias = agg.get('alias', f"{func}_{col}")
+                    result_df = result_df.groupby(plan['groupby'], observed=True).agg(**agg_dict).reset_index()
+            
+                elif aggregations:
+                    # Global aggregation without grouping
+                    result_dict = {}
+                    for agg in aggregations:
+                        col = agg['column']
+                        func = agg['function']
+                        alias = agg.get('alias', f"{func}_{col}")
                     
-                    if func == 'count':
-                        result_dict[alias] = result_df[col].count()
-                    elif func == 'sum':
-                        result_dict[alias] = result_df[col].sum()
-                    elif func == 'mean':
-                        result_dict[alias] = result_df[col].mean()
-                    elif func == 'median':
-                        result_dict[alias] = result_df[col].median()
-                    elif func == 'min':
-                        result_dict[alias] = result_df[col].min()
-                    elif func == 'max':
-                        result_dict[alias] = result_df[col].max()
+                        if func == 'count':
+                            result_dict[alias] = result_df[col].count()
+                        elif func == 'size':
+                            result_dict[alias] = len(result_df)
+                        elif func == 'sum':
+                            result_dict[alias] = result_df[col].sum()
+                        elif func == 'mean':
+                            result_dict[alias] = result_df[col].mean()
+                        elif func == 'median':
+                            result_dict[alias] = result_df[col].median()
+                        elif func == 'min':
+                            result_dict[alias] = result_df[col].min()
+                        elif func == 'max':
+                            result_dict[alias] = result_df[col].max()
+                        elif func == 'nunique':
+                            result_dict[alias] = result_df[col].nunique()
+                        elif func == 'std':
+                            result_dict[alias] = result_df[col].std()
                 
-                result_df = pd.DataFrame([result_dict])
-            
-            # Apply sorting
-            if 'sort' in plan and plan['sort']:
-                sort_by = plan['sort']['by']
-                ascending = plan['sort'].get('ascending', False)
-                result_df = result_df.sort_values(by=sort_by, ascending=ascending)
+                    result_df = pd.DataFrame([result_dict])
+                op.rows_out = len(result_df)
             
-            # Apply limit
-            if 'limit' in plan and plan['limit']:
-                result_df = result_df.head(plan['limit'])
+            # Plan shapes that keep coming back get a pre-aggregated cube
+            if dimensions is not None:
+                cube_store.record_demand(dimensions, self._estimated_groups(list(dimensions)))
+        
+        # Derived metrics on the aggregated rows, before sort/limit so they can be sorted by
+        if compiled['computations']:
+            with profiling.operator('compute', rows_in=len(result_df)):
+                result_df = apply_computations(result_df, compiled['computations'])
+        
+        # Apply sorting and limit; sort+limit only needs a partial selection
+        with profiling.operator('sort_limit', rows_in=len(result_df)) as op:
+            if plan.get('sort') and plan.get('limit'):
+                result_df = self._top_k(result_df, plan['sort'], plan['limit'])
+            else:
+                if 'sort' in plan and plan['sort']:
+                    sort_by = plan['sort']['by']
+                    ascending = plan['sort'].get('ascending', False)
+                    result_df = result_df.sort_values(by=sort_by, ascending=ascending)
             
-            # Convert to dict for JSON serialization
+                if 'limit' in plan and plan['limit']:
+                    result_df = result_df.head(plan['limit'])
+            op.rows_out = len(result_df)
+        
+        # Convert to dict for JSON serialization
+        with profiling.operator('to_records', rows_in=len(result_df)):
             result = result_df.to_dict('records')
+        
+        return {
+            'success': True,
+            'data': result,
+            'row_count': len(result),
+            'columns': list(result_df.columns) if len(result) > 0 else []
+        }
+    
+    def fetch_page(self, cursor_id: str, offset: int = 0, page_size: int = None) -> str:
+        """Another page of a row-returning query's result (see the 'cursor' in its output)"""
+        try:
+            cursor = row_cursors.get(cursor_id)
+            if cursor is None:
+                # Evicted here or opened by another process: rebuild it from the plan
+                plan = result_cache.get(cursor_id)
+                if plan is None:
+                    raise ValueError("Cursor expired, run the query again")
+                compiled = plan_compiler.compile(plan)
+                cursor = self._open_cursor(compiled['plan'], compiled)
+                if cursor.id != cursor_id:
+                    raise ValueError("The dataset changed since this cursor was opened, run the query again")
             
-            return json.dumps({
-                'success': True,
-                'data': result,
-                'row_count': len(result),
-                'columns': list(result_df.columns) if len(result) > 0 else []
-            }, default=str)
-            
+            page_size = min(int(page_size or config.RESULT_PAGE_ROWS), config.RESULT_MAX_ROWS)
+            return json.dumps(self._page_result(cursor, max(int(offset), 0), page_size), default=str)
         except Exception as e:
             return json.dumps({
                 'success': False,
                 'error': str(e),
                 'data': []
             })
+    
+    def iter_pages(self, cursor_id: str, page_size: int = None, offset: int = 0):
+        """Pages of a cursor as DataFrames, fetched one at a time (batch jobs)"""
+        while offset is not None:
+            page = json.loads(self.fetch_page(cursor_id, offset, page_size))
+            if not page.get('success'):
+                raise ValueError(page.get('error'))
+            yield pd.DataFrame(page['data'], columns=page['columns'] or None)
+            offset = page['next_offset']
+    
+    def _open_cursor(self, plan: dict, compiled: dict) -> RowCursor:
+        """Filter -> order -> cap the row positions; no row is materialised here"""
+        if compiled['access_path'] == 'partitions':
+            return self._open_partition_cursor(plan, compiled)
+        with profiling.operator('filter', rows_in=data_loader.row_count()) as op:
+            if data_loader.backend == 'columnar':
+                positions = np.flatnonzero(data_loader.get_column_store().mask(plan['filters']))
+            else:
+                positions = self._filter_positions(plan['filters'], compiled['access_path'])
+                if positions is None:
+                    positions = np.arange(len(self.df))
+            op.rows_out = len(positions)
+        total_rows = len(positions)
+        
+        cap = min(plan.get('limit') or config.RESULT_MAX_ROWS, config.RESULT_MAX_ROWS)
+        with profiling.operator('sort_limit', rows_in=total_rows) as op:
+            if plan.get('sort'):
+                # Only the sort columns of the matching rows are read (frame index = row position)
+                by = plan['sort']['by']
+                keys = data_loader.take(positions, [by] if isinstance(by, str) else list(by))
+                keys.index = positions
+                if total_rows > cap:
+                    keys = self._top_k(keys, plan['sort'], cap)
+                else:
+                    keys = keys.sort_values(by=by, ascending=plan['sort'].get('ascending', False), kind='stable')
+                positions = keys.index.to_numpy()
+            # A copy, so the cursor doesn't keep the full position array alive
+            positions = positions[:cap].copy()
+            op.rows_out = len(positions)
+        
+        cursor_id = make_key('cursor', plan, data_loader.version)
+        # Kept so any process can rebuild the cursor once this one forgets it
+        result_cache.set(cursor_id, plan)
+        # Truncated = cut by the RESULT_MAX_ROWS cap, not by the plan's own limit
+        truncated = total_rows > config.RESULT_MAX_ROWS and (plan.get('limit') or total_rows) > config.RESULT_MAX_ROWS
+        return row_cursors.open(cursor_id, positions, compiled['columns'], total_rows, truncated)
+    
+    def _open_partition_cursor(self, plan: dict, compiled: dict) -> RowCursor:
+        """Raw rows of a partitioned dataset: the matching rows of the surviving partitions are read,
+        ordered and capped, and the cursor keeps that (at most RESULT_MAX_ROWS) frame"""
+        with profiling.operator('partitions', rows_in=compiled['partitions']['rows']) as op:
+            rows = data_loader.get_partitions().read(plan['filters'], compiled['columns'])
+            op.rows_out = len(rows)
+        total_rows = len(rows)
+        
+        cap = min(plan.get('limit') or config.RESULT_MAX_ROWS, config.RESULT_MAX_ROWS)
+        with profiling.operator('sort_limit', rows_in=total_rows) as op:
+            if plan.get('sort'):
+                if total_rows > cap:
+                    rows = self._top_k(rows, plan['sort'], cap)
+                else:
+                    rows = rows.sort_values(by=plan['sort']['by'], ascending=plan['sort'].get('ascending', False), kind='stable')
+            rows = rows.head(cap).reset_index(drop=True)
+            op.rows_out = len(rows)
+        
+        cursor_id = make_key('cursor', plan, data_loader.version)
+        result_cache.set(cursor_id, plan)
+        truncated = total_rows > config.RESULT_MAX_ROWS and (plan.get('limit') or total_rows) > config.RESULT_MAX_ROWS
+        return row_cursors.open(cursor_id, np.arange(len(rows)), compiled['columns'], total_rows, truncated, rows)
+    
+    def _page_result(self, cursor: RowCursor, offset: int, size: int) -> dict:
+        """One page of rows in the usual result shape, plus where the next page starts"""
+        positions = cursor.page(offset, size)
+        with profiling.operator('materialize', rows_in=len(positions)):
+            if cursor.frame is not None:
+                page_df = cursor.frame.iloc[positions]
+            elif data_loader.backend == 'columnar':
+                page_df = data_loader.get_column_store().frame(cursor.columns, positions)
+            else:
+                page_df = self._materialize(positions, cursor.columns)
+        with profiling.operator('to_records', rows_in=len(page_df)):
+            data = page_df.to_dict('records')
+        
+        next_offset = offset + len(data)
+        has_more = next_offset < cursor.rows
+        return {
+            'success': True,
+            'data': data,
+            'row_count': len(data),
+            'columns': list(page_df.columns) if len(data) > 0 else [],
+            'total_rows': cursor.total_rows,
+            'available_rows': cursor.rows,
+            'offset': offset,
+            'next_offset': next_offset if has_more else None,
+            'cursor': cursor.id if has_more else None,
+            'truncated': cursor.truncated
+        }
+    
+    def _execute_columnar(self, plan: dict, compiled: dict) -> Optional[pd.DataFrame]:
+        """Run the filter/groupby/aggregate kernels on the memory-mapped column store.
+        Returns None for plans only the pandas path handles."""
+        store = data_loader.get_column_store()
+        try:
+            if plan['groupby'] or plan['aggregations']:
+                return store.aggregate(plan['filters'], plan['groupby'], plan['aggregations'])
+            return store.frame(compiled['columns'], np.flatnonzero(store.mask(plan['filters'])))
+        except UnsupportedByKernel as e:
+            print(f"  ⚠️ Column kernels can't run this plan ({e}), using pandas")
+            return None
+    
+    def _filter_positions(self, filters: List[dict], access_path: str) -> Optional[np.ndarray]:
+        """Row positions passing the (selectivity-ordered) filters, or None for all rows.
+        Each filter only looks at the rows that survived the previous ones."""
+        positions = None
+        for i, filter_condition in enumerate(filters):
+            column = filter_condition['column']
+            operator = filter_condition['operator']
+            value = filter_condition['value']
+            
+            if i == 0 and access_path == 'index':
+                index = data_loader.get_index(column)
+                values = value if operator == 'in' else [value]
+                hits = [index[v] for v in values if v in index]
+                positions = np.sort(np.concatenate(hits)) if hits else np.array([], dtype='int64')
+                continue
+            
+            series = self.df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype) and operator in ('==', '!=', 'in'):
+                # Compare integer codes instead of strings
+                codes = series.cat.codes.to_numpy()
+                if positions is not None:
+                    codes = codes[positions]
+                targets = value if operator == 'in' else [value]
+                target_codes = [series.cat.categories.get_loc(v) for v in targets if v in series.cat.categories]
+                mask = np.isin(codes, target_codes)
+                if operator == '!=':
+                    mask = ~mask
+            else:
+                if positions is not None:
+                    series = series.iloc[positions]
+                mask = self._filter_mask(series.to_frame(), [filter_condition])
+            
+            positions = np.flatnonzero(mask) if positions is None else positions[mask]
+        return positions
+    
+    def _materialize(self, positions: Optional[np.ndarray], columns: List[str]) -> pd.DataFrame:
+        """Only the pruned columns of the surviving rows"""
+        if positions is None:
+            return self.df[columns]
+        return self.df.iloc[positions, [self.df.columns.get_loc(col) for col in columns]]
+    
+    def _conditional_aggregations(self, df: pd.DataFrame, aggregations: List[dict]):
+        """Aggregations with a `where` condition read a masked copy of their column, so they
+        run in the same groupby as the others (SQL's  agg(...) FILTER (WHERE ...))."""
+        if not any(agg.get('where') for agg in aggregations):
+            return aggregations, df
+        
+        masked, rewritten = {}, []
+        for agg in aggregations:
+            if not agg.get('where'):
+                rewritten.append(agg)
+                continue
+            mask = self._filter_mask(df, agg['where'])
+            column = f"{agg['alias']}__where"
+            if agg['function'] == 'size':
+                masked[column], function = mask.astype('int64'), 'sum'
+            elif agg['function'] == 'sum':
+                masked[column], function = df[agg['column']] * mask, 'sum'
+            else:
+                masked[column], function = df[agg['column']].where(mask), agg['function']
+            rewritten.append({'column': column, 'function': function, 'alias': agg['alias']})
+        return rewritten, df.assign(**masked)
+    
+    def _filter_mask(self, df: pd.DataFrame, filters: List[dict]) -> np.ndarray:
+        """Boolean row mask for a list of filter conditions"""
+        mask = np.ones(len(df), dtype=bool)
+        for filter_condition in filters:
+            column = filter_condition['column']
+            operator = filter_condition['operator']
+            value = filter_condition['value']
+            
+            if operator == '==':
+                mask &= (df[column] == value).to_numpy()
+            elif operator == '!=':
+                mask &= (df[column] != value).to_numpy()
+            elif operator == '>':
+                mask &= (df[column] > value).to_numpy()
+            elif operator == '<':
+                mask &= (df[column] < value).to_numpy()
+            elif operator == '>=':
+                mask &= (df[column] >= value).to_numpy()
+            elif operator == '<=':
+                mask &= (df[column] <= value).to_numpy()
+            elif operator == 'in':
+                mask &= df[column].isin(value).to_numpy()
+        return mask
+    
+    def _estimate_scan_ms(self, plan: dict) -> float:
+        """Rough cost of an exact scan: rows x touched columns x per-cell cost"""
+        columns = {f['column'] for f in plan.get('filters', [])}
+        columns |= set(plan.get('groupby', []))
+        columns |= {agg['column'] for agg in plan.get('aggregations', [])}
+        if data_loader.is_partitioned:
+            # Only the partitions that survive pruning would be scanned
+            rows = data_loader.get_partitions().summary(plan.get('filters', []))['rows']
+        else:
+            rows = data_loader.row_count()
+        return rows * max(len(columns), 1) * config.SCAN_NS_PER_CELL / 1e6
+    
+    def _use_approximate(self, plan: dict) -> bool:
+        """Approximate when asked to, or in auto mode when the exact scan would blow the latency budget"""
+        mode = plan.get('mode') or config.QUERY_MODE
+        if mode == 'exact':
+            return False
+        
+        aggregations = plan.get('aggregations', [])
+        supported = bool(aggregations) and all(agg['function'] in ('count', 'sum', 'mean') and not agg.get('where')
+                                               for agg in aggregations)
+        if mode == 'approximate':
+            if not supported:
+                print("  ⚠️ Approximate mode supports count/sum/mean only, running exact query")
+            return supported
+        return supported and self._estimate_scan_ms(plan) > config.LATENCY_BUDGET_MS
+    
+    def _execute_approximate(self, plan: dict, compiled: dict) -> dict:
+        """Estimate aggregates from the stratified sample with confidence intervals"""
+        sample, strata = stratified_sampler.get_sample()
+        mask = self._filter_mask(sample, plan.get('filters', []))
+        
+        measures = []
+        for agg in plan['aggregations']:
+            col = agg['column']
+            func = agg['function']
+            alias = agg.get('alias', f"{func}_{col}")
+            if func == 'count':
+                # count() skips nulls, so estimate the total of a non-null indicator
+                measures.append((alias, 'sum', sample[col].notna().astype('float64')))
+            else:
+                measures.append((alias, func, sample[col]))
+        
+        result_df = stratified_sampler.estimate(sample, mask, plan.get('groupby', []), measures)
+        result_df = apply_computations(result_df, compiled['computations'])
+        
+        if plan.get('sort') and plan.get('limit'):
+            result_df = self._top_k(result_df, plan['sort'], plan['limit'])
+        elif plan.get('sort'):
+            result_df = result_df.sort_values(by=plan['sort']['by'], ascending=plan['sort'].get('ascending', False))
+        elif plan.get('limit'):
+            result_df = result_df.head(plan['limit'])
+        
+        result = result_df.to_dict('records')
+        
+        return {
+            'success': True,
+            'data': result,
+            'row_count': len(result),
+            'columns': list(result_df.columns) if len(result) > 0 else [],
+            'approximate': True,
+            'method': 'stratified_sample',
+            'confidence': config.APPROX_CONFIDENCE,
+            'sample_rows': len(sample),
+            'population_rows': int(strata['population'].sum())
+        }
+    
+    def _top_k(self, df: pd.DataFrame, sort: dict, limit: int) -> pd.DataFrame:
+        """Select the first `limit` rows in sort order without sorting every row"""
+        by = sort['by']
+        ascending = sort.get('ascending', False)
+        by_cols = [by] if isinstance(by, str) else list(by)
+        
+        # nlargest/nsmallest use partial selection but only work on numeric columns
+        if all(pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]) for col in by_cols):
+            if ascending:
+                return df.nsmallest(limit, by_cols)
+            return df.nlargest(limit, by_cols)
+        
+        return df.sort_values(by=by, ascending=ascending).head(limit)
+    
+    def _estimated_groups(self, columns: List[str]) -> int:
+        """Upper bound on the number of groups for a groupby over `columns`"""
+        categorical = data_loader.get_profile()['categorical']
+        estimate = 1
+        for col in columns:
+            if col not in self._cardinality:
+                distinct = categorical.get(col, {}).get('distinct')
+                self._cardinality[col] = int(distinct) + 1 if distinct is not None else int(data_loader.read_columns([col])[col].nunique(dropna=False))
+            estimate *= self._cardinality[col]
+        return estimate
+    
+    def _use_heavy_hitters(self, plan: dict) -> bool:
+        """Decide whether a plan can (and should) use the approximate heavy-hitters path"""
+        mode = plan.get('topk_mode', 'auto')
+        if mode == 'exact':
+            return False
+        
+        aggregations = plan.get('aggregations', [])
+        sort = plan.get('sort') or {}
+        eligible = (
+            not plan.get('computations')
+            and bool(plan.get('groupby'))
+            and bool(plan.get('limit'))
+            and len(aggregations) == 1
+            and aggregations[0]['function'] in ('count', 'size')
+            and not aggregations[0].get('where')
+            and not sort.get('ascending', False)
+            and sort.get('by') in (None, aggregations[0].get('alias', f"{aggregations[0]['function']}_{aggregations[0]['column']}"))
+        )
+        if not eligible:
+            return False
+        if mode == 'heavy_hitters':
+            return True
+        return self._estimated_groups(plan['groupby']) >= config.HEAVY_HITTER_MIN_GROUPS
+    
+    def _execute_heavy_hitters(self, plan: dict, compiled: dict) -> Optional[dict]:
+        """Top-N groups by count over combined group codes: exact with one bincount when the
+        key space is small enough, otherwise Space-Saving with error bounds (None = can't encode)"""
+        groupby = plan['groupby']
+        agg = plan['aggregations'][0]
+        alias = agg.get('alias', f"{agg['function']}_{agg['column']}")
+        
+        # Match groupby semantics: null group keys are dropped, count() skips nulls
+        counted = agg['column'] if agg['function'] == 'count' and agg['column'] not in groupby else None
+        codes, labels, keep = self._group_codes(plan, compiled, groupby, counted)
+        for col in groupby:
+            keep = keep & (codes[col] >= 0)
+        
+        # Combine the group columns into one integer key (mixed radix over the codes)
+        radices = [max(len(labels[col]), 1) for col in groupby]
+        space = int(np.prod(radices, dtype=object))
+        if space >= 2 ** 62:
+            return None
+        keys = np.zeros(int(keep.sum()), dtype='int64')
+        for col, radix in zip(groupby, radices):
+            keys = keys * radix + codes[col][keep]
+        
+        summary = None
+        if space <= config.HEAVY_HITTER_DENSE_KEYS:
+            # Dense key space: exact counts are cheaper than any summary
+            counts = np.bincount(keys, minlength=space)
+            present = np.flatnonzero(counts)
+            if len(present) > plan['limit']:
+                present = present[np.argpartition(-counts[present], plan['limit'] - 1)[:plan['limit']]]
+            present = present[np.lexsort((present, -counts[present]))]
+            top = pd.DataFrame({'key': present, 'count': counts[present]})
+        else:
+            summary = SpaceSaving(config.HEAVY_HITTER_CAPACITY)
+            chunk_rows = config.HEAVY_HITTER_CHUNK_ROWS
+            for start in range(0, len(keys), chunk_rows):
+                summary.update(keys[start:start + chunk_rows])
+            top = summary.top(plan['limit'])
+        
+        # Decode the combined keys back into group values
+        remaining = top['key'].to_numpy()
+        decoded = {}
+        for col, radix in reversed(list(zip(groupby, radices))):
+            decoded[col] = np.asarray(labels[col], dtype=object)[remaining % radix]
+            remaining = remaining // radix
+        
+        result_df = pd.DataFrame({col: decoded[col] for col in groupby})
+        result_df[alias] = top['count'].to_numpy()
+        if summary is None:
+            result = result_df.to_dict('records')
+            return {
+                'success': True,
+                'data': result,
+                'row_count': len(result),
+                'columns': list(result_df.columns) if len(result) > 0 else [],
+                'method': 'bincount',
+            }
+        
+        result_df[f"{alias}_error"] = top['error'].to_numpy()
+        result = result_df.to_dict('records')
+        return {
+            'success': True,
+            'data': result,
+            'row_count': len(result),
+            'columns': list(result_df.columns) if len(result) > 0 else [],
+            'approximate': True,
+            'method': 'space_saving',
+            'error_bound': {
+                'max_count_error': int(summary.floor),
+                'total_counted': int(summary.total),
+                'capacity': summary.capacity,
+                'note': f"Each {alias} is an upper bound, at most {alias}_error above the true count. Groups outside the summary have at most max_count_error rows."
+            }
+        }
+    
+    def _group_codes(self, plan: dict, compiled: dict, columns: List[str], counted: Optional[str] = None):
+        """Integer codes (-1 = null) and labels per group column for the rows passing the filters,
+        plus which of those rows have a non-null `counted` column. Categorical columns are used
+        as stored (straight from the column store under the columnar backend); others get factorized."""
+        store, frame, positions = None, None, None
+        if compiled['access_path'] == 'partitions':
+            frame = data_loader.get_partitions().read(plan['filters'], columns + ([counted] if counted else []))
+        elif data_loader.backend == 'columnar':
+            store = data_loader.get_column_store()
+            positions = np.flatnonzero(store.mask(plan['filters']))
+        else:
+            frame = self.df
+            positions = self._filter_positions(plan['filters'], compiled['access_path'])
+        
+        def column(col: str) -> pd.Series:
+            if store is not None:
+                return store.frame([col], positions)[col]
+            return frame[col] if positions is None else frame[col].iloc[positions]
+        
+        codes, labels = {}, {}
+        for col in columns:
+            if store is not None and store.kind(col) == 'category':
+                codes[col] = store.column(col)[positions].astype('int64')
+                labels[col] = store.categories(col)
+            elif frame is not None and isinstance(frame[col].dtype, pd.CategoricalDtype):
+                all_codes = frame[col].cat.codes.to_numpy()
+                codes[col] = (all_codes if positions is None else all_codes[positions]).astype('int64')
+                labels[col] = frame[col].cat.categories
+            else:
+                codes[col], labels[col] = pd.factorize(column(col))
+        
+        rows = len(positions) if positions is not None else len(frame)
+        if counted is None:
+            valid = np.ones(rows, dtype=bool)
+        elif store is not None:
+            valid = store.not_null(counted, positions)
+        else:
+            valid = column(counted).notna().to_numpy()
+        return codes, labels, valid
+    
+    def _execute_resample(self, plan: dict) -> dict:
+        """Execute a plan with a `resample` block (freq, window, start, end) as a time series"""
+        params = dict(plan['resample'])
+        params['filters'] = plan.get('filters', [])
+        params['segment_by'] = plan.get('groupby', [])
+        if plan.get('limit'):
+            params['max_points'] = plan['limit']
+        
+        results = timeseries_engine.trend(params)
+        
+        return {
+            'success': True,
+            'data': results['series'],
+            'row_count': results['points'],
+            'columns': list(results['series'][0].keys()) if results['series'] else [],
+            'freq': results['freq'],
+            'truncated': results['truncated']
+        }
 
 def create_data_query_tool() :
     """Create the data query tool"""
@@ -107,7 +692,7 @@ def create_data_query_tool() :
     return StructuredTool.from_function(
         func=query_tool_instance.execute_query,
         name="query_transaction_data",
-        description="Execute queries on transaction data based on execution plan. Input should be a JSON string with filters, groupby, aggregations, sort, and limit.",
+        description="Execute queries on transaction data based on execution plan. Input should be a JSON string with filters, groupby, aggregations, computations (derived-metric formulas), sort, and limit. Add a resample block ({\"freq\": \"day\", \"window\": 7}) for trends over time.",
         # func=query_tool_instance.execute_query,
         args_schema=QueryDataInput
     )
\ No newline at end of file
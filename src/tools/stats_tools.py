@@ -4,102 +4,235 @@ import pandas as pd
 import numpy as np
 from scipy import stats
 import json
+from src.config import config
+from src.utils.cache import make_key, result_cache
 from src.utils.data_loader import data_loader
+from src.utils import profiling
+from src.utils.sampling import stratified_sampler
+from src.utils.timeseries import timeseries_engine
+from src.utils.anomaly import anomaly_detector
+
+# Rate metrics for comparisons: name -> per-row 0/1 indicator
+RATE_METRICS = {
+    'failure_rate': lambda df: df['transaction_status'] == 'FAILED',
+    'success_rate': lambda df: df['transaction_status'] == 'SUCCESS',
+    'fraud_rate': lambda df: df['fraud_flag'],
+}
 
 class StatsAnalysisInput(BaseModel):
-    analysis_type: str = Field(description="Type of analysis: failure_rate, fraud_rate, correlation, trend, distribution")
+    analysis_type: str = Field(description="Type of analysis: failure_rate, fraud_rate, correlation, trend, distribution, comparison, anomaly")
     parameters: str = Field(description="JSON string with parameters for the analysis")
 
 class StatisticalTools:
     def __init__(self):
-        self.df = data_loader.load_data()
+        # A partitioned dataset only opens its catalog: each analysis reads the columns it uses
+        data_loader.open()
+    
+    def _frame(self, columns: list, filters: list = None) -> pd.DataFrame:
+        """Only the columns an analysis reads (and, when partitioned, only partitions that can match
+        the equality `filters`; the analysis still applies its filters itself)"""
+        pushed = [{'column': f['column'], 'operator': '==', 'value': f['value']} for f in filters or []]
+        return data_loader.read_columns(list(dict.fromkeys(columns)), pushed)
     
     def analyze(self, analysis_type: str, parameters: str) -> str:
         """Perform statistical analysis"""
+        profile = None
         try:
             params = json.loads(parameters)
+            # "profile": true asks for an operator-level profile of this request
+            requested = bool(params.pop('profile', False))
+            
+            # Same analysis on the same dataset version, mode and backend -> reuse the result (shared across processes)
+            cache_key = make_key('stats', analysis_type, params, data_loader.version,
+                                 params.get('mode') or config.QUERY_MODE, data_loader.backend)
+            cached = None if requested else result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            profile = profiling.begin(f"stats:{analysis_type}", requested)
             
             if analysis_type == 'failure_rate':
-                return self._calculate_failure_rate(params)
+                output = self._calculate_failure_rate(params)
             elif analysis_type == 'fraud_rate':
-                return self._calculate_fraud_rate(params)
+                output = self._calculate_fraud_rate(params)
             elif analysis_type == 'correlation':
-                return self._analyze_correlation(params)
+                output = self._analyze_correlation(params)
             elif analysis_type == 'distribution':
-                return self._analyze_distribution(params)
+                output = self._analyze_distribution(params)
             elif analysis_type == 'comparison':
-                return self._compare_segments(params)
+                output = self._compare_segments(params)
+            elif analysis_type == 'trend':
+                output = self._analyze_trend(params)
+            elif analysis_type == 'anomaly':
+                output = self._detect_anomalies(params)
             else:
                 return json.dumps({'success': False, 'error': 'Unknown analysis type'})
+            
+            result_cache.set(cache_key, output)
+            
+            if profile is not None:
+                result = json.loads(output)
+                result['profile'] = profiling.end(profile, {
+                    'segment_by': params.get('segment_by'),
+                    'filters': sorted(str(f.get('column')) for f in params.get('filters', [])),
+                })
+                profile = None
+                output = json.dumps(result, default=str)
+            return output
                 
         except Exception as e:
             return json.dumps({'success': False, 'error': str(e)})
+        finally:
+            if profile is not None:
+                profiling.end(profile, {'error': True})
+    
+    def _use_approximate(self, params: dict) -> bool:
+        """Approximate when asked to, or in auto mode when a full scan would blow the latency budget"""
+        mode = params.get('mode') or config.QUERY_MODE
+        if mode == 'auto':
+            columns = len(params.get('filters', [])) + 2
+            return data_loader.row_count() * columns * config.SCAN_NS_PER_CELL / 1e6 > config.LATENCY_BUDGET_MS
+        return mode == 'approximate'
+    
+    def _approximate_rate(self, params: dict, analysis: str, count_key: str, indicator) -> str:
+        """Estimate a rate per segment from the stratified sample with confidence intervals"""
+        sample, strata = stratified_sampler.get_sample()
+        
+        mask = np.ones(len(sample), dtype=bool)
+        for filter_cond in params.get('filters', []):
+            mask &= (sample[filter_cond['column']] == filter_cond['value']).to_numpy()
+        
+        segment = params.get('segment_by')
+        groupby = [segment] if segment else []
+        measures = [
+            ('total', 'count', None),
+            (count_key, 'sum', indicator(sample).astype('float64')),
+            (analysis, 'mean', indicator(sample).astype('float64')),
+        ]
+        estimates = stratified_sampler.estimate(sample, mask, groupby, measures)
+        for col in [analysis, f'{analysis}_ci_low', f'{analysis}_ci_high']:
+            estimates[col] = (estimates[col] * 100).clip(0, 100)
+        for col in ['total_ci_low', f'{count_key}_ci_low']:
+            estimates[col] = estimates[col].clip(lower=0)
+        
+        if segment:
+            results = estimates.set_index(segment).to_dict('index')
+        else:
+            results = {'overall': estimates.iloc[0].to_dict()}
+        
+        return json.dumps({
+            'success': True,
+            'analysis': analysis,
+            'results': results,
+            'approximate': True,
+            'confidence': config.APPROX_CONFIDENCE,
+            'sample_rows': len(sample),
+            'population_rows': int(strata['population'].sum())
+        }, default=str)
+    
+    def _columnar_rate(self, params: dict, analysis: str, count_key: str, column: str, positive: list) -> str:
+        """Rate per segment from the column store kernels (same result shape as the pandas path)"""
+        filters = [{'column': f['column'], 'operator': '==', 'value': f['value']} for f in params.get('filters', [])]
+        segment = params.get('segment_by')
+        counts = data_loader.get_column_store().rate(filters, [segment] if segment else [], column, positive)
+        
+        results = {}
+        for row in counts.itertuples(index=False):
+            total, hits = int(row.total), int(row.hits)
+            key = getattr(row, segment) if segment else 'overall'
+            key = key.item() if hasattr(key, 'item') else key
+            results[key] = {'total': total, count_key: hits, analysis: hits / total * 100 if total > 0 else 0}
+        
+        return json.dumps({'success': True, 'analysis': analysis, 'results': results}, default=str)
     
     def _calculate_failure_rate(self, params: dict) -> str:
         """Calculate failure rate by segment"""
-        df = self.df.copy()
+        if self._use_approximate(params):
+            return self._approximate_rate(params, 'failure_rate', 'failed', lambda x: x['transaction_status'] == 'FAILED')
+        if data_loader.backend == 'columnar' and not data_loader.is_partitioned:
+            # (partitions are column stores already: the pandas path reads only their needed columns)
+            return self._columnar_rate(params, 'failure_rate', 'failed', 'transaction_status', ['FAILED'])
+        
+        filters = params.get('filters', [])
+        segment = params.get('segment_by')
+        with profiling.operator('read', rows_in=data_loader.row_count()):
+            df = self._frame([f['column'] for f in filters] + ([segment] if segment else []) + ['transaction_status'], filters)
         
-        # Apply filters
-        if 'filters' in params:
-            for filter_cond in params['filters']:
-                col = filter_cond['column']
-                val = filter_cond['value']
-                df = df[df[col] == val]
+        with profiling.operator('filter', rows_in=len(df)) as op:
+            # Apply filters
+            if 'filters' in params:
+                for filter_cond in params['filters']:
+                    col = filter_cond['column']
+                    val = filter_cond['value']
+                    df = df[df[col] == val]
+            op.rows_out = len(df)
         
         # Calculate by segment
         segment = params.get('segment_by')
         
-        if segment:
-            results = df.groupby(segment).apply(
-                lambda x: {
-                    'total': len(x),
-                    'failed': (x['transaction_status'] == 'FAILED').sum(),
-                    'failure_rate': (x['transaction_status'] == 'FAILED').sum() / len(x) * 100 if len(x) > 0 else 0
-                }
-            ).to_dict()
-        else:
-            total = len(df)
-            failed = (df['transaction_status'] == 'FAILED').sum()
-            results = {
-                'overall': {
-                    'total': total,
-                    'failed': failed,
-                    'failure_rate': failed / total * 100 if total > 0 else 0
+        with profiling.operator('groupby', rows_in=len(df)):
+            if segment:
+                results = df.groupby(segment, observed=True).apply(
+                    lambda x: {
+                        'total': len(x),
+                        'failed': (x['transaction_status'] == 'FAILED').sum(),
+                        'failure_rate': (x['transaction_status'] == 'FAILED').sum() / len(x) * 100 if len(x) > 0 else 0
+                    }
+                ).to_dict()
+            else:
+                total = len(df)
+                failed = (df['transaction_status'] == 'FAILED').sum()
+                results = {
+                    'overall': {
+                        'total': total,
+                        'failed': failed,
+                        'failure_rate': failed / total * 100 if total > 0 else 0
+                    }
                 }
-            }
         
         return json.dumps({'success': True, 'analysis': 'failure_rate', 'results': results}, default=str)
     
     def _calculate_fraud_rate(self, params: dict) -> str:
         """Calculate fraud flag rate"""
-        df = self.df.copy()
+        if self._use_approximate(params):
+            return self._approximate_rate(params, 'fraud_rate', 'flagged', lambda x: x['fraud_flag'])
+        if data_loader.backend == 'columnar' and not data_loader.is_partitioned:
+            return self._columnar_rate(params, 'fraud_rate', 'flagged', 'fraud_flag', [True])
+        
+        filters = params.get('filters', [])
+        segment = params.get('segment_by')
+        with profiling.operator('read', rows_in=data_loader.row_count()):
+            df = self._frame([f['column'] for f in filters] + ([segment] if segment else []) + ['fraud_flag'], filters)
         
-        if 'filters' in params:
-            for filter_cond in params['filters']:
-                col = filter_cond['column']
-                val = filter_cond['value']
-                df = df[df[col] == val]
+        with profiling.operator('filter', rows_in=len(df)) as op:
+            if 'filters' in params:
+                for filter_cond in params['filters']:
+                    col = filter_cond['column']
+                    val = filter_cond['value']
+                    df = df[df[col] == val]
+            op.rows_out = len(df)
         
         segment = params.get('segment_by')
         
-        if segment:
-            results = df.groupby(segment).apply(
-                lambda x: {
-                    'total': len(x),
-                    'flagged': x['fraud_flag'].sum() if 'fraud_flag' in x.columns else 0,
-                    'fraud_rate': x['fraud_flag'].sum() / len(x) * 100 if len(x) > 0 and 'fraud_flag' in x.columns else 0
-                }
-            ).to_dict()
-        else:
-            total = len(df)
-            flagged = df['fraud_flag'].sum() if 'fraud_flag' in df.columns else 0
-            results = {
-                'overall': {
-                    'total': total,
-                    'flagged': flagged,
-                    'fraud_rate': flagged / total * 100 if total > 0 else 0
+        with profiling.operator('groupby', rows_in=len(df)):
+            if segment:
+                results = df.groupby(segment, observed=True).apply(
+                    lambda x: {
+                        'total': len(x),
+                        'flagged': x['fraud_flag'].sum() if 'fraud_flag' in x.columns else 0,
+                        'fraud_rate': x['fraud_flag'].sum() / len(x) * 100 if len(x) > 0 and 'fraud_flag' in x.columns else 0
+                    }
+                ).to_dict()
+            else:
+                total = len(df)
+                flagged = df['fraud_flag'].sum() if 'fraud_flag' in df.columns else 0
+                results = {
+                    'overall': {
+                        'total': total,
+                        'flagged': flagged,
+                        'fraud_rate': flagged / total * 100 if total > 0 else 0
+                    }
                 }
-            }
         
         return json.dumps({'success': True, 'analysis': 'fraud_rate', 'results': results}, default=str)
     
@@ -108,7 +241,8 @@ class StatisticalTools:
         var1 = params['variable1']
         var2 = params['variable2']
         
-        contingency_table = pd.crosstab(self.df[var1], self.df[var2])
+        df = self._frame([var1, var2])
+        contingency_table = pd.crosstab(df[var1], df[var2])
         chi2, p_value, dof, expected = stats.chi2_contingency(contingency_table)
         
         results = {
@@ -124,7 +258,7 @@ class StatisticalTools:
     def _analyze_distribution(self, params: dict) -> str:
         """Analyze distribution of a metric"""
         column = params['column']
-        data = self.df[column].dropna()
+        data = self._frame([column])[column].dropna()
         
         results = {
             'mean': float(data.mean()),
@@ -139,13 +273,153 @@ class StatisticalTools:
         return json.dumps({'success': True, 'analysis': 'distribution', 'results': results}, default=str)
     
     def _compare_segments(self, params: dict) -> str:
-        """Compare metrics across segments"""
+        """Compare several metrics across segments in one grouped pass, with pairwise significance tests.
+        Rate metrics (failure_rate, success_rate, fraud_rate or any boolean column) get two-proportion
+        z-tests and Cohen's h; numeric columns get Welch t-tests and Cohen's d."""
         segment_col = params['segment_by']
-        metric_col = params['metric']
+        metrics = params.get('metrics') or [params['metric']]
+        if isinstance(metrics, str):
+            metrics = [metrics]
+        alpha = float(params.get('alpha', 0.05))
+        max_pairs = int(params.get('max_pairs', config.COMPARISON_MAX_PAIRS))
+        
+        filters = params.get('filters', [])
+        metric_columns = []
+        for metric in metrics:
+            if metric in ('failure_rate', 'success_rate'):
+                metric_columns.append('transaction_status')
+            elif metric == 'fraud_rate':
+                metric_columns.append('fraud_flag')
+            else:
+                metric_columns.append(metric)
+        df = self._frame([segment_col] + [f['column'] for f in filters] + metric_columns, filters)
+        mask = np.ones(len(df), dtype=bool)
+        for filter_cond in filters:
+            mask &= (df[filter_cond['column']] == filter_cond['value']).to_numpy()
+        
+        # Build every per-row input once, then aggregate them all in a single groupby
+        frame = pd.DataFrame({segment_col: df[segment_col].to_numpy()[mask]})
+        agg_spec = {'_total': ('_one', 'sum')}
+        frame['_one'] = 1
+        kinds = {}
+        for metric in metrics:
+            indicator = RATE_METRICS[metric](df) if metric in RATE_METRICS else None
+            if indicator is None and pd.api.types.is_bool_dtype(df[metric]):
+                indicator = df[metric]
+            
+            if indicator is not None:
+                kinds[metric] = 'rate'
+                frame[f'{metric}__x'] = indicator.to_numpy()[mask].astype('int64')
+                agg_spec[f'{metric}__hits'] = (f'{metric}__x', 'sum')
+            else:
+                kinds[metric] = 'numeric'
+                values = df[metric].to_numpy(dtype='float64')[mask]
+                frame[f'{metric}__x'] = values
+                agg_spec[f'{metric}__n'] = (f'{metric}__x', 'count')
+                agg_spec[f'{metric}__sum'] = (f'{metric}__x', 'sum')
+                # Sample variance from the groupby itself (sum of squares minus n*mean^2 cancels badly on large amounts)
+                agg_spec[f'{metric}__var'] = (f'{metric}__x', 'var')
+                agg_spec[f'{metric}__median'] = (f'{metric}__x', 'median')
+        
+        grouped = frame.groupby(segment_col, observed=True).agg(**agg_spec)
+        segments = grouped.index.to_numpy()
+        i, j = np.triu_indices(len(segments), k=1)
+        
+        summary = {str(seg): {'total': int(total)} for seg, total in zip(segments, grouped['_total'])}
+        pairwise = {}
+        for metric in metrics:
+            if kinds[metric] == 'rate':
+                n = grouped['_total'].to_numpy(dtype='float64')
+                hits = grouped[f'{metric}__hits'].to_numpy(dtype='float64')
+                rate = np.divide(hits, n, out=np.zeros_like(n), where=n > 0)
+                for seg, h, r in zip(segments, hits, rate):
+                    summary[str(seg)][metric] = {'count': int(h), 'rate': round(r * 100, 4)}
+                tests = self._two_proportion_tests(rate[i], rate[j], hits[i], hits[j], n[i], n[j])
+            else:
+                n = grouped[f'{metric}__n'].to_numpy(dtype='float64')
+                total = grouped[f'{metric}__sum'].to_numpy(dtype='float64')
+                mean = np.divide(total, n, out=np.full_like(n, np.nan), where=n > 0)
+                var = grouped[f'{metric}__var'].to_numpy(dtype='float64')
+                for seg, c, m, v, t, med in zip(segments, n, mean, var, total, grouped[f'{metric}__median']):
+                    summary[str(seg)][metric] = {'count': int(c), 'mean': m, 'median': med, 'std': float(np.sqrt(v)), 'sum': t}
+                tests = self._welch_t_tests(mean[i], mean[j], var[i], var[j], n[i], n[j])
+            
+            tests['p_adjusted'] = self._holm_adjust(tests['p_value'])
+            tests['significant'] = tests['p_adjusted'] < alpha
+            tests['segment_a'] = segments[i].astype(str)
+            tests['segment_b'] = segments[j].astype(str)
+            
+            pairs = pd.DataFrame(tests).sort_values('p_value', kind='stable')
+            pairwise[metric] = {
+                'test': "two-proportion z-test" if kinds[metric] == 'rate' else "Welch t-test",
+                'effect_size': "Cohen's h" if kinds[metric] == 'rate' else "Cohen's d",
+                'pairs_tested': len(pairs),
+                'significant_pairs': int(pairs['significant'].sum()),
+                'pairs': pairs.head(max_pairs).replace({np.nan: None}).to_dict('records'),
+            }
         
-        results = self.df.groupby(segment_col)[metric_col].agg(['count', 'mean', 'median', 'sum']).to_dict('index')
+        results = {
+            'segment_by': segment_col,
+            'alpha': alpha,
+            'segments': summary,
+            'pairwise': pairwise
+        }
         
         return json.dumps({'success': True, 'analysis': 'comparison', 'results': results}, default=str)
+    
+    def _two_proportion_tests(self, p1, p2, x1, x2, n1, n2) -> dict:
+        """Vectorised two-proportion z-tests over arrays of segment pairs"""
+        pooled = (x1 + x2) / (n1 + n2)
+        se = np.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(se > 0, (p1 - p2) / se, 0.0)
+        return {
+            'difference': (p1 - p2) * 100,
+            'statistic': z,
+            'p_value': 2 * stats.norm.sf(np.abs(z)),
+            'effect_size': 2 * np.arcsin(np.sqrt(p1)) - 2 * np.arcsin(np.sqrt(p2)),
+        }
+    
+    def _welch_t_tests(self, m1, m2, v1, v2, n1, n2) -> dict:
+        """Vectorised Welch t-tests over arrays of segment pairs"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            se2 = v1 / n1 + v2 / n2
+            t = (m1 - m2) / np.sqrt(se2)
+            dof = se2 ** 2 / ((v1 / n1) ** 2 / (n1 - 1) + (v2 / n2) ** 2 / (n2 - 1))
+            pooled_sd = np.sqrt(((n1 - 1) * v1 + (n2 - 1) * v2) / (n1 + n2 - 2))
+            p_value = 2 * stats.t.sf(np.abs(t), dof)
+            effect = (m1 - m2) / pooled_sd
+        return {
+            'difference': m1 - m2,
+            'statistic': t,
+            'p_value': p_value,
+            'effect_size': effect,
+        }
+    
+    def _holm_adjust(self, p_values: np.ndarray) -> np.ndarray:
+        """Holm-Bonferroni adjusted p-values (many segments means many pairs)"""
+        p = np.nan_to_num(np.asarray(p_values, dtype='float64'), nan=1.0)
+        m = len(p)
+        if m == 0:
+            return p
+        order = np.argsort(p)
+        adjusted = np.maximum.accumulate((m - np.arange(m)) * p[order])
+        result = np.empty(m)
+        result[order] = np.minimum(adjusted, 1.0)
+        return result
+    
+    def _analyze_trend(self, params: dict) -> str:
+        """Resampled failure/fraud/volume trend with rolling windows and period-over-period deltas"""
+        results = timeseries_engine.trend(params)
+        
+        return json.dumps({'success': True, 'analysis': 'trend', 'results': results}, default=str)
+    
+    def _detect_anomalies(self, params: dict) -> str:
+        """Segments whose failure / fraud-flag rate in the newest time bucket is far from their EWMA baseline"""
+        with profiling.operator('anomaly'):
+            results = anomaly_detector.detect(params)
+        
+        return json.dumps({'success': True, 'analysis': 'anomaly', 'results': results}, default=str)
 
 def create_stats_tool():
     """Create statistical analysis tool"""
@@ -153,7 +427,7 @@ def create_stats_tool():
     return StructuredTool.from_function(
         func=stats_tool_instance.analyze,
         name="statistical_analysis",
-        description="Perform statistical analysis like failure_rate, fraud_rate, correlation, distribution, comparison. Input: analysis_type and parameters as JSON string.",
+        description="Perform statistical analysis like failure_rate, fraud_rate, correlation, distribution, comparison, trend, anomaly. Input: analysis_type and parameters as JSON string. trend parameters: freq (minute/hour/day/week), window, segment_by, filters, start, end. comparison parameters: segment_by, metrics (e.g. [\"failure_rate\", \"amount_inr\"]), filters. anomaly (is anything unusual right now?) parameters: segment_by (device_type/network_type/sender_bank/sender_state), metrics (failure_rate/fraud_rate), z_threshold.",
         # func=stats_tool_instance.analyze,
         args_schema=StatsAnalysisInput
     )
\ No newline at end of file
@@ -0,0 +1,334 @@
+# This file defines the AnomalyDetector behind the `anomaly` analysis ("is anything unusual right now?"):
+# Keeps, per segment of every ANOMALY_DIMENSIONS column (plus the overall traffic), an exponentially
+# weighted mean and variance of the failure rate and fraud-flag rate over closed time buckets
+# The newest (open) bucket is scored against that baseline, so a question never rescans history
+# State is persisted per dataset version; when a new version only appends rows after the last
+# folded timestamp (a new monthly partition, rows added to the file) just those rows are folded in,
+# right when the new version is opened, and the superseded state file is removed
+
+import os
+import glob
+import json
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from src.config import config
+from src.utils.data_loader import data_loader
+
+METRICS = ('failure_rate', 'fraud_rate')
+OVERALL = 'overall'
+BUCKET_NS = {
+    'hour': 3_600 * 10**9,
+    'day': 86_400 * 10**9,
+    'week': 7 * 86_400 * 10**9,
+}
+# 1970-01-01 was a Thursday: shifting by 3 days makes weekly buckets start on Monday
+WEEK_OFFSET_NS = 3 * 86_400 * 10**9
+
+
+class AnomalyDetector:
+    def __init__(self):
+        self._state: Optional[dict] = None
+
+    def _settings(self) -> dict:
+        """State built under other settings can't be extended, only rebuilt"""
+        return {
+            'freq': config.ANOMALY_FREQ,
+            'alpha': config.ANOMALY_ALPHA,
+            'min_bucket_rows': config.ANOMALY_MIN_BUCKET_ROWS,
+            'dimensions': list(config.ANOMALY_DIMENSIONS),
+        }
+
+    def _path(self, version: str) -> str:
+        return os.path.join(config.CACHE_DIR, f"anomaly_{version}.json")
+
+    # ---------- keeping the state current ----------
+
+    def refresh(self) -> dict:
+        """State for the loaded dataset version: in memory, persisted, extended from an older version, or built"""
+        version = data_loader.version
+        if self._state is not None and self._state['version'] == version:
+            return self._state
+
+        settings = self._settings()
+        state = self._read(self._path(version))
+        if state is not None and state['settings'] == settings:
+            self._state = state
+            return state
+
+        rows = self._rows(settings)
+        timestamps = rows['timestamp'].to_numpy().astype('datetime64[ns]').view('int64')
+        base = self._extendable(settings, timestamps)
+        if base is not None:
+            start = base['rows']
+            how = 'appended'
+        else:
+            base, start, how = self._empty(settings), 0, 'built'
+
+        self._fold(base, rows.iloc[start:], timestamps[start:])
+        base['version'] = version
+        base['rows'] = len(rows)
+        print(f"  🚨 Anomaly baseline {how}: {len(rows) - start:,} rows folded ({len(rows):,} total)")
+        self._write(base)
+        self._state = base
+        return base
+
+    def _rows(self, settings: dict) -> pd.DataFrame:
+        """Just the columns the baselines need, rows with a timestamp only, in time order"""
+        columns = ['timestamp', 'transaction_status', 'fraud_flag'] + settings['dimensions']
+        rows = data_loader.read_columns(columns)
+        rows = rows[rows['timestamp'].notna()]
+        # Partitions are read one after another: only sort when they aren't already in time order
+        if not rows['timestamp'].is_monotonic_increasing:
+            rows = rows.sort_values('timestamp', kind='stable')
+        return rows
+
+    def _extendable(self, settings: dict, timestamps: np.ndarray) -> Optional[dict]:
+        """Latest state (any older version) whose rows are still the first rows of the data"""
+        candidates = [self._state] if self._state is not None else []
+        paths = sorted(glob.glob(os.path.join(config.CACHE_DIR, "anomaly_*.json")), key=os.path.getmtime, reverse=True)
+        for path in paths:
+            candidates.append(self._read(path))
+        for state in candidates:
+            if state is None or state['settings'] != settings or state['watermark'] is None:
+                continue
+            # Appended data leaves exactly the already-folded rows at or before the watermark
+            if state['rows'] <= len(timestamps) and int(np.searchsorted(timestamps, state['watermark'], side='right')) == state['rows']:
+                return json.loads(json.dumps(state))
+        return None
+
+    def _empty(self, settings: dict) -> dict:
+        return {
+            'version': None,
+            'settings': settings,
+            'rows': 0,
+            'watermark': None,     # last folded timestamp (ns)
+            'open_bucket': None,   # bucket number of the newest, still open bucket
+            'dimensions': {},
+        }
+
+    def _bucket_numbers(self, timestamps: np.ndarray, freq: str) -> np.ndarray:
+        if freq == 'week':
+            return (timestamps + WEEK_OFFSET_NS) // BUCKET_NS['week']
+        return timestamps // BUCKET_NS[freq]
+
+    def _fold(self, state: dict, rows: pd.DataFrame, timestamps: np.ndarray):
+        """Fold rows (in time order, all after the watermark) into every dimension's state"""
+        if not len(rows):
+            return
+        settings = state['settings']
+        buckets = self._bucket_numbers(timestamps, settings['freq'])
+        # Bucket numbers of this chunk, 0..k-1 in time order
+        chunk_buckets, bucket_pos = np.unique(buckets, return_inverse=True)
+        counts = np.stack([
+            np.ones(len(rows), dtype='int64'),
+            (rows['transaction_status'] == 'FAILED').to_numpy(dtype='int64'),
+            rows['fraud_flag'].to_numpy(dtype='int64'),
+        ], axis=1)
+
+        for dim in [OVERALL] + settings['dimensions']:
+            entry = state['dimensions'].setdefault(dim, {
+                'segments': [], 'mean': [], 'var': [], 'buckets': [], 'open': [],
+            })
+            codes = self._segment_codes(entry, rows, dim)
+            segments = len(entry['segments'])
+            known = codes >= 0
+            flat = bucket_pos[known] * segments + codes[known]
+            cells = np.stack([
+                np.bincount(flat, weights=counts[known, i], minlength=len(chunk_buckets) * segments)
+                for i in range(3)
+            ], axis=1).reshape(len(chunk_buckets), segments, 3)
+            self._advance(entry, state['open_bucket'], chunk_buckets, cells, settings)
+
+        state['open_bucket'] = int(chunk_buckets[-1])
+        state['watermark'] = int(timestamps[-1])
+
+    def _segment_codes(self, entry: dict, rows: pd.DataFrame, dim: str) -> np.ndarray:
+        """Row -> index into entry['segments'] (-1 for nulls), registering unseen segments"""
+        if dim == OVERALL:
+            if not entry['segments']:
+                entry['segments'].append('all')
+                self._grow(entry, 1)
+            return np.zeros(len(rows), dtype='int64')
+
+        series = rows[dim]
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype('category')
+        categories = [str(v) for v in series.cat.categories]
+        position = {segment: i for i, segment in enumerate(entry['segments'])}
+        new = [c for c in categories if c not in position]
+        if new:
+            entry['segments'].extend(new)
+            self._grow(entry, len(new))
+            position = {segment: i for i, segment in enumerate(entry['segments'])}
+        # Category codes of this frame -> segment positions of the state (-1 stays -1)
+        lookup = np.array([position[c] for c in categories] + [-1], dtype='int64')
+        return lookup[series.cat.codes.to_numpy()]
+
+    def _grow(self, entry: dict, n: int):
+        entry['mean'].extend([[0.0] * len(METRICS) for _ in range(n)])
+        entry['var'].extend([[0.0] * len(METRICS) for _ in range(n)])
+        entry['buckets'].extend([0] * n)
+        entry['open'].extend([[0, 0, 0] for _ in range(n)])
+
+    def _advance(self, entry: dict, open_bucket: Optional[int], chunk_buckets: np.ndarray, cells: np.ndarray, settings: dict):
+        """Close buckets one after another (vectorised over segments) and keep the newest one open"""
+        mean = np.asarray(entry['mean'], dtype='float64')
+        var = np.asarray(entry['var'], dtype='float64')
+        seen = np.asarray(entry['buckets'], dtype='int64')
+        current = np.asarray(entry['open'], dtype='float64')
+        alpha = settings['alpha']
+
+        start = 0
+        if open_bucket is not None and chunk_buckets[0] == open_bucket:
+            # The chunk continues the open bucket
+            current = current + cells[0]
+            start = 1
+        for i in range(start, len(chunk_buckets)):
+            if open_bucket is not None or i > 0:
+                self._close(mean, var, seen, current, alpha, settings['min_bucket_rows'])
+            current = cells[i].astype('float64')
+
+        entry['mean'] = mean.tolist()
+        entry['var'] = var.tolist()
+        entry['buckets'] = seen.tolist()
+        entry['open'] = current.astype('int64').tolist()
+
+    def _close(self, mean: np.ndarray, var: np.ndarray, seen: np.ndarray, counts: np.ndarray, alpha: float, min_rows: int):
+        """EWMA mean / variance update with the rates of a finished bucket (busy enough segments only)"""
+        total = counts[:, 0]
+        active = total >= max(min_rows, 1)
+        if not active.any():
+            return
+        rates = counts[active, 1:] / total[active, None]
+        first = seen[active] == 0
+        diff = rates - mean[active]
+        increment = alpha * diff
+        new_mean = np.where(first[:, None], rates, mean[active] + increment)
+        new_var = np.where(first[:, None], 0.0, (1 - alpha) * (var[active] + diff * increment))
+        mean[active] = new_mean
+        var[active] = new_var
+        seen[active] += 1
+
+    def _read(self, path: str) -> Optional[dict]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, state: dict):
+        os.makedirs(config.CACHE_DIR, exist_ok=True)
+        path = self._path(state['version'])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+        # Older versions' states are superseded: later versions extend this one
+        for old_path in glob.glob(os.path.join(config.CACHE_DIR, "anomaly_*.json")):
+            if old_path != path:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+    # ---------- scoring ----------
+
+    def detect(self, params: dict) -> dict:
+        """Segments whose rate in the newest bucket is far from their EWMA baseline"""
+        if params.get('filters'):
+            raise ValueError("anomaly analysis works on whole segments; use segment_by instead of filters")
+        state = self.refresh()
+        settings = state['settings']
+
+        segment_by = params.get('segment_by') or settings['dimensions']
+        if isinstance(segment_by, str):
+            segment_by = [segment_by]
+        unknown = [dim for dim in segment_by if dim not in settings['dimensions']]
+        if unknown:
+            raise ValueError(f"Unsupported segment_by {unknown}, choose from {settings['dimensions']}")
+        metrics = params.get('metrics') or list(METRICS)
+        if isinstance(metrics, str):
+            metrics = [metrics]
+        unknown = [metric for metric in metrics if metric not in METRICS]
+        if unknown:
+            raise ValueError(f"Unsupported metrics {unknown}, choose from {list(METRICS)}")
+
+        threshold = float(params.get('z_threshold', config.ANOMALY_Z_THRESHOLD))
+        min_rows = int(params.get('min_rows', config.ANOMALY_MIN_BUCKET_ROWS))
+        top = int(params.get('top', config.ANOMALY_MAX_RESULTS))
+
+        anomalies, checked = [], 0
+        for dim in [OVERALL] + list(segment_by):
+            entry = state['dimensions'].get(dim)
+            if entry is None:
+                continue
+            scored = self._score(entry, metrics, min_rows)
+            checked += len(scored['z'])
+            for i in np.flatnonzero(np.abs(scored['z']) >= threshold):
+                segment, metric = scored['segment'][i], scored['metric'][i]
+                anomalies.append({
+                    'dimension': dim,
+                    'segment': segment,
+                    'metric': metric,
+                    'rate': round(float(scored['rate'][i]) * 100, 2),
+                    'expected': round(float(scored['expected'][i]) * 100, 2),
+                    'z_score': round(float(scored['z'][i]), 2),
+                    'direction': 'spike' if scored['z'][i] > 0 else 'drop',
+                    'transactions': int(scored['transactions'][i]),
+                })
+        anomalies.sort(key=lambda a: -abs(a['z_score']))
+
+        bucket = None
+        if state['open_bucket'] is not None:
+            offset = WEEK_OFFSET_NS if settings['freq'] == 'week' else 0
+            bucket = pd.Timestamp(state['open_bucket'] * BUCKET_NS[settings['freq']] - offset)
+        overall = state['dimensions'].get(OVERALL, {}).get('open', [[0, 0, 0]])[0]
+        return {
+            'freq': settings['freq'],
+            'bucket': str(bucket) if bucket is not None else None,
+            'bucket_transactions': int(overall[0]),
+            'segment_by': list(segment_by),
+            'metrics': metrics,
+            'z_threshold': threshold,
+            'checked': checked,
+            'anomaly_count': len(anomalies),
+            'anomalies': anomalies[:top],
+            'baseline': {'method': 'ewma', 'alpha': settings['alpha'], 'rows': state['rows']},
+        }
+
+    def _score(self, entry: dict, metrics: List[str], min_rows: int) -> Dict[str, np.ndarray]:
+        """z-scores of the open bucket for every scorable (segment, metric)"""
+        mean = np.asarray(entry['mean'], dtype='float64')
+        var = np.asarray(entry['var'], dtype='float64')
+        seen = np.asarray(entry['buckets'], dtype='int64')
+        current = np.asarray(entry['open'], dtype='float64')
+        total = current[:, 0]
+        scorable = (total >= max(min_rows, 1)) & (seen >= config.ANOMALY_MIN_HISTORY)
+
+        columns = {name: [] for name in ('segment', 'metric', 'rate', 'expected', 'z', 'transactions')}
+        for metric in metrics:
+            m = METRICS.index(metric)
+            idx = np.flatnonzero(scorable)
+            n = total[idx]
+            rate = current[idx, m + 1] / n
+            expected = mean[idx, m]
+            # A small bucket is noisy on its own: never trust a spread below the binomial one
+            p = np.clip(expected, 0.5 / n, 1 - 0.5 / n)
+            spread = np.sqrt(np.maximum(var[idx, m], p * (1 - p) / n))
+            columns['segment'].extend(entry['segments'][i] for i in idx)
+            columns['metric'].extend([metric] * len(idx))
+            columns['rate'].extend(rate)
+            columns['expected'].extend(expected)
+            columns['z'].extend((rate - expected) / spread)
+            columns['transactions'].extend(n)
+        return {name: np.asarray(values) if name in ('rate', 'expected', 'z', 'transactions') else values
+                for name, values in columns.items()}
+
+
+# Global shared instance, like data_loader
+anomaly_detector = AnomalyDetector()
+# Baselines are refreshed (or extended with appended rows) as soon as a dataset version is opened
+data_loader.on_load(anomaly_detector.refresh)
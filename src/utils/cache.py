@@ -0,0 +1,171 @@
+# This file defines the cache tiers shared by agents and tools:
+# DiskCache   - SQLite file shared by every process on the host (WAL mode, TTLs, size-based LRU eviction)
+# TieredCache - small in-process LRU in front of a DiskCache namespace
+# llm_cache    : understanding/planning LLM outputs keyed by prompt + model + temperature
+# result_cache : tool results keyed by plan + dataset version
+# A cache failure is never fatal: it is logged and treated as a miss.
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+from src.config import config
+
+
+def make_key(*parts: Any) -> str:
+    """Stable hash of JSON-serialisable parts"""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def llm_cache_key(messages: list, model: str, temperature: float) -> str:
+    """Cache key for an LLM call: the rendered prompt plus the model settings"""
+    return make_key([(m.type, m.content) for m in messages], model, temperature)
+
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()  # request threads and the prefetch thread share the counter
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread (and per process after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if row[1] < now:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+                return None
+            # Only touch last_access occasionally so hot reads don't all turn into writes
+            conn.execute(
+                "UPDATE cache SET last_access = ? WHERE namespace = ? AND key = ? AND last_access < ?",
+                (now, namespace, key, now - 60)
+            )
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"  ⚠️ Disk cache read failed: {e}")
+            return None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float):
+        try:
+            payload = json.dumps(value, default=str)
+            now = time.time()
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, size, expires, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, payload, len(payload), now + ttl, now)
+            )
+            with self._writes_lock:
+                self._writes += 1
+                due = self._writes % config.CACHE_EVICT_EVERY == 0
+            if due:
+                self.evict()
+        except sqlite3.Error as e:
+            print(f"  ⚠️ Disk cache write failed: {e}")
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under the size budget"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                # Delete from the least recently used end until enough bytes are freed
+                conn.execute("""
+                    DELETE FROM cache WHERE rowid IN (
+                        SELECT rowid FROM (
+                            SELECT rowid, size, SUM(size) OVER (ORDER BY last_access, rowid) AS freed
+                            FROM cache
+                        ) WHERE freed - size < ?
+                    )
+                """, (total - self.max_bytes,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class TieredCache:
+    def __init__(self, namespace: str, disk: DiskCache, ttl: float, memory_entries: int):
+        self.namespace = namespace
+        self.disk = disk
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        if not config.CACHE_ENABLED:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] >= time.time():
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry[0]
+
+        value = self.disk.get(self.namespace, key)
+        with self._lock:
+            if value is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float = None):
+        if not config.CACHE_ENABLED:
+            return
+        ttl = ttl or self.ttl
+        with self._lock:
+            self._remember(key, value, ttl)
+        self.disk.set(self.namespace, key, value, ttl)
+
+    def _remember(self, key: str, value: Any, ttl: float = None):
+        self._memory[key] = (value, time.time() + (ttl or self.ttl))
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+
+disk_cache = DiskCache(config.CACHE_DB_PATH, config.CACHE_MAX_BYTES)
+llm_cache = TieredCache('llm', disk_cache, config.LLM_CACHE_TTL_S, config.MEMORY_CACHE_ENTRIES)
+result_cache = TieredCache('result', disk_cache, config.RESULT_CACHE_TTL_S, config.MEMORY_CACHE_ENTRIES)
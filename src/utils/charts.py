@@ -0,0 +1,249 @@
+# This file turns the tool results of a turn into a chart specification for the UI:
+# The spec is built from the aggregated rows the tools already returned (never a second data scan)
+# and always holds at most CHART_MAX_POINTS points, so drawing it costs the same at any dataset size:
+#   time series (resample plans, trend analyses) -> line chart, downsampled server-side with
+#       LTTB (one series) or min-max per bucket (several series sharing the x axis)
+#   grouped results / rates per segment -> bar chart of the top CHART_TOP_N categories,
+#       the rest folded into "Other" when the measure adds up (counts, sums)
+# Spec: {kind, title, x, y, color, data: [records], points, source_points, downsampled}
+
+import json
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+from src.config import config
+
+OTHER_LABEL = "Other"
+ADDITIVE_FUNCTIONS = ('count', 'size', 'sum')
+ORDERED_DIMENSIONS = ('hour_of_day', 'day_of_week', 'is_weekend')
+# Resample plans return every trend metric; the plan's aggregation picks the one to draw
+RESAMPLE_METRICS = {'sum': 'amount_sum', 'mean': 'avg_amount', 'count': 'total', 'size': 'total'}
+
+
+def build_chart(analysis_results: dict, max_points: int = None, top_n: int = None) -> Optional[dict]:
+    """Chart spec for the first tool result that can be drawn, or None"""
+    max_points = max_points or config.CHART_MAX_POINTS
+    top_n = top_n or config.CHART_TOP_N
+    for item in (analysis_results or {}).get('results', []):
+        try:
+            result = json.loads(item.get('result', ''))
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(result, dict) or not result.get('success'):
+            continue
+        table = _query_table(result) if 'data' in result else _stats_table(result)
+        if table is None:
+            continue
+        frame, spec = table
+        if frame.empty or spec['y'] not in frame.columns:
+            continue
+        if spec['kind'] == 'line':
+            return _line_chart(frame, spec, max_points)
+        return _bar_chart(frame, spec, max_points, top_n)
+    return None
+
+
+# ---------- tool result -> (frame, spec) ----------
+
+def _query_table(result: dict):
+    plan = result.get('optimized_plan') or {}
+    data = result.get('data') or []
+    if not data or result.get('cursor') is not None:
+        return None
+    frame = pd.DataFrame(data)
+    groupby = plan.get('groupby') or []
+    aggregations = plan.get('aggregations') or []
+
+    if plan.get('resample'):
+        function = aggregations[0]['function'] if aggregations else 'count'
+        y = RESAMPLE_METRICS.get(function, 'total')
+        return frame, _spec('line', 'bucket', y, groupby[0] if groupby else None)
+
+    if not groupby or not aggregations:
+        # A single number (or raw rows): nothing to draw
+        return None
+    computations = [c['name'] for c in plan.get('computations') or []]
+    visible = [agg for agg in aggregations if agg['alias'] in frame.columns]
+    y = computations[0] if computations else (visible[0]['alias'] if visible else None)
+    if y is None:
+        return None
+    additive = not computations and visible[0]['function'] in ADDITIVE_FUNCTIONS
+    x, color = groupby[0], (groupby[1] if len(groupby) > 1 else None)
+    if color in ORDERED_DIMENSIONS and x not in ORDERED_DIMENSIONS:
+        # e.g. state x hour: hours along the axis, one line per state
+        x, color = color, x
+    kind = 'line' if x in ORDERED_DIMENSIONS else 'bar'
+    return frame, _spec(kind, x, y, color, additive)
+
+
+def _stats_table(result: dict):
+    analysis = result.get('analysis')
+    results = result.get('results') or {}
+
+    if analysis == 'trend':
+        segment = results.get('segment_by') or []
+        frame = pd.DataFrame(results.get('series') or [])
+        return frame, _spec('line', 'bucket', 'failure_rate', segment[0] if segment else None)
+
+    if analysis in ('failure_rate', 'fraud_rate'):
+        if list(results) == ['overall']:
+            return None
+        frame = pd.DataFrame([{'segment': key, analysis: value.get(analysis)} for key, value in results.items()])
+        return frame, _spec('bar', 'segment', analysis)
+
+    if analysis == 'comparison':
+        segments = results.get('segments') or {}
+        metric = next(iter(results.get('pairwise') or {}), None)
+        if metric is None:
+            return None
+        rows = []
+        for key, summary in segments.items():
+            value = summary.get(metric) or {}
+            rows.append({results.get('segment_by', 'segment'): key, metric: value.get('rate', value.get('mean'))})
+        return pd.DataFrame(rows), _spec('bar', results.get('segment_by', 'segment'), metric)
+
+    if analysis == 'anomaly':
+        rows = [{'segment': f"{a['dimension']}={a['segment']} ({a['metric']})", 'z_score': a['z_score']}
+                for a in results.get('anomalies') or []]
+        return pd.DataFrame(rows), _spec('bar', 'segment', 'z_score')
+
+    return None
+
+
+def _spec(kind: str, x: str, y: str, color: str = None, additive: bool = False) -> dict:
+    return {'kind': kind, 'x': x, 'y': y, 'color': color, 'additive': additive}
+
+
+# ---------- line charts ----------
+
+def _line_chart(frame: pd.DataFrame, spec: dict, max_points: int) -> dict:
+    x, y, color = spec['x'], spec['y'], spec['color']
+    frame = frame.dropna(subset=[y])
+    source_points = len(frame)
+    method = None
+
+    if source_points > max_points:
+        if color is None:
+            frame = frame.sort_values(x, kind='stable')
+            frame = frame.iloc[lttb(_numeric_axis(frame[x]), frame[y].to_numpy(dtype='float64'), max_points)]
+            method = 'lttb'
+        else:
+            # Every series gets an equal share of the budget
+            groups = frame.groupby(color, observed=True, sort=False)
+            budget = max(max_points // max(groups.ngroups, 1), 4)
+            parts = []
+            for _, series in groups:
+                series = series.sort_values(x, kind='stable')
+                parts.append(series.iloc[min_max(series[y].to_numpy(dtype='float64'), budget)])
+            frame = pd.concat(parts).head(max_points)
+            method = 'min_max'
+
+    return _finish(frame, spec, source_points, method)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the shape of the line"""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # First and last points are always kept; the rest is split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # The next bucket's average is the third corner of the triangle
+        next_start, next_end = end, (edges[i + 2] if i + 2 < len(edges) else n)
+        next_x = x[next_start:max(next_end, next_start + 1)].mean()
+        next_y = y[next_start:max(next_end, next_start + 1)].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    # Very short buckets can overlap when n is close to the threshold
+    return np.unique(selected)
+
+
+def min_max(y: np.ndarray, budget: int) -> np.ndarray:
+    """Indices of the lowest and highest point of each of budget / 2 equal-count buckets, in order"""
+    n = len(y)
+    if n <= budget:
+        return np.arange(n)
+    buckets = max(budget // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    keep = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            window = y[start:end]
+            keep.extend(sorted({start + int(np.argmin(window)), start + int(np.argmax(window))}))
+    return np.asarray(keep, dtype=np.int64)
+
+
+def _numeric_axis(values: pd.Series) -> np.ndarray:
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype='float64')
+    return pd.to_datetime(values).to_numpy().view('int64').astype('float64')
+
+
+# ---------- bar charts ----------
+
+def _bar_chart(frame: pd.DataFrame, spec: dict, max_points: int, top_n: int) -> dict:
+    x, y, color = spec['x'], spec['y'], spec['color']
+    frame = frame[[c for c in (x, color, y) if c]].dropna(subset=[y])
+    source_points = len(frame)
+    method = None
+
+    frame[x] = frame[x].astype(str)
+    kept_x = _top_labels(frame, x, y, top_n)
+    if len(kept_x) < frame[x].nunique():
+        frame = _fold(frame, x, kept_x, spec['additive'], [color] if color else [])
+        method = 'top_n'
+    if color is not None:
+        frame[color] = frame[color].astype(str)
+        kept_color = _top_labels(frame, color, y, max(min(top_n, max_points // max(len(kept_x), 1)), 1))
+        if len(kept_color) < frame[color].nunique():
+            frame = _fold(frame, color, kept_color, spec['additive'], [x])
+            method = 'top_n'
+
+    # Largest bars first, "Other" always last
+    order = frame.assign(_other=frame[x] == OTHER_LABEL).sort_values(['_other', y], ascending=[True, False], kind='stable')
+    frame = frame.loc[order.index].head(max_points)
+    return _finish(frame, spec, source_points, method)
+
+
+def _top_labels(frame: pd.DataFrame, column: str, y: str, n: int) -> List[str]:
+    totals = frame.groupby(column, sort=False)[y].sum()
+    return list(totals.nlargest(n).index)
+
+
+def _fold(frame: pd.DataFrame, column: str, kept: List[str], additive: bool, keys: List[str]) -> pd.DataFrame:
+    """Categories outside `kept` become one "Other" bar (summed) when the measure adds up, else are dropped"""
+    inside = frame[frame[column].isin(kept)]
+    if not additive:
+        return inside
+    outside = frame[~frame[column].isin(kept)]
+    values = [c for c in frame.columns if c not in keys + [column]]
+    if keys:
+        other = outside.groupby(keys, sort=False)[values].sum().reset_index()
+    else:
+        other = outside[values].sum().to_frame().T
+    other[column] = OTHER_LABEL
+    return pd.concat([inside, other], ignore_index=True)
+
+
+def _finish(frame: pd.DataFrame, spec: dict, source_points: int, method: Optional[str]) -> dict:
+    columns = [c for c in (spec['x'], spec['color'], spec['y']) if c]
+    frame = frame[columns]
+    title = f"{spec['y']} by {spec['x']}" + (f" and {spec['color']}" if spec['color'] else "")
+    return {
+        'kind': spec['kind'],
+        'title': title.replace('_', ' '),
+        'x': spec['x'],
+        'y': spec['y'],
+        'color': spec['color'],
+        'data': json.loads(frame.to_json(orient='records', date_format='iso')),
+        'points': len(frame),
+        'source_points': source_points,
+        'downsampled': method,
+    }
@@ -0,0 +1,315 @@
+# Memory-mapped column store: an alternative storage backend to the pandas frame.
+# Each column is one .npy file opened with mmap, so every process on the host shares
+# the same page-cache copy instead of holding its own heap copy:
+#   category -> dictionary codes (int8/16/32, -1 = null) + categories.json
+#   datetime -> int64 nanoseconds since epoch (NaT = int64 min)
+#   numeric  -> float64 / int64 as loaded, bool -> bool
+#   text     -> fixed-width bytes
+# Filter, groupby and aggregate kernels run directly on those arrays with NumPy;
+# only the (small) result is turned into a pandas DataFrame.
+
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+NAT = np.iinfo(np.int64).min
+
+
+class UnsupportedByKernel(ValueError):
+    """Raised for plans the column kernels don't implement (callers fall back to pandas)"""
+
+
+class ColumnStore:
+    def __init__(self, path: str, manifest: dict):
+        self.path = path
+        self.manifest = manifest
+        self.version = manifest.get('version')
+        self.rows = manifest['rows']
+        self.columns = list(manifest['columns'])
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._categories: Dict[str, list] = {}
+        self._code_lookup: Dict[str, dict] = {}
+
+    # ---------- build / open ----------
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, path: str, version: str = None) -> "ColumnStore":
+        """Write every column of `df` to `path` (atomically: built next to it, then renamed)"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        columns = {}
+        for col in df.columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                kind = 'category'
+                values = series.cat.codes.to_numpy()
+                categories = [c.item() if hasattr(c, 'item') else c for c in series.cat.categories]
+                with open(os.path.join(tmp_path, f"{col}.categories.json"), 'w') as f:
+                    json.dump(categories, f, default=str)
+            elif pd.api.types.is_datetime64_any_dtype(series):
+                kind = 'datetime'
+                values = series.astype('datetime64[ns]').to_numpy().view('int64')
+            elif pd.api.types.is_bool_dtype(series):
+                kind = 'bool'
+                values = series.to_numpy(dtype=bool)
+            elif pd.api.types.is_numeric_dtype(series):
+                kind = 'numeric'
+                values = series.to_numpy(dtype='float64' if pd.api.types.is_float_dtype(series) or series.isna().any() else 'int64')
+            else:
+                kind = 'text'
+                values = series.fillna('').astype(str).str.encode('utf-8').to_numpy().astype(bytes)
+            np.save(os.path.join(tmp_path, f"{col}.npy"), np.ascontiguousarray(values))
+            columns[col] = {'kind': kind, 'dtype': str(values.dtype)}
+
+        manifest = {'version': version, 'rows': len(df), 'columns': columns}
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another process finished the same store first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str) -> "ColumnStore":
+        with open(os.path.join(path, 'manifest.json')) as f:
+            return cls(path, json.load(f))
+
+    def kind(self, column: str) -> str:
+        if column not in self.manifest['columns']:
+            raise UnsupportedByKernel(f"Unknown column '{column}'")
+        return self.manifest['columns'][column]['kind']
+
+    def column(self, column: str) -> np.ndarray:
+        """Read-only memory-mapped array for a column"""
+        if column not in self._arrays:
+            self.kind(column)
+            self._arrays[column] = np.load(os.path.join(self.path, f"{column}.npy"), mmap_mode='r')
+        return self._arrays[column]
+
+    def categories(self, column: str) -> list:
+        if column not in self._categories:
+            with open(os.path.join(self.path, f"{column}.categories.json")) as f:
+                self._categories[column] = json.load(f)
+            self._code_lookup[column] = {value: code for code, value in enumerate(self._categories[column])}
+        return self._categories[column]
+
+    # ---------- filter kernel ----------
+
+    def mask(self, filters: List[dict]) -> np.ndarray:
+        """Boolean row mask for (compiled) filter conditions"""
+        mask = np.ones(self.rows, dtype=bool)
+        for filter_cond in filters:
+            mask &= self._compare(filter_cond['column'], filter_cond['operator'], filter_cond['value'])
+        return mask
+
+    def _compare(self, column: str, operator: str, value) -> np.ndarray:
+        kind = self.kind(column)
+        values = self.column(column)
+
+        if kind == 'category':
+            categories = self.categories(column)
+            if operator in ('==', '!=', 'in'):
+                targets = value if operator == 'in' else [value]
+                codes = [self._code_lookup[column][v] for v in targets if v in self._code_lookup[column]]
+                hit = np.isin(values, codes)
+                return ~hit if operator == '!=' else hit
+            # Range filter on labels: decide per category, then compare codes
+            codes = [code for code, label in enumerate(categories) if _apply(label, operator, value)]
+            return np.isin(values, codes)
+
+        if kind == 'datetime':
+            if operator == 'in':
+                value = [pd.Timestamp(v).as_unit('ns').value for v in value]
+            else:
+                value = pd.Timestamp(value).as_unit('ns').value
+            hit = _apply(values, operator, value)
+            return hit if operator == '!=' else hit & (values != NAT)
+
+        if kind == 'text':
+            value = [str(v).encode('utf-8') for v in value] if operator == 'in' else str(value).encode('utf-8')
+
+        return _apply(values, operator, value)
+
+    # ---------- groupby / aggregate kernels ----------
+
+    def _group_keys(self, groupby: List[str], positions: np.ndarray):
+        """Dense group id per selected row (rows with a null key dropped) plus the decoded labels"""
+        keep = np.ones(len(positions), dtype=bool)
+        codes, labels = [], []
+        for col in groupby:
+            kind = self.kind(col)
+            values = self.column(col)[positions]
+            if kind == 'category':
+                keep &= values >= 0
+                codes.append(values.astype('int64'))
+                labels.append(np.asarray(self.categories(col), dtype=object))
+            else:
+                if kind == 'numeric' and values.dtype.kind == 'f':
+                    keep &= ~np.isnan(values)
+                elif kind == 'datetime':
+                    keep &= values != NAT
+                uniques, inverse = np.unique(values, return_inverse=True)
+                codes.append(inverse.astype('int64'))
+                labels.append(_decode(kind, uniques))
+
+        # Mixed-radix combination of the per-column codes, then compacted to 0..groups-1
+        key = np.zeros(len(positions), dtype='int64')
+        for col_codes, col_labels in zip(codes, labels):
+            key = key * max(len(col_labels), 1) + col_codes
+        uniques, group = np.unique(key[keep], return_inverse=True)
+
+        decoded = {}
+        for col, col_labels in reversed(list(zip(groupby, labels))):
+            radix = max(len(col_labels), 1)
+            decoded[col] = col_labels[uniques % radix]
+            uniques = uniques // radix
+        return keep, group, {col: decoded[col] for col in groupby}
+
+    def aggregate(self, filters: List[dict], groupby: List[str], aggregations: List[dict]) -> pd.DataFrame:
+        """filter -> groupby -> aggregate, same result shape as the pandas path"""
+        positions = np.flatnonzero(self.mask(filters))
+        if groupby:
+            keep, group, labels = self._group_keys(groupby, positions)
+            positions = positions[keep]
+            groups = len(next(iter(labels.values())))
+        else:
+            group = np.zeros(len(positions), dtype='int64')
+            labels, groups = {}, 1
+
+        result = dict(labels)
+        for agg in aggregations:
+            if agg.get('where'):
+                # Conditional aggregate: only the selected rows that also pass its own condition
+                hit = self.mask(agg['where'])[positions]
+                result[agg['alias']] = self._aggregate_one(agg['column'], agg['function'], positions[hit], group[hit], groups)
+            else:
+                result[agg['alias']] = self._aggregate_one(agg['column'], agg['function'], positions, group, groups)
+        return pd.DataFrame(result)
+
+    def _aggregate_one(self, column: str, func: str, positions: np.ndarray, group: np.ndarray, groups: int):
+        kind = self.kind(column)
+        values = self.column(column)[positions]
+        if func == 'size':
+            return np.bincount(group, minlength=groups).astype('int64')
+
+        valid = _not_null(kind, values)
+        if func == 'count':
+            return np.bincount(group[valid], minlength=groups).astype('int64')
+        if func == 'nunique':
+            # Distinct (group, value) pairs, counted per group
+            uniques, value_codes = np.unique(values[valid], return_inverse=True)
+            radix = max(len(uniques), 1)
+            pairs = np.unique(group[valid].astype('int64') * radix + value_codes)
+            return np.bincount(pairs // radix, minlength=groups).astype('int64')
+
+        if kind not in ('numeric', 'bool'):
+            raise UnsupportedByKernel(f"'{func}' on a {kind} column")
+        numbers = values.astype('float64')
+        counts = np.bincount(group[valid], minlength=groups)
+        sums = np.bincount(group[valid], weights=numbers[valid], minlength=groups)
+
+        if func == 'sum':
+            return sums.astype('int64') if values.dtype.kind in 'iub' else sums
+        if func == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(counts > 0, sums / counts, np.nan)
+        if func == 'std':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums / counts
+                squares = np.bincount(group[valid], weights=(numbers[valid] - means[group[valid]]) ** 2, minlength=groups)
+                return np.where(counts > 1, np.sqrt(squares / (counts - 1)), np.nan)
+        if func in ('min', 'max', 'median'):
+            order = np.lexsort((numbers[valid], group[valid]))
+            sorted_values = numbers[valid][order]
+            starts = np.searchsorted(group[valid][order], np.arange(groups))
+            out = np.full(groups, np.nan)
+            present = counts > 0
+            if func == 'min':
+                out[present] = sorted_values[starts[present]]
+            elif func == 'max':
+                out[present] = sorted_values[starts[present] + counts[present] - 1]
+            else:
+                low = starts[present] + (counts[present] - 1) // 2
+                high = starts[present] + counts[present] // 2
+                out[present] = (sorted_values[low] + sorted_values[high]) / 2
+            if func != 'median' and values.dtype.kind in 'iu' and present.all():
+                return out.astype(values.dtype)
+            return out
+        raise UnsupportedByKernel(f"Unsupported aggregation '{func}'")
+
+    def rate(self, filters: List[dict], groupby: List[str], column: str, positive: list) -> pd.DataFrame:
+        """Rows and rows with `column` in `positive` per group (the basis of failure/fraud rates)"""
+        positions = np.flatnonzero(self.mask(filters))
+        hit = self._compare(column, 'in', positive)[positions]
+        if groupby:
+            keep, group, labels = self._group_keys(groupby, positions)
+            hit = hit[keep]
+            groups = len(next(iter(labels.values())))
+        else:
+            group = np.zeros(len(positions), dtype='int64')
+            labels, groups = {}, 1
+        return pd.DataFrame({
+            **labels,
+            'total': np.bincount(group, minlength=groups).astype('int64'),
+            'hits': np.bincount(group, weights=hit, minlength=groups).astype('int64'),
+        })
+
+    def not_null(self, column: str, positions: np.ndarray) -> np.ndarray:
+        """Which of these rows have a value in `column` (without decoding it)"""
+        return _not_null(self.kind(column), self.column(column)[positions])
+
+    def frame(self, columns: List[str], positions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Decode selected columns (and rows) back into a pandas DataFrame"""
+        data = {}
+        for col in columns:
+            kind = self.kind(col)
+            values = self.column(col) if positions is None else self.column(col)[positions]
+            if kind == 'category':
+                data[col] = pd.Categorical.from_codes(np.asarray(values), categories=self.categories(col))
+            else:
+                data[col] = _decode(kind, np.asarray(values))
+        return pd.DataFrame(data)
+
+
+def _apply(values, operator: str, value):
+    if operator == '==':
+        return values == value
+    if operator == '!=':
+        return values != value
+    if operator == '>':
+        return values > value
+    if operator == '<':
+        return values < value
+    if operator == '>=':
+        return values >= value
+    if operator == '<=':
+        return values <= value
+    if operator == 'in':
+        return np.isin(values, value) if isinstance(values, np.ndarray) else values in value
+    raise UnsupportedByKernel(f"Unsupported operator '{operator}'")
+
+
+def _not_null(kind: str, values: np.ndarray) -> np.ndarray:
+    if kind == 'category':
+        return values >= 0
+    if kind == 'datetime':
+        return values != NAT
+    if kind == 'numeric' and values.dtype.kind == 'f':
+        return ~np.isnan(values)
+    return np.ones(len(values), dtype=bool)
+
+
+def _decode(kind: str, values: np.ndarray):
+    if kind == 'datetime':
+        return pd.to_datetime(np.asarray(values).view('datetime64[ns]'))
+    if kind == 'text':
+        return np.array([v.decode('utf-8') for v in values], dtype=object)
+    return values
@@ -0,0 +1,178 @@
+# This file defines the ConversationContext kept per chat session:
+# Instead of replaying previous answers verbatim, each turn is stored as a compact record
+# (question, intent, entities, filters, grouping, the execution plan and a few key numbers)
+# plus what the UI shows next to the answer (chart spec, row cursor), which is never rendered into prompts
+# It is updated once per turn and rendered into a bounded-size block for the understanding agent,
+# so follow-up questions can reuse the previous plan without re-deriving it
+
+import json
+from collections import deque
+from typing import Optional
+from src.config import config
+
+
+class ConversationContext:
+    def __init__(self, max_turns: int = None, max_chars: int = None):
+        self.max_turns = max_turns or config.CONTEXT_MAX_TURNS
+        self.max_chars = max_chars or config.CONTEXT_MAX_CHARS
+        self.turns = deque(maxlen=self.max_turns)
+
+    def update(self, question: str, query_plan: dict, execution_plan: dict,
+               analysis_results: dict, response: str = "", chart: dict = None):
+        """Fold one finished turn into the memory"""
+        query_plan = query_plan or {}
+        self.turns.append({
+            'question': _clip(question, config.CONTEXT_MAX_TEXT),
+            'intent': query_plan.get('intent'),
+            'entities': query_plan.get('entities') or {},
+            'metrics': query_plan.get('metrics') or [],
+            'filters': query_plan.get('filters') or [],
+            'grouping': query_plan.get('grouping') or [],
+            'plan': _compact_plan(execution_plan),
+            'key_numbers': _key_numbers(analysis_results),
+            'answer': _headline(response),
+            'rows': _row_cursor(analysis_results),
+            'chart': chart,
+        })
+
+    def add_exchange(self, question: str, response: str):
+        """Fold a plain Q/A pair (no plan available, e.g. a legacy history list)"""
+        self.update(question, {}, {}, {}, response)
+
+    @classmethod
+    def from_history(cls, conversation_history: list) -> "ConversationContext":
+        """Build a context from the old [{'question', 'response'}, ...] history format"""
+        context = cls()
+        for msg in conversation_history or []:
+            context.add_exchange(msg.get('question', ''), msg.get('response', ''))
+        return context
+
+    def last_plan(self) -> Optional[dict]:
+        """Execution plan of the most recent turn that produced one"""
+        for turn in reversed(self.turns):
+            if turn['plan']:
+                return turn['plan']
+        return None
+
+    def last_rows(self) -> Optional[dict]:
+        """Paging state of the latest turn if it returned more raw rows than its first page"""
+        return self.turns[-1].get('rows') if self.turns else None
+
+    def last_chart(self) -> Optional[dict]:
+        """Chart spec of the latest turn (None when its results have nothing to draw)"""
+        return self.turns[-1].get('chart') if self.turns else None
+
+    def render(self) -> str:
+        """Bounded-size text for the prompt, most recent turns kept first"""
+        blocks = []
+        used = 0
+        for number, turn in reversed(list(enumerate(self.turns, 1))):
+            block = self._render_turn(number, turn)
+            if blocks and used + len(block) > self.max_chars:
+                break
+            blocks.append(block if len(block) <= self.max_chars else block[:self.max_chars - 1] + "…")
+            used += len(block)
+        return "\n".join(reversed(blocks))
+
+    def _render_turn(self, number: int, turn: dict) -> str:
+        lines = [f"Turn {number}: Q: {turn['question']}"]
+        if turn['intent']:
+            lines.append(f"  intent={turn['intent']} metrics={turn['metrics']} grouping={turn['grouping']}")
+        if turn['entities']:
+            lines.append(f"  entities={_dumps(turn['entities'])}")
+        if turn['filters']:
+            lines.append(f"  filters={_dumps(turn['filters'])}")
+        if turn['plan']:
+            lines.append(f"  plan={_dumps(turn['plan'])}")
+        if turn['key_numbers']:
+            lines.append(f"  key numbers: {'; '.join(turn['key_numbers'])}")
+        if turn['answer']:
+            lines.append(f"  answer: {turn['answer']}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {'turns': list(self.turns)}
+
+    def load(self, data: dict):
+        """Replace the memory with a serialised copy (e.g. returned by the service)"""
+        self.turns = deque((data or {}).get('turns', []), maxlen=self.max_turns)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ConversationContext":
+        context = cls()
+        context.load(data)
+        return context
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=str, separators=(',', ':'))
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _headline(response: str) -> str:
+    """First sentence of an answer, skipping headings and markdown decoration"""
+    for line in str(response or "").splitlines():
+        line = line.strip()
+        if line.startswith('#'):
+            continue
+        line = line.lstrip('*-> ').strip()
+        if line:
+            sentence = line.split('. ')[0]
+            return _clip(sentence.replace('**', ''), config.CONTEXT_MAX_TEXT)
+    return ""
+
+
+def _compact_plan(execution_plan: dict) -> dict:
+    """Only the non-empty parts of an execution plan"""
+    return {k: v for k, v in (execution_plan or {}).items() if v not in (None, [], {})}
+
+
+def _key_numbers(analysis_results: dict) -> list:
+    """A few headline values from the tool results"""
+    numbers = []
+    for item in (analysis_results or {}).get('results', []):
+        try:
+            result = json.loads(item.get('result', ''))
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(result, dict) or not result.get('success', True):
+            continue
+        rows = result.get('data')
+        if rows is None:
+            rows = result.get('results')
+        if isinstance(rows, dict):
+            rows = [rows]
+        if not isinstance(rows, list):
+            continue
+        for row in rows[:config.CONTEXT_KEY_ROWS]:
+            numbers.append(_clip(_format_row(row), config.CONTEXT_MAX_TEXT))
+    return numbers[:config.CONTEXT_KEY_ROWS * 2]
+
+
+def _row_cursor(analysis_results: dict) -> Optional[dict]:
+    """Cursor of the first row-returning tool result that has more pages"""
+    for item in (analysis_results or {}).get('results', []):
+        try:
+            result = json.loads(item.get('result', ''))
+        except (TypeError, ValueError):
+            continue
+        if isinstance(result, dict) and result.get('cursor'):
+            return {key: result.get(key) for key in ('cursor', 'next_offset', 'total_rows', 'available_rows', 'columns')}
+    return None
+
+
+def _format_row(row) -> str:
+    if not isinstance(row, dict):
+        return str(row)
+    parts = []
+    for key, value in row.items():
+        if isinstance(value, float):
+            value = round(value, 2)
+        elif isinstance(value, (dict, list)):
+            continue
+        parts.append(f"{key}={value}")
+    return ", ".join(parts)
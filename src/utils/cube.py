@@ -0,0 +1,112 @@
+# Pre-aggregated "cubes" for repeated plan shapes.
+# A cube is the data grouped by a fixed set of dimension columns, keeping additive
+# measures (row count, per-measure count/sum/min/max). Any plan that filters with
+# equality on, and groups by, a subset of those dimensions can be answered from the
+# cube without touching the raw rows.
+
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Optional
+from src.config import config
+from src.utils.data_loader import data_loader
+
+
+class AggregateCube:
+    def __init__(self, dimensions: tuple, table: pd.DataFrame):
+        self.dimensions = dimensions
+        self.table = table
+
+    def query(self, filters: List[dict], groupby: List[str], aggregations: List[dict]) -> pd.DataFrame:
+        """Answer a (validated) plan from the cube cells"""
+        table = self.table
+        mask = np.ones(len(table), dtype=bool)
+        for filter_cond in filters:
+            col, operator, value = filter_cond['column'], filter_cond['operator'], filter_cond['value']
+            if operator == '==':
+                mask &= (table[col] == value).to_numpy()
+            elif operator == '!=':
+                mask &= (table[col] != value).to_numpy()
+            elif operator == 'in':
+                mask &= table[col].isin(value).to_numpy()
+        table = table[mask]
+
+        # Roll the cells up to the requested grouping
+        sums = [c for c in table.columns if c.endswith(('__rows', '__count', '__sum'))]
+        if groupby:
+            grouped = table.groupby(groupby, observed=True)
+            rolled = grouped[sums].sum()
+            rolled = rolled.join(grouped[[c for c in table.columns if c.endswith('__min')]].min())
+            rolled = rolled.join(grouped[[c for c in table.columns if c.endswith('__max')]].max())
+        else:
+            rolled = table[sums].sum().to_frame().T
+            for c in table.columns:
+                if c.endswith('__min'):
+                    rolled[c] = table[c].min()
+                elif c.endswith('__max'):
+                    rolled[c] = table[c].max()
+
+        result = pd.DataFrame(index=rolled.index)
+        for agg in aggregations:
+            col, func, alias = agg['column'], agg['function'], agg['alias']
+            count_col = f"{col}__count" if f"{col}__count" in rolled.columns else '__rows'
+            if func in ('count', 'size'):
+                result[alias] = rolled[count_col if func == 'count' else '__rows'].astype('int64')
+            elif func == 'sum':
+                result[alias] = rolled[f"{col}__sum"]
+            elif func == 'mean':
+                result[alias] = rolled[f"{col}__sum"] / rolled[f"{col}__count"].replace(0, np.nan)
+            elif func == 'min':
+                result[alias] = rolled[f"{col}__min"]
+            elif func == 'max':
+                result[alias] = rolled[f"{col}__max"]
+
+        return result.reset_index() if groupby else result.reset_index(drop=True)
+
+
+class CubeStore:
+    def __init__(self):
+        self._cubes: Dict[tuple, AggregateCube] = {}
+        self._demand: Dict[tuple, int] = {}
+        self._version = None
+
+    def _check_version(self):
+        if self._version != data_loader.version:
+            self._cubes = {}
+            self._demand = {}
+            self._version = data_loader.version
+
+    def get(self, dimensions: tuple) -> Optional[AggregateCube]:
+        self._check_version()
+        return self._cubes.get(dimensions)
+
+    def record_demand(self, dimensions: tuple, estimated_cells: int) -> Optional[AggregateCube]:
+        """Count a plan shape; build its cube once it has been asked for often enough"""
+        self._check_version()
+        self._demand[dimensions] = self._demand.get(dimensions, 0) + 1
+        if (dimensions not in self._cubes
+                and self._demand[dimensions] >= config.CUBE_BUILD_AFTER
+                and estimated_cells <= config.CUBE_MAX_CELLS):
+            self._cubes[dimensions] = self._build(dimensions)
+        return self._cubes.get(dimensions)
+
+    def _build(self, dimensions: tuple) -> AggregateCube:
+        # Only the cube's own columns are read
+        df = data_loader.read_columns(list(dict.fromkeys(list(dimensions) + config.CUBE_MEASURES)))
+        frame = pd.DataFrame({col: df[col] for col in dimensions})
+        frame['__rows'] = 1
+        agg = {'__rows': ('__rows', 'sum')}
+        for measure in config.CUBE_MEASURES:
+            frame[measure] = df[measure]
+            agg[f"{measure}__count"] = (measure, 'count')
+            agg[f"{measure}__sum"] = (measure, 'sum')
+            agg[f"{measure}__min"] = (measure, 'min')
+            agg[f"{measure}__max"] = (measure, 'max')
+
+        # dropna=False keeps null dimension values so '!=' filters stay exact
+        table = frame.groupby(list(dimensions), observed=True, dropna=False).agg(**agg).reset_index()
+        print(f"  🧊 Built cube over {dimensions}: {len(table):,} cells")
+        return AggregateCube(dimensions, table)
+
+
+# Global shared instance, like data_loader
+cube_store = CubeStore()
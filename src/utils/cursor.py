@@ -0,0 +1,70 @@
+# This file defines the row cursors behind row-returning plans (no groupby / aggregations):
+# Instead of turning every matching row into a dict, the query keeps only the ordered row
+# positions (capped at RESULT_MAX_ROWS) and materialises one bounded page at a time.
+# The total number of matching rows is just the length of the filter's position array.
+# (A partitioned dataset has no in-memory frame to point into: its cursors keep the capped rows.)
+# Cursor ids are derived from the plan and dataset version, so a cursor evicted from this
+# process (or opened by another one) can be rebuilt from the plan kept in the result cache.
+
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Iterator, List, Optional
+from src.config import config
+
+
+class RowCursor:
+    def __init__(self, cursor_id: str, positions: np.ndarray, columns: List[str], total_rows: int,
+                 truncated: bool = False, frame: Optional[pd.DataFrame] = None):
+        self.id = cursor_id
+        self.positions = positions        # ordered, already capped
+        self.columns = columns
+        self.total_rows = total_rows      # rows matching the filters, before limit / cap
+        self.truncated = truncated        # cut short by RESULT_MAX_ROWS
+        self.frame = frame                # the capped rows themselves, when positions index into them
+
+    @property
+    def rows(self) -> int:
+        """Rows that can be paged through"""
+        return len(self.positions)
+
+    def page(self, offset: int, size: int) -> np.ndarray:
+        """Row positions of one page"""
+        return self.positions[offset:offset + size]
+
+    def pages(self, size: int = None, offset: int = 0) -> Iterator[np.ndarray]:
+        """Row positions page by page, from `offset` to the end"""
+        size = size or config.RESULT_PAGE_ROWS
+        for start in range(offset, self.rows, size):
+            yield self.positions[start:start + size]
+
+
+class CursorStore:
+    """Open cursors of this process, least recently used dropped first"""
+
+    def __init__(self, max_open: int = None):
+        self.max_open = max_open or config.CURSOR_MAX_OPEN
+        self._cursors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, cursor_id: str, positions: np.ndarray, columns: List[str], total_rows: int,
+             truncated: bool = False, frame: Optional[pd.DataFrame] = None) -> RowCursor:
+        cursor = RowCursor(cursor_id, positions, columns, total_rows, truncated, frame)
+        with self._lock:
+            self._cursors[cursor_id] = cursor
+            self._cursors.move_to_end(cursor_id)
+            while len(self._cursors) > self.max_open:
+                self._cursors.popitem(last=False)
+        return cursor
+
+    def get(self, cursor_id: str) -> Optional[RowCursor]:
+        with self._lock:
+            cursor = self._cursors.get(cursor_id)
+            if cursor is not None:
+                self._cursors.move_to_end(cursor_id)
+            return cursor
+
+
+# Global shared instance, like data_loader
+row_cursors = CursorStore()
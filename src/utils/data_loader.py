@@ -1,18 +1,173 @@
 # This file defines a Singleton DataLoader class that:
-# Loads transaction data from a CSV
-# Caches it in memory
+# Loads transaction data from a CSV (or a directory of partitioned CSVs, see partitions.py)
+# Caches it in memory (a partitioned dataset only opens its partition catalog; the
+# whole history is stitched together only for analyses that really need every row)
 # Preprocesses it
 # Provides helper methods to access data safely
+# Keeps a dataset profile (computed once per dataset version, persisted next to the data)
+# Keeps a memory-mapped column store per dataset version (STORAGE_BACKEND = "columnar"; a single
+# file is then served from the store and only parsed when no store exists for its version yet)
 # Ensures only one instance exists
 
+import os
+import json
+import hashlib
 import pandas as pd
 import numpy as np
 from typing import Optional
 from src.config import config
+from src.utils.column_store import ColumnStore
+from src.utils.partitions import PartitionedDataset
+
+def dataset_version(path: str) -> str:
+    """Fingerprint a data file so derived caches can be invalidated"""
+    stat = os.stat(path)
+    raw = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.md5(raw.encode()).hexdigest()[:12]
+
+
+def preprocess(df: pd.DataFrame) -> pd.DataFrame:
+    """Standardise column names, types and derived time features of freshly read rows"""
+
+    # 1️. Standardize column names
+    df.columns = (
+        df.columns
+            .str.strip()
+            .str.lower()
+            .str.replace(" ", "_")
+            .str.replace("(", "")
+            .str.replace(")", "")
+    )
+
+    # 2.  Convert timestamp FIRST
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(
+            df['timestamp'],
+            errors='coerce'
+        )
+
+        # Keep rows in time order so time-series scans stay sequential
+        df = df.sort_values('timestamp', kind='stable', ignore_index=True)
+
+        # Extract time features
+        df['hour_of_day'] = df['timestamp'].dt.hour
+        df['day_of_week'] = df['timestamp'].dt.dayofweek
+        df['is_weekend'] = df['day_of_week'].isin([5, 6])
+
+    # 3️.  Fix numeric & boolean types
+    if 'amount_inr' in df.columns:
+        df['amount_inr'] = pd.to_numeric(
+            df['amount_inr'], errors='coerce'
+        )
+
+    if 'fraud_flag' in df.columns:
+        df['fraud_flag'] = df['fraud_flag'].astype(bool)
+
+    if 'is_weekend' in df.columns:
+        df['is_weekend'] = df['is_weekend'].astype(bool)
+
+    # 4️.  Handle missing values
+    df.fillna({
+        'fraud_flag': False,
+        'is_weekend': False
+    }, inplace=True)
+
+    # 5.  Dictionary-encode low-cardinality text columns (small codes, fast compares)
+    for col in config.CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def column_summaries(df: pd.DataFrame) -> dict:
+    """Mergeable per-column summaries behind the dataset profile (value counts, or min/max/sum/count)"""
+    summaries = {}
+    for col in df.columns:
+        series = df[col]
+        nulls = int(series.isna().sum())
+        if col == 'timestamp':
+            valid = series.dropna()
+            summaries[col] = {'kind': 'timestamp', 'min': str(valid.min()) if len(valid) else None,
+                              'max': str(valid.max()) if len(valid) else None}
+            continue
+        is_numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+        if is_numeric and col not in config.PROFILE_CATEGORICAL_NUMERIC:
+            valid = series.dropna()
+            summaries[col] = {'kind': 'numeric', 'nulls': nulls, 'count': len(valid),
+                              'sum': float(valid.sum()) if len(valid) else 0.0,
+                              'min': float(valid.min()) if len(valid) else None,
+                              'max': float(valid.max()) if len(valid) else None}
+            continue
+
+        counts = series.value_counts(dropna=True)
+        counts = counts[counts > 0]
+        summary = {'kind': 'categorical', 'distinct': len(counts), 'nulls': nulls}
+        # Identifier-like columns only get a distinct count
+        if len(counts) <= config.PROFILE_MAX_DISTINCT:
+            summary['values'] = [[k.item() if hasattr(k, 'item') else k, int(v)] for k, v in counts.items()]
+        summaries[col] = summary
+    return summaries
+
+
+def merge_profile(parts: list, version: str, rows: int, columns: list, sample: list) -> dict:
+    """Dataset profile from the column summaries of one frame or of every partition"""
+    profile = {
+        'version': version,
+        'rows': rows,
+        'columns': columns,
+        'date_range': None,
+        'categorical': {},
+        'numeric': {},
+        'sample': sample,
+    }
+    for col in columns:
+        summaries = [part[col] for part in parts if col in part]
+        if not summaries:
+            continue
+        kind = summaries[0]['kind']
+        summaries = [s for s in summaries if s['kind'] == kind]
+        if kind == 'timestamp':
+            lows = [s['min'] for s in summaries if s['min'] is not None]
+            highs = [s['max'] for s in summaries if s['max'] is not None]
+            if lows:
+                profile['date_range'] = {'min': str(min(pd.Timestamp(v) for v in lows)),
+                                         'max': str(max(pd.Timestamp(v) for v in highs))}
+        elif kind == 'numeric':
+            count = sum(s['count'] for s in summaries)
+            lows = [s['min'] for s in summaries if s['min'] is not None]
+            highs = [s['max'] for s in summaries if s['max'] is not None]
+            profile['numeric'][col] = {
+                'min': min(lows) if lows else float('nan'),
+                'max': max(highs) if highs else float('nan'),
+                'mean': sum(s['sum'] for s in summaries) / count if count else float('nan'),
+                'nulls': sum(s['nulls'] for s in summaries),
+            }
+        else:
+            summary = {'nulls': sum(s['nulls'] for s in summaries)}
+            if all('values' in s for s in summaries):
+                counts = {}
+                for s in summaries:
+                    for value, count in s['values']:
+                        counts[value] = counts.get(value, 0) + count
+                summary['distinct'] = len(counts)
+                if len(counts) <= config.PROFILE_MAX_DISTINCT:
+                    summary['values'] = [[v, n] for v, n in sorted(counts.items(), key=lambda item: -item[1])]
+            else:
+                # Some partition only kept a distinct count: the sum is an upper bound
+                summary['distinct'] = sum(s['distinct'] for s in summaries)
+            profile['categorical'][col] = summary
+    return profile
+
 
 class DataLoader:
     _instance = None
     _df = None
+    _version = None
+    _profile = None
+    _indexes = {}
+    _column_store = None
+    _partitions = None
+    _listeners = []
     
 
     # this function checks if any instance is created 
@@ -22,58 +177,179 @@ class DataLoader:
             cls._instance = super(DataLoader, cls).__new__(cls)
         return cls._instance
     
+    def open(self, force_reload: bool = False):
+        """Make the dataset queryable: the whole frame of a single file, but only the
+        partition catalog (and per-partition statistics) of a partitioned dataset,
+        and only the memory-mapped column store under the columnar backend"""
+        if self._is_columnar:
+            if self._column_store is None or force_reload or self._column_store.version != self._compute_version():
+                # The CSV is only parsed when no process has built this version's store yet
+                self._df = None
+                self._version = self._compute_version()
+                self._profile = None
+                store = self.get_column_store()
+                print(f"Opened column store ({store.rows:,} transactions)")
+                self._notify()
+            return
+        if not self.is_partitioned:
+            self.load_data(force_reload)
+            return
+        if self._partitions is None or force_reload or self._partitions.root != config.DATA_PATH:
+            # Rediscover the partition files; their rows stay on disk until a query reads them
+            self._partitions = PartitionedDataset(config.DATA_PATH)
+            self._df = None
+            self._version = self._partitions.version
+            self._profile = None
+            print(f"Opened {len(self._partitions.partitions)} partitions ({self._partitions.rows:,} transactions)")
+            self._notify()
+
     def load_data(self, force_reload: bool = False) -> pd.DataFrame:
-        """Load data with caching"""
+        """Load data with caching (for a partitioned dataset: every partition, stitched together)"""
+        if self.is_partitioned:
+            self.open(force_reload)
+            if self._df is None:
+                print("Loading every partition...")
+                self._df = self._partitions.load()
+                print(f"Loaded {len(self._df):,} transactions from {len(self._partitions.partitions)} partitions")
+            return self._df
+
         if self._df is None or force_reload:
             print("Loading transaction data...")
-            self._df = pd.read_csv(config.DATA_PATH)
-            self._preprocess()
+            self._df = preprocess(pd.read_csv(config.DATA_PATH))
+            self._version = self._compute_version()
+            self._profile = None
             print(f"Loaded {len(self._df):,} transactions")
+            self._notify()
         return self._df
-    
-    def _preprocess(self):
-        """Preprocess data"""
-
-        # 1️. Standardize column names
-        self._df.columns = (
-            self._df.columns
-                .str.strip()
-                .str.lower()
-                .str.replace(" ", "_")
-                .str.replace("(", "")
-                .str.replace(")", "")
-        )
 
-        # 2.  Convert timestamp FIRST
-        if 'timestamp' in self._df.columns:
-            self._df['timestamp'] = pd.to_datetime(
-                self._df['timestamp'],
-                errors='coerce'
-            )
+    def on_load(self, callback):
+        """Call `callback()` whenever a dataset (version) is opened, and right away if one already is"""
+        self._listeners.append(callback)
+        if self._version is not None:
+            callback()
+
+    def _notify(self):
+        # Derived state (anomaly baselines, ...) is kept current here rather than on its first query
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"  ⚠️ Refresh after load failed: {e}")
+
+    @property
+    def version(self) -> Optional[str]:
+        """Identifier of the currently loaded dataset (changes when the file changes)"""
+        if self._version is None and (self.is_partitioned or self._is_columnar):
+            self.open()
+        return self._version
+
+    def row_count(self) -> int:
+        """Rows in the dataset (from the partition statistics or the column store when there is one)"""
+        if self.is_partitioned:
+            self.open()
+            return self._partitions.rows
+        if self._is_columnar:
+            self.open()
+            return self._column_store.rows
+        return len(self.load_data())
+
+    def get_schema(self) -> pd.DataFrame:
+        """Zero-row frame with every column's dtype (and all category labels), for validating plans"""
+        if self.is_partitioned:
+            self.open()
+            return self._partitions.schema()
+        if self._is_columnar:
+            self.open()
+            return self._column_store.frame(self._column_store.columns, np.arange(0))
+        return self.load_data().iloc[:0]
 
-            # Extract time features
-            self._df['hour_of_day'] = self._df['timestamp'].dt.hour
-            self._df['day_of_week'] = self._df['timestamp'].dt.dayofweek
-            self._df['is_weekend'] = self._df['day_of_week'].isin([5, 6])
+    def read_columns(self, columns: list, filters: list = None) -> pd.DataFrame:
+        """Just these columns (a partitioned dataset reads nothing else, and with compiled
+        `filters` only the matching rows of the partitions that survive pruning).
+        A single-file dataset returns every row: callers still apply their filters."""
+        if self.is_partitioned and self._df is None:
+            self.open()
+            return self._partitions.read(filters or [], columns)
+        if self._is_columnar and self._df is None:
+            self.open()
+            return self._column_store.frame(columns)
+        return self.load_data()[columns]
 
-        # 3️.  Fix numeric & boolean types
-        if 'amount_inr' in self._df.columns:
-            self._df['amount_inr'] = pd.to_numeric(
-                self._df['amount_inr'], errors='coerce'
-            )
+    def take(self, positions: np.ndarray, columns: list = None) -> pd.DataFrame:
+        """Every column (or just `columns`) of the rows at these positions (in read_columns order)"""
+        if self.is_partitioned and self._df is None:
+            self.open()
+            return self._partitions.take(positions, columns)
+        if self._is_columnar and self._df is None:
+            self.open()
+            return self._column_store.frame(columns or self._column_store.columns, positions)
+        df = self.load_data()
+        if columns is None:
+            return df.iloc[positions]
+        return df.iloc[positions, [df.columns.get_loc(col) for col in columns]]
 
-        if 'fraud_flag' in self._df.columns:
-            self._df['fraud_flag'] = self._df['fraud_flag'].astype(bool)
+    def _compute_version(self) -> str:
+        if self.is_partitioned:
+            return self.get_partitions().version
+        return dataset_version(config.DATA_PATH)
 
-        if 'is_weekend' in self._df.columns:
-            self._df['is_weekend'] = self._df['is_weekend'].astype(bool)
+    @property
+    def _is_columnar(self) -> bool:
+        """A single file served from its column store, never held as a pandas frame"""
+        return self.backend == 'columnar' and not self.is_partitioned
 
-        # 4️.  Handle missing values
-        self._df.fillna({
-            'fraud_flag': False,
-            'is_weekend': False
-        }, inplace=True)
+    @property
+    def is_partitioned(self) -> bool:
+        """DATA_PATH is a directory of hive-style partitions rather than one file"""
+        return os.path.isdir(config.DATA_PATH)
 
+    def get_partitions(self) -> Optional[PartitionedDataset]:
+        """Partition catalog of a partitioned dataset (None for a single file)"""
+        if not self.is_partitioned:
+            return None
+        self.open()
+        return self._partitions
+    
+    def get_index(self, column: str) -> dict:
+        """Posting-list index for a categorical column: value -> sorted row positions"""
+        key = (self._version, column)
+        if key not in self._indexes:
+            # Drop indexes that belong to an older dataset version
+            self._indexes = {k: v for k, v in self._indexes.items() if k[0] == self._version}
+            series = self.load_data()[column]
+            codes = series.cat.codes.to_numpy()
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(series.cat.categories) + 1))
+            self._indexes[key] = {
+                value: order[bounds[i]:bounds[i + 1]]
+                for i, value in enumerate(series.cat.categories)
+            }
+        return self._indexes[key]
+        
+    @property
+    def backend(self) -> str:
+        """Storage backend the tools run their kernels on: pandas or columnar"""
+        return config.STORAGE_BACKEND
+    
+    def get_column_store(self) -> ColumnStore:
+        """Memory-mapped column store for the current dataset version.
+        Built from the parsed file the first time, then just opened (and shared
+        through the page cache) by every process."""
+        version = self._version or self._compute_version()
+        if self._column_store is not None and self._column_store.version == version:
+            return self._column_store
+        
+        path = os.path.join(config.CACHE_DIR, f"columns_{version}")
+        if os.path.exists(os.path.join(path, 'manifest.json')):
+            store = ColumnStore.open(path)
+        else:
+            os.makedirs(config.CACHE_DIR, exist_ok=True)
+            # Parsed just for the build: under the columnar backend the frame isn't kept
+            df = self._df if self._df is not None else preprocess(pd.read_csv(config.DATA_PATH))
+            store = ColumnStore.build(df, path, version)
+            print(f"  🗄️ Built column store for dataset {version}")
+        self._column_store = store
+        return store
         
     def get_column_info(self) -> dict:
         """Get column information"""
@@ -81,13 +357,66 @@ class DataLoader:
     
     def get_unique_values(self, column: str) -> list:
         """Get unique values for a column"""
-        if column in self._df.columns:
-            return self._df[column].unique().tolist()
+        categorical = self.get_profile()['categorical']
+        if column in categorical and 'values' in categorical[column]:
+            return [value for value, _ in categorical[column]['values']]
+        if column in self.get_schema().columns:
+            return self.read_columns([column])[column].unique().tolist()
         return []
     
+    def get_profile(self) -> dict:
+        """Dataset profile (row count, date range, value frequencies, numeric ranges).
+        Computed once per dataset version and persisted next to the data, so a
+        fresh process can serve it without scanning the data again."""
+        version = self._version or self._compute_version()
+        if self._profile is not None and self._profile['version'] == version:
+            return self._profile
+        
+        path = os.path.join(config.CACHE_DIR, f"profile_{version}.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                self._profile = json.load(f)
+            return self._profile
+        
+        if self.is_partitioned:
+            # Merged from the partitions' own summaries: no partition is read again
+            self.open()
+            self._profile = self._partitions.profile()
+        elif self._is_columnar:
+            self.open()
+            self._profile = self._build_store_profile(self._column_store)
+        else:
+            self.load_data()
+            self._profile = self._build_profile()
+        os.makedirs(config.CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._profile, f, default=str)
+        os.replace(tmp_path, path)
+        return self._profile
+    
+    def _build_profile(self) -> dict:
+        """Scan the loaded data once and summarise it"""
+        df = self._df
+        sample = json.loads(df.head(10).to_json(orient='records', date_format='iso'))
+        return merge_profile([column_summaries(df)], self._version, len(df), list(df.columns), sample)
+    
+    def _build_store_profile(self, store: ColumnStore) -> dict:
+        """Same profile from the column store, decoded a chunk of rows at a time"""
+        chunk = config.PROFILE_CHUNK_ROWS
+        parts = [column_summaries(store.frame(store.columns, np.arange(start, min(start + chunk, store.rows))))
+                 for start in range(0, store.rows, chunk)]
+        head = store.frame(store.columns, np.arange(min(10, store.rows)))
+        sample = json.loads(head.to_json(orient='records', date_format='iso'))
+        return merge_profile(parts, self._version, store.rows, store.columns, sample)
+    
     def get_sample_data(self, n: int = 5) -> pd.DataFrame:
         """Get sample rows"""
-        return self._df.head(n)
+        if self.is_partitioned and self._df is None:
+            return self.get_partitions().head(n)
+        if self._is_columnar and self._df is None:
+            return self.take(np.arange(min(n, self.row_count())))
+        return self.load_data().head(n)
 
 
 # It creates a global shared instance that can be imported anywhere.
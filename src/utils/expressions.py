@@ -0,0 +1,259 @@
+# This file defines the expression engine behind ExecutionPlan.computations:
+# A formula like  "count_where(transaction_status == 'FAILED') / count() * 100"  is parsed with `ast`
+# (never eval'd) and only whitelisted nodes, operators and functions are accepted.
+# Two kinds of terms:
+#   row-level aggregates over data columns  -> count(), count(col), sum(col), mean(col), ... and the
+#       conditional count_where(cond), sum_where(col, cond), mean_where(col, cond), min_where, max_where.
+#       These become extra (hidden) aggregations computed in the same groupby pass as the plan's own.
+#   result-level terms over the aggregated table -> aggregation aliases, groupby columns, earlier
+#       computations, arithmetic, pct/ratio, window functions (share, rank, total, diff, pct_change, cumsum).
+# Everything is evaluated as vectorized pandas column arithmetic on the (small) aggregated result.
+
+import ast
+import json
+import operator
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List
+
+ROW_AGGREGATES = ('count', 'sum', 'mean', 'median', 'min', 'max', 'nunique', 'std')
+CONDITIONAL_AGGREGATES = {'count_where': 'size', 'sum_where': 'sum', 'mean_where': 'mean',
+                          'min_where': 'min', 'max_where': 'max'}
+HIDDEN_PREFIX = '__agg_'
+
+# x ** y only with a literal exponent this small (a power tower would otherwise take unbounded time)
+MAX_EXPONENT = 10
+
+COMPARISONS = {ast.Eq: '==', ast.NotEq: '!=', ast.Gt: '>', ast.Lt: '<', ast.GtE: '>=', ast.LtE: '<=', ast.In: 'in'}
+
+
+class ExpressionError(ValueError):
+    """Raised for formulas outside the supported grammar or referring to unknown names"""
+
+
+def _divide(left, right):
+    # x / 0 -> NaN rather than inf (a group without failures has no failure share, not an infinite one)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = left / right
+    if isinstance(result, pd.Series):
+        return result.replace([np.inf, -np.inf], np.nan)
+    return np.nan if np.isinf(result) else result
+
+
+def _overflowing(func, left, right):
+    # Overflow is expected to end in inf (cleaned to NaN by Computation.evaluate), not to warn
+    with np.errstate(over='ignore'):
+        return func(left, right)
+
+
+ARITHMETIC = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: _divide,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+}
+
+
+def _partitioned(values: pd.Series, partition, func: str):
+    return values.groupby(partition, observed=True).transform(func) if partition is not None else getattr(values, func)()
+
+
+# Result-level functions: name -> (min args, max args, implementation). Column arguments are Series.
+FUNCTIONS: Dict[str, tuple] = {
+    'abs': (1, 1, lambda x: abs(x)),
+    'round': (1, 2, lambda x, digits=0: np.round(x, int(digits))),
+    'sqrt': (1, 1, lambda x: np.sqrt(x)),
+    'log': (1, 1, lambda x: np.log(x)),
+    'ratio': (2, 2, lambda x, y: _divide(x, y)),
+    'pct': (2, 2, lambda x, y: _divide(x, y) * 100),
+    # Window functions over the rows of the aggregated result (optionally within a groupby column)
+    'total': (1, 2, lambda x, by=None: _partitioned(x, by, 'sum')),
+    'share': (1, 2, lambda x, by=None: _divide(x, _partitioned(x, by, 'sum')) * 100),
+    'rank': (1, 2, lambda x, by=None: (x.groupby(by, observed=True) if by is not None else x)
+             .rank(ascending=False, method='min')),
+    'diff': (1, 1, lambda x: x.diff()),
+    'pct_change': (1, 1, lambda x: _divide(x.diff(), x.shift()) * 100),
+    'cumsum': (1, 1, lambda x: x.cumsum()),
+}
+WINDOW_PARTITION_FUNCTIONS = ('total', 'share', 'rank')
+# Arguments that must be whole-number literals (function -> argument position), checked when compiling
+LITERAL_ARGUMENTS = {'round': 1}
+
+
+class Computation:
+    """One compiled computation: the hidden aggregations it needs plus a vectorized evaluator"""
+
+    def __init__(self, name: str, formula: str, evaluate: Callable, aggregations: List[dict]):
+        self.name = name
+        self.formula = formula
+        self.aggregations = aggregations
+        self._evaluate = evaluate
+
+    def evaluate(self, df: pd.DataFrame) -> pd.Series:
+        value = self._evaluate(df)
+        if not isinstance(value, pd.Series):
+            value = pd.Series(value, index=df.index)
+        if pd.api.types.is_float_dtype(value):
+            value = value.replace([np.inf, -np.inf], np.nan)
+        return value
+
+
+class _Compiler:
+    def __init__(self, result_columns: List[str], data_columns: List[str], default_column: str, hidden: Dict[str, dict]):
+        self.result_columns = result_columns
+        self.data_columns = data_columns
+        self.default_column = default_column
+        self.hidden = hidden
+        self.needed: List[dict] = []
+
+    def compile(self, node: ast.AST) -> Callable:
+        if isinstance(node, ast.Expression):
+            return self.compile(node.body)
+
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            # float64, never Python ints: overflow ends in inf instead of an ever-growing big int
+            try:
+                value = np.float64(node.value)
+            except OverflowError:
+                raise ExpressionError(f"Number too large: '{ast.unparse(node)}'")
+            return lambda df: value
+
+        if isinstance(node, ast.Name):
+            return self._result_column(node.id)
+
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+            exponent = self._literal_number(node.right)
+            if exponent is None or abs(exponent) > MAX_EXPONENT:
+                raise ExpressionError(f"'**' needs a literal exponent between -{MAX_EXPONENT} and {MAX_EXPONENT}: '{ast.unparse(node)}'")
+            base = self.compile(node.left)
+            return lambda df: _overflowing(np.power, base(df), np.float64(exponent))
+
+        if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+            func, left, right = ARITHMETIC[type(node.op)], self.compile(node.left), self.compile(node.right)
+            return lambda df: _overflowing(func, left(df), right(df))
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self.compile(node.operand)
+            sign = -1 if isinstance(node.op, ast.USub) else 1
+            return lambda df: sign * operand(df)
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            return self._call(node.func.id, node.args)
+
+        raise ExpressionError(f"Unsupported syntax: '{ast.unparse(node)}'")
+
+    def _literal_number(self, node: ast.AST):
+        """Value of a (signed) numeric literal, None for anything else"""
+        sign = 1
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            sign = -1 if isinstance(node.op, ast.USub) else 1
+            node = node.operand
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return sign * node.value
+        return None
+
+    def _result_column(self, name: str) -> Callable:
+        if name in self.result_columns:
+            return lambda df: df[name]
+        if name in self.data_columns:
+            raise ExpressionError(f"'{name}' is a data column, aggregate it first (e.g. sum({name}) or count_where(...))")
+        raise ExpressionError(f"Unknown name '{name}', use one of {self.result_columns}")
+
+    def _call(self, name: str, args: List[ast.AST]) -> Callable:
+        if name in ROW_AGGREGATES:
+            if name == 'count' and not args:
+                return self._hidden(self.default_column, 'size', [])
+            if len(args) != 1 or not isinstance(args[0], ast.Name) or args[0].id not in self.data_columns:
+                raise ExpressionError(f"{name}() takes one data column, e.g. {name}(amount_inr)")
+            return self._hidden(args[0].id, name, [])
+
+        if name in CONDITIONAL_AGGREGATES:
+            function = CONDITIONAL_AGGREGATES[name]
+            if function == 'size':
+                if len(args) != 1:
+                    raise ExpressionError(f"{name}() takes a condition, e.g. {name}(transaction_status == 'FAILED')")
+                return self._hidden(self.default_column, 'size', self._condition(args[0]))
+            if len(args) != 2 or not isinstance(args[0], ast.Name) or args[0].id not in self.data_columns:
+                raise ExpressionError(f"{name}() takes a data column and a condition, e.g. {name}(amount_inr, fraud_flag == 1)")
+            return self._hidden(args[0].id, function, self._condition(args[1]))
+
+        if name in FUNCTIONS:
+            low, high, func = FUNCTIONS[name]
+            if not low <= len(args) <= high:
+                raise ExpressionError(f"{name}() takes {low}-{high} arguments, got {len(args)}")
+            compiled = []
+            for position, arg in enumerate(args):
+                if LITERAL_ARGUMENTS.get(name) == position:
+                    literal = self._literal_number(arg)
+                    if not isinstance(literal, int):
+                        raise ExpressionError(f"{name}(): argument {position + 1} must be a whole number: '{ast.unparse(arg)}'")
+                    compiled.append(lambda df, value=literal: value)
+                else:
+                    compiled.append(self.compile(arg))
+            if name in WINDOW_PARTITION_FUNCTIONS and len(args) == 2:
+                # Second argument names the groupby column the window is partitioned by
+                if not isinstance(args[1], ast.Name):
+                    raise ExpressionError(f"{name}(x, column): the partition must be a groupby column")
+            return lambda df: func(*[arg(df) for arg in compiled])
+
+        raise ExpressionError(f"Unknown function '{name}'")
+
+    def _condition(self, node: ast.AST) -> List[dict]:
+        """A row condition -> plan-style filters (ANDed)"""
+        if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+            return [f for value in node.values for f in self._condition(value)]
+        if (isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in COMPARISONS
+                and isinstance(node.left, ast.Name)):
+            column = node.left.id
+            if column not in self.data_columns:
+                raise ExpressionError(f"Unknown data column '{column}' in condition")
+            try:
+                value = ast.literal_eval(node.comparators[0])
+            except ValueError:
+                raise ExpressionError(f"Condition values must be literals: '{ast.unparse(node)}'")
+            op = COMPARISONS[type(node.ops[0])]
+            if op == 'in' and not isinstance(value, (list, tuple)):
+                raise ExpressionError(f"'in' needs a list: '{ast.unparse(node)}'")
+            return [{'column': column, 'operator': op, 'value': list(value) if op == 'in' else value}]
+        raise ExpressionError(f"Unsupported condition '{ast.unparse(node)}', use column <op> value joined with 'and'")
+
+    def _hidden(self, column: str, function: str, where: List[dict]) -> Callable:
+        """Register a row-level aggregate (shared between computations) and read it from the result"""
+        key = json.dumps([column, function, where], sort_keys=True, default=str)
+        if key not in self.hidden:
+            self.hidden[key] = {'column': column, 'function': function, 'where': where,
+                                'alias': f"{HIDDEN_PREFIX}{len(self.hidden)}"}
+        aggregation = self.hidden[key]
+        if aggregation not in self.needed:
+            self.needed.append(aggregation)
+        alias = aggregation['alias']
+        return lambda df: df[alias]
+
+
+def compile_computation(computation: dict, result_columns: List[str], data_columns: List[str],
+                        hidden: Dict[str, dict]) -> Computation:
+    """Parse and check one {"name", "formula"} computation.
+    `hidden` collects the row-level aggregates across computations so each is computed once."""
+    name = computation.get('name')
+    formula = computation.get('formula')
+    if not name or not isinstance(formula, str) or not formula.strip():
+        raise ExpressionError("A computation needs a 'name' and a 'formula'")
+    if name in result_columns:
+        raise ExpressionError(f"Computation name '{name}' clashes with a result column")
+    try:
+        tree = ast.parse(formula.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError(f"Cannot parse formula '{formula}': {e.msg}")
+
+    default_column = 'transaction_id' if 'transaction_id' in data_columns else data_columns[0]
+    compiler = _Compiler(list(result_columns), list(data_columns), default_column, hidden)
+    evaluate = compiler.compile(tree)
+    return Computation(name, formula, evaluate, compiler.needed)
+
+
+def apply_computations(df: pd.DataFrame, computations: List[Computation]) -> pd.DataFrame:
+    """Add the computed columns (in order, so later ones can use earlier ones) and drop the hidden aggregates"""
+    if not computations:
+        return df
+    df = df.copy()
+    for computation in computations:
+        df[computation.name] = computation.evaluate(df).to_numpy() if len(df) else []
+    return df[[col for col in df.columns if not str(col).startswith(HIDDEN_PREFIX)]]
@@ -0,0 +1,264 @@
+# This file defines the partitioned dataset layout (DATA_PATH pointing at a directory):
+#   <root>/dt=2024-01/part-0.csv
+#   <root>/dt=2024-02/sender_state=Delhi/part-0.csv      (hive-style key=value directories)
+# Every file is one partition. The first time a partition is read it is preprocessed like the
+# single-file dataset and kept as its own memory-mapped ColumnStore, together with per-partition
+# statistics (rows, min/max, distinct values of PARTITION_STATS_COLUMNS, and the column summaries
+# the dataset profile is merged from), so opening the dataset reads no rows at all.
+# Filters are checked against the directory keys first (no I/O at all), then against the small
+# statistics files, so only partitions that can hold matching rows are opened, and of those
+# only the columns the plan reads are touched.
+
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from urllib.parse import unquote
+from typing import Dict, List, Optional
+from pandas.api.types import union_categoricals
+from src.config import config
+from src.utils.column_store import ColumnStore
+
+
+class Partition:
+    def __init__(self, root: str, path: str):
+        self.path = path
+        self.name = os.path.relpath(path, root)
+        stat = os.stat(path)
+        raw = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        self.version = hashlib.md5(raw.encode()).hexdigest()[:12]
+        # key=value directories between the root and the file, e.g. {'dt': '2024-01', 'sender_state': 'Delhi'}
+        self.keys = dict(unquote(part).split('=', 1) for part in os.path.dirname(self.name).split(os.sep) if '=' in part)
+        self._stats = None
+        self._store = None
+
+    @property
+    def _store_path(self) -> str:
+        return os.path.join(config.CACHE_DIR, 'partitions', self.version)
+
+    @property
+    def stats(self) -> dict:
+        """Rows plus min/max/distinct values per statistics column (builds the partition on first use)"""
+        if self._stats is None:
+            path = f"{self._store_path}.stats.json"
+            if not os.path.exists(path):
+                self.store()
+            with open(path) as f:
+                self._stats = json.load(f)
+            if 'profile' not in self._stats:
+                # Written before the stats carried profile summaries
+                store = self.store()
+                self._write_stats(store.frame(store.columns))
+        return self._stats
+
+    @property
+    def rows(self) -> int:
+        return self.stats['rows']
+
+    def store(self) -> ColumnStore:
+        """Memory-mapped columns of this partition, converted from its file the first time"""
+        if self._store is not None:
+            return self._store
+        if os.path.exists(os.path.join(self._store_path, 'manifest.json')) and os.path.exists(f"{self._store_path}.stats.json"):
+            self._store = ColumnStore.open(self._store_path)
+            return self._store
+
+        # Imported here: data_loader imports this module
+        from src.utils.data_loader import preprocess
+        df = preprocess(pd.read_csv(self.path))
+        os.makedirs(os.path.dirname(self._store_path), exist_ok=True)
+        self._store = ColumnStore.build(df, self._store_path, self.version)
+
+        self._write_stats(df)
+        return self._store
+
+    def _write_stats(self, df: pd.DataFrame):
+        from src.utils.data_loader import column_summaries
+        stats = {'rows': len(df),
+                 'columns': {col: _column_stats(df[col]) for col in config.PARTITION_STATS_COLUMNS if col in df.columns},
+                 'profile': column_summaries(df)}
+        tmp_path = f"{self._store_path}.stats.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(stats, f, default=str)
+        os.replace(tmp_path, f"{self._store_path}.stats.json")
+        self._stats = json.loads(json.dumps(stats, default=str))
+
+    def may_match(self, filters: List[dict]) -> bool:
+        """False only when no row of this partition can pass every filter"""
+        # Directory keys first: deciding on them needs no I/O
+        for f in filters:
+            if not self._keys_may_match(f):
+                return False
+        for f in filters:
+            summary = self.stats['columns'].get(f['column'])
+            if summary is not None and not _summary_may_match(f['column'], summary, f['operator'], f['value']):
+                return False
+        return True
+
+    def _keys_may_match(self, filter_cond: dict) -> bool:
+        column, operator, value = filter_cond['column'], filter_cond['operator'], filter_cond['value']
+        if column == 'timestamp' and 'dt' in self.keys:
+            start = pd.Timestamp(self.keys['dt'])
+            end = start + (pd.offsets.MonthBegin(1) if len(self.keys['dt']) == 7 else pd.Timedelta(days=1))
+            summary = {'min': start.value, 'max': end.value - 1}
+            return _summary_may_match(column, summary, operator, value)
+        if column in self.keys:
+            return _summary_may_match(column, {'values': [self.keys[column]], 'nulls': 0}, operator, value)
+        return True
+
+
+class PartitionedDataset:
+    def __init__(self, root: str):
+        self.root = root
+        self.partitions: List[Partition] = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Hidden / underscore directories (caches, markers) are not partitions
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith(('.', '_')))
+            for name in sorted(filenames):
+                if name.endswith('.csv') and not name.startswith(('.', '_')):
+                    self.partitions.append(Partition(root, os.path.join(dirpath, name)))
+        if not self.partitions:
+            raise FileNotFoundError(f"No partition files (*.csv) under {root}")
+
+        raw = "|".join(f"{p.name}:{p.version}" for p in self.partitions)
+        self.version = hashlib.md5(raw.encode()).hexdigest()[:12]
+        self._schema = None
+
+    @property
+    def rows(self) -> int:
+        return sum(p.rows for p in self.partitions)
+
+    def schema(self) -> pd.DataFrame:
+        """Zero-row frame with every column's dtype; categories are the union over all partitions"""
+        if self._schema is None:
+            first = self.partitions[0].store()
+            schema = first.frame(first.columns, np.array([], dtype='int64'))
+            for col in first.columns:
+                if first.kind(col) == 'category':
+                    labels = set()
+                    for partition in self.partitions:
+                        labels.update(partition.store().categories(col))
+                    schema[col] = pd.Categorical([], categories=sorted(labels))
+            self._schema = schema
+        return self._schema
+
+    def profile(self) -> dict:
+        """Dataset profile merged from the partitions' column summaries"""
+        from src.utils.data_loader import merge_profile
+        schema = self.schema()
+        sample = json.loads(self.head(10).to_json(orient='records', date_format='iso'))
+        return merge_profile([p.stats['profile'] for p in self.partitions], self.version, self.rows,
+                             list(schema.columns), sample)
+
+    def head(self, n: int) -> pd.DataFrame:
+        """First rows of the first partition"""
+        store = self.partitions[0].store()
+        return store.frame(store.columns, np.arange(min(n, store.rows)))
+
+    def prune(self, filters: List[dict]) -> List[Partition]:
+        """Partitions that can hold rows passing the (compiled) filters"""
+        return [p for p in self.partitions if p.may_match(filters)]
+
+    def read(self, filters: List[dict], columns: List[str], partitions: List[Partition] = None) -> pd.DataFrame:
+        """Rows passing the filters, only `columns`, read from the surviving partitions"""
+        if partitions is None:
+            partitions = self.prune(filters)
+        frames = []
+        for partition in partitions:
+            store = partition.store()
+            positions = np.flatnonzero(store.mask(filters)) if filters else None
+            frames.append(store.frame(columns, positions))
+        return self._concat(frames, columns)
+
+    def _concat(self, frames: List[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+        if not frames:
+            # Nothing survived pruning: an empty frame that still has the right dtypes
+            return self.schema()[columns]
+
+        data = {}
+        for col in columns:
+            parts = [frame[col] for frame in frames]
+            if isinstance(parts[0].dtype, pd.CategoricalDtype):
+                # Each partition has its own dictionary: merge them (sorted, like pandas categories)
+                data[col] = union_categoricals(parts, sort_categories=True)
+            else:
+                data[col] = pd.concat(parts, ignore_index=True)
+        return pd.DataFrame(data)
+
+    def take(self, positions: np.ndarray, columns: List[str] = None) -> pd.DataFrame:
+        """Every column (or just `columns`) of the rows at these positions of the partitions laid end to end (read order)"""
+        positions = np.sort(np.asarray(positions, dtype='int64'))
+        columns = list(columns or self.partitions[0].store().columns)
+        bounds = np.cumsum([0] + [p.rows for p in self.partitions])
+        frames = []
+        for partition, start, end in zip(self.partitions, bounds[:-1], bounds[1:]):
+            local = positions[(positions >= start) & (positions < end)] - start
+            if len(local):
+                frames.append(partition.store().frame(columns, local))
+        return self._concat(frames, columns)
+
+    def load(self) -> pd.DataFrame:
+        """Every column of every partition, in timestamp order (the whole-dataset frame)"""
+        df = self.read([], self.partitions[0].store().columns, self.partitions)
+        if 'timestamp' in df.columns:
+            df = df.sort_values('timestamp', kind='stable', ignore_index=True)
+        return df
+
+    def summary(self, filters: List[dict]) -> Dict[str, int]:
+        selected = self.prune(filters)
+        return {'total': len(self.partitions), 'scanned': len(selected), 'rows': sum(p.rows for p in selected)}
+
+
+def _column_stats(series: pd.Series) -> Optional[dict]:
+    nulls = int(series.isna().sum())
+    if pd.api.types.is_datetime64_any_dtype(series):
+        valid = series.dropna()
+        return {'min': pd.Timestamp(valid.min()).value, 'max': pd.Timestamp(valid.max()).value, 'nulls': nulls} if len(valid) else None
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        valid = series.dropna()
+        return {'min': float(valid.min()), 'max': float(valid.max()), 'nulls': nulls} if len(valid) else None
+    values = series.dropna().unique()
+    if len(values) > config.PARTITION_MAX_DISTINCT:
+        return None
+    return {'values': sorted(v.item() if hasattr(v, 'item') else v for v in values), 'nulls': nulls}
+
+
+def _summary_may_match(column: str, summary: dict, operator: str, value) -> bool:
+    """Can any value described by `summary` (a value list, or a min/max range) pass `column <operator> value`?"""
+    if 'values' in summary:
+        values = summary['values']
+        if operator == '!=':
+            # Null rows pass '!=' as well
+            return values != [value] or summary.get('nulls', 0) > 0
+        try:
+            return any(_compare(v, operator, value) for v in values)
+        except TypeError:
+            return True
+
+    low, high = summary['min'], summary['max']
+    try:
+        if column == 'timestamp':
+            value = [pd.Timestamp(v).value for v in value] if operator == 'in' else pd.Timestamp(value).value
+        else:
+            value = [float(v) for v in value] if operator == 'in' else float(value)
+    except (ValueError, TypeError):
+        return True
+    if operator == '==':
+        return low <= value <= high
+    if operator == 'in':
+        return any(low <= v <= high for v in value)
+    if operator == '!=':
+        return not (low == high == value) or summary.get('nulls', 0) > 0
+    if operator in ('>', '>='):
+        return _compare(high, operator, value)
+    return _compare(low, operator, value)
+
+
+def _compare(left, operator: str, right) -> bool:
+    return {
+        '==': lambda: left == right, '!=': lambda: left != right,
+        '>': lambda: left > right, '<': lambda: left < right,
+        '>=': lambda: left >= right, '<=': lambda: left <= right,
+        'in': lambda: left in right,
+    }[operator]()
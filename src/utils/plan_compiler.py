@@ -0,0 +1,362 @@
+# This file defines the PlanCompiler that runs before DataQueryTool executes a plan:
+# Validates columns, operators, functions and value types against the schema (a zero-row frame,
+# so a partitioned dataset is validated from its catalog without reading any partition)
+# Normalises filter values to the exact categorical labels (so filters compare codes)
+# Orders filters by estimated selectivity using the dataset profile's value frequencies
+# Prunes the columns the plan never touches
+# Picks an access path (index, cube, partitions or scan) by estimated cost
+# Compiles `computations` (see expressions.py); their row-level aggregates join the plan's aggregations
+
+import difflib
+import pandas as pd
+from typing import Dict, List, Optional
+from src.config import config
+from src.utils.data_loader import data_loader
+from src.utils.cube import cube_store
+from src.utils.expressions import ExpressionError, compile_computation
+
+OPERATORS = ('==', '!=', '>', '<', '>=', '<=', 'in')
+EQUALITY_OPERATORS = ('==', '!=', 'in')
+AGG_FUNCTIONS = ('count', 'size', 'sum', 'mean', 'median', 'min', 'max', 'nunique', 'std')
+NUMERIC_FUNCTIONS = ('sum', 'mean', 'median', 'std')
+CUBE_FUNCTIONS = ('count', 'size', 'sum', 'mean', 'min', 'max')
+
+DAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Fallback selectivity when the profile has no frequencies for a column
+DEFAULT_SELECTIVITY = 0.1
+
+
+class PlanValidationError(ValueError):
+    """Raised when an execution plan does not match the loaded schema"""
+
+
+class PlanCompiler:
+    def compile(self, plan: dict, strict: bool = False) -> dict:
+        """Validate, normalise and optimise a plan.
+
+        Returns the optimised plan plus what the optimiser decided and why
+        (access path, pruned columns, estimated rows and cost) for tracing.
+        With `strict`, a computation that doesn't compile fails the plan instead of being skipped.
+        """
+        schema = data_loader.get_schema()
+        profile = data_loader.get_profile()
+        warnings = []
+
+        plan = dict(plan)
+        filters = [self._compile_filter(schema, profile, f, warnings) for f in plan.get('filters') or []]
+        groupby = plan.get('groupby') or []
+        if isinstance(groupby, str):
+            groupby = [groupby]
+        for col in groupby:
+            self._check_column(schema, col, 'groupby')
+        aggregations = [self._compile_plan_aggregation(schema, profile, agg, warnings) for agg in plan.get('aggregations') or []]
+        computations = self._compile_computations(schema, profile, plan, groupby, aggregations, warnings, strict)
+
+        # Most selective filter first, so later filters only see the surviving rows
+        filters.sort(key=lambda f: f['selectivity'])
+        plan['filters'] = [{k: f[k] for k in ('column', 'operator', 'value')} for f in filters]
+        plan['groupby'] = groupby
+        plan['aggregations'] = aggregations
+
+        output_columns = groupby + [agg['alias'] for agg in aggregations] if (groupby or aggregations) else list(schema.columns)
+        output_columns += [computation.name for computation in computations]
+        if plan.get('sort') and not plan.get('resample'):
+            by = plan['sort'].get('by')
+            for col in ([by] if isinstance(by, str) else list(by or [])):
+                if col not in output_columns:
+                    raise PlanValidationError(f"Cannot sort by '{col}': not in the result columns {output_columns}")
+        if plan.get('limit') is not None:
+            plan['limit'] = int(plan['limit'])
+
+        # Column pruning: only the columns the plan reads are materialised
+        if groupby or aggregations:
+            where_columns = [f['column'] for agg in aggregations for f in agg.get('where', [])]
+            columns = list(dict.fromkeys(groupby + [agg['column'] for agg in aggregations] + where_columns))
+        else:
+            columns = list(schema.columns)
+
+        rows = data_loader.row_count()
+        selectivity = 1.0
+        for f in filters:
+            selectivity *= f['selectivity']
+        estimated_rows = int(round(rows * selectivity))
+
+        partitions = data_loader.get_partitions().summary(plan['filters']) if data_loader.is_partitioned else None
+        costs = self._estimate_costs(schema, profile, filters, groupby, aggregations, columns, rows, estimated_rows, partitions)
+        access_path = min(costs, key=costs.get)
+
+        return {
+            'plan': plan,
+            'columns': columns,
+            'computations': computations,
+            'access_path': access_path,
+            'estimated_rows': estimated_rows,
+            'cost': {path: round(cost) for path, cost in costs.items()},
+            'filter_selectivity': {f"{f['column']} {f['operator']} {f['value']}": round(f['selectivity'], 6) for f in filters},
+            'partitions': partitions,
+            'warnings': warnings,
+        }
+
+    def _check_column(self, schema: pd.DataFrame, column: str, where: str):
+        if column not in schema.columns:
+            close = difflib.get_close_matches(str(column), list(schema.columns), n=1)
+            hint = f" Did you mean '{close[0]}'?" if close else ""
+            raise PlanValidationError(f"Unknown column '{column}' in {where}.{hint}")
+
+    def _compile_filter(self, schema: pd.DataFrame, profile: dict, filter_cond: dict, warnings: list) -> dict:
+        """Validate one filter, normalise its value and estimate its selectivity"""
+        column = filter_cond.get('column')
+        operator = filter_cond.get('operator', '==')
+        value = filter_cond.get('value')
+        self._check_column(schema, column, 'filters')
+
+        if operator not in OPERATORS:
+            raise PlanValidationError(f"Unsupported operator '{operator}' on '{column}', use one of {OPERATORS}")
+        if operator == 'in':
+            if not isinstance(value, list):
+                value = [value]
+            value = [self._normalize_value(schema, column, v, warnings) for v in value]
+        else:
+            value = self._normalize_value(schema, column, value, warnings)
+
+        return {
+            'column': column,
+            'operator': operator,
+            'value': value,
+            'selectivity': self._selectivity(schema, profile, column, operator, value),
+        }
+
+    def _normalize_value(self, schema: pd.DataFrame, column: str, value, warnings: list):
+        """Coerce a filter value to the column's type / exact category label"""
+        series = schema[column]
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = list(series.cat.categories)
+            if value in categories:
+                return value
+            lookup = {str(c).strip().lower(): c for c in categories}
+            key = str(value).strip().lower()
+            if key in lookup:
+                return lookup[key]
+            warnings.append(f"Value '{value}' does not occur in '{column}'")
+            return value
+
+        if pd.api.types.is_bool_dtype(series):
+            if isinstance(value, str):
+                if value.strip().lower() in ('1', 'true', 'yes', 'y'):
+                    return True
+                if value.strip().lower() in ('0', 'false', 'no', 'n'):
+                    return False
+                raise PlanValidationError(f"'{column}' is boolean, got '{value}'")
+            return bool(value)
+
+        if pd.api.types.is_datetime64_any_dtype(series):
+            try:
+                return pd.Timestamp(value).isoformat()
+            except (ValueError, TypeError):
+                raise PlanValidationError(f"'{column}' needs a date/time value, got '{value}'")
+
+        if pd.api.types.is_numeric_dtype(series):
+            if column == 'day_of_week' and isinstance(value, str) and value.strip().lower() in DAY_NAMES:
+                return DAY_NAMES.index(value.strip().lower())
+            try:
+                number = float(value)
+            except (ValueError, TypeError):
+                raise PlanValidationError(f"'{column}' is numeric, got '{value}'")
+            return int(number) if pd.api.types.is_integer_dtype(series) and number.is_integer() else number
+
+        return value
+
+    def _value_frequencies(self, profile: dict, column: str) -> Optional[Dict]:
+        summary = profile['categorical'].get(column)
+        if not summary or 'values' not in summary:
+            return None
+        return {value: count for value, count in summary['values']}
+
+    def _selectivity(self, schema: pd.DataFrame, profile: dict, column: str, operator: str, value) -> float:
+        """Estimated fraction of rows that pass a filter"""
+        rows = max(profile['rows'], 1)
+        frequencies = self._value_frequencies(profile, column)
+
+        if frequencies is not None and operator in EQUALITY_OPERATORS:
+            values = value if operator == 'in' else [value]
+            hit = sum(frequencies.get(v, 0) for v in values) / rows
+            return 1.0 - hit if operator == '!=' else hit
+
+        if operator in EQUALITY_OPERATORS:
+            distinct = profile['categorical'].get(column, {}).get('distinct')
+            hit = 1.0 / distinct if distinct else DEFAULT_SELECTIVITY
+            if operator == 'in':
+                hit = min(1.0, hit * len(value))
+            return 1.0 - hit if operator == '!=' else hit
+
+        # Range filters: assume values are spread uniformly between min and max
+        if column in profile['numeric']:
+            low, high = profile['numeric'][column]['min'], profile['numeric'][column]['max']
+            point = float(value)
+        elif column == 'timestamp' and profile.get('date_range'):
+            low = pd.Timestamp(profile['date_range']['min']).value
+            high = pd.Timestamp(profile['date_range']['max']).value
+            point = pd.Timestamp(value).value
+        elif frequencies is not None:
+            total = sum(frequencies.values()) or 1
+            passing = sum(count for v, count in frequencies.items() if self._compare(v, operator, value))
+            return passing / total
+        else:
+            return DEFAULT_SELECTIVITY
+
+        if high <= low:
+            return 1.0
+        below = min(max((point - low) / (high - low), 0.0), 1.0)
+        return below if operator in ('<', '<=') else 1.0 - below
+
+    def _compare(self, left, operator: str, right) -> bool:
+        try:
+            return {
+                '>': left > right, '<': left < right,
+                '>=': left >= right, '<=': left <= right,
+            }[operator]
+        except TypeError:
+            return True
+
+    def _compile_plan_aggregation(self, schema: pd.DataFrame, profile: dict, agg: dict, warnings: list) -> dict:
+        """A plan aggregation, with its optional `where` (SQL's FILTER (WHERE ...)) validated like the filters"""
+        compiled = self._compile_aggregation(schema, agg)
+        where = agg.get('where')
+        if where:
+            if isinstance(where, dict):
+                where = [where]
+            if not isinstance(where, list) or not all(isinstance(f, dict) for f in where):
+                raise PlanValidationError(f"'where' of aggregation '{compiled['alias']}' must be a list of conditions")
+            compiled['where'] = [{k: f[k] for k in ('column', 'operator', 'value')}
+                                 for f in (self._compile_filter(schema, profile, f, warnings) for f in where)]
+        return compiled
+
+    def _compile_aggregation(self, schema: pd.DataFrame, agg: dict) -> dict:
+        column = agg.get('column')
+        func = agg.get('function')
+        self._check_column(schema, column, 'aggregations')
+        if func not in AGG_FUNCTIONS:
+            raise PlanValidationError(f"Unsupported aggregation '{func}', use one of {AGG_FUNCTIONS}")
+
+        series = schema[column]
+        is_numeric = pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)
+        if func in NUMERIC_FUNCTIONS and not is_numeric:
+            raise PlanValidationError(f"'{func}' needs a numeric column, '{column}' is {series.dtype}")
+
+        return {'column': column, 'function': func, 'alias': agg.get('alias') or f"{func}_{column}"}
+
+    def _compile_computations(self, schema: pd.DataFrame, profile: dict, plan: dict, groupby: List[str],
+                              aggregations: List[dict], warnings: list, strict: bool = False) -> list:
+        """Compile plan['computations']; their row-level aggregates are appended to `aggregations`.
+        A computation that doesn't compile is dropped with a warning instead of failing the query
+        (unless `strict`)."""
+        requested = plan.get('computations') or []
+        if requested and plan.get('resample'):
+            warnings.append("Computations are not applied to resampled series (they already carry rates and deltas)")
+            requested = []
+
+        result_columns = groupby + [agg['alias'] for agg in aggregations]
+        hidden, computations = {}, []
+        for computation in requested:
+            candidate = dict(hidden)
+            try:
+                compiled = compile_computation(computation, result_columns, list(schema.columns), candidate)
+                # Validate the row-level aggregates this computation added, like the plan's own
+                for key in candidate.keys() - hidden.keys():
+                    agg = candidate[key]
+                    where = [self._compile_filter(schema, profile, f, warnings) for f in agg['where']]
+                    agg.update(self._compile_aggregation(schema, agg))
+                    agg['where'] = [{k: f[k] for k in ('column', 'operator', 'value')} for f in where]
+                    if not agg['where']:
+                        del agg['where']
+            except (ExpressionError, PlanValidationError) as e:
+                if strict:
+                    raise PlanValidationError(f"Computation '{computation.get('name')}' is invalid: {e}") from e
+                warnings.append(f"Skipped computation '{computation.get('name')}': {e}")
+                continue
+            hidden = candidate
+            computations.append(compiled)
+            result_columns.append(compiled.name)
+
+        aggregations.extend(hidden.values())
+        plan['computations'] = [{'name': c.name, 'formula': c.formula} for c in computations]
+        return computations
+
+    def _estimate_costs(self, schema: pd.DataFrame, profile: dict, filters: List[dict], groupby: List[str],
+                        aggregations: List[dict], columns: List[str], rows: int, estimated_rows: int,
+                        partitions: Optional[dict] = None) -> Dict[str, float]:
+        """Estimated cells touched by each available access path"""
+        output_cost = estimated_rows * max(len(columns), 1)
+
+        costs = {}
+        if partitions is not None:
+            # Partitioned: only the partitions that survive pruning are read, and only the plan's
+            # columns; scan and index would need the whole history in memory first
+            scanned = partitions['rows']
+            costs['partitions'] = scanned * (config.PARTITION_READ_COST + len(filters)) + min(estimated_rows, scanned) * max(len(columns), 1)
+        else:
+            costs.update(self._in_memory_costs(schema, filters, columns, rows, output_cost))
+
+        # Cube: a pre-aggregated table over exactly these dimensions already exists
+        dimensions = cube_dimensions(schema, profile, filters, groupby, aggregations)
+        if dimensions is not None:
+            cube = cube_store.get(dimensions)
+            if cube is not None:
+                costs['cube'] = len(cube.table) * (len(dimensions) + len(aggregations))
+
+        return costs
+
+    def _in_memory_costs(self, schema: pd.DataFrame, filters: List[dict], columns: List[str], rows: int,
+                         output_cost: float) -> Dict[str, float]:
+        """Scan and index costs over the in-memory frame"""
+        # Scan: every filter evaluated over the rows surviving the previous ones
+        scan = 0.0
+        surviving = rows
+        for f in filters:
+            scan += surviving
+            surviving *= f['selectivity']
+        costs = {'scan': scan + output_cost + (0 if filters else rows)}
+
+        # Index: the first (most selective) equality filter is answered from the posting lists
+        first = filters[0] if filters else None
+        if (first and first['operator'] in ('==', 'in')
+                and isinstance(schema[first['column']].dtype, pd.CategoricalDtype)):
+            index_cost = rows * first['selectivity'] * config.INDEX_GATHER_COST
+            surviving = rows * first['selectivity']
+            for f in filters[1:]:
+                index_cost += surviving
+                surviving *= f['selectivity']
+            costs['index'] = index_cost + output_cost
+        return costs
+
+
+def cube_dimensions(schema: pd.DataFrame, profile: dict, filters: List[dict], groupby: List[str],
+                    aggregations: List[dict]) -> Optional[tuple]:
+    """Dimensions of the cube that could answer this plan, or None if no cube can"""
+    if not aggregations:
+        return None
+    dims = list(groupby) + [f['column'] for f in filters]
+    for col in dims:
+        if not (isinstance(schema[col].dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(schema[col])
+                or col in config.PROFILE_CATEGORICAL_NUMERIC):
+            return None
+    if any(f['operator'] not in EQUALITY_OPERATORS for f in filters):
+        return None
+    if any(agg.get('where') for agg in aggregations):
+        return None
+    for agg in aggregations:
+        if agg['function'] not in CUBE_FUNCTIONS:
+            return None
+        if agg['function'] in ('count', 'size'):
+            summary = profile['categorical'].get(agg['column']) or profile['numeric'].get(agg['column']) or {}
+            if agg['column'] not in config.CUBE_MEASURES and summary.get('nulls', 1) != 0:
+                return None
+        elif agg['column'] not in config.CUBE_MEASURES:
+            return None
+    return tuple(sorted(set(dims)))
+
+
+# Global shared instance, like data_loader
+plan_compiler = PlanCompiler()
@@ -0,0 +1,176 @@
+# This file defines the Prefetcher that speculatively runs likely follow-up plans:
+# After an answer, it predicts the next plans from the current ExecutionPlan
+#   - siblings:   same metric grouped by a neighbouring dimension (device_type -> network_type)
+#   - drill-down: restrict to the top group of the answer and split it by another dimension
+#   - over time:  same filters as a daily time series
+# Predicted plans run on one low-priority background thread into the result cache,
+# so when the follow-up question arrives the analyzer can skip execution entirely
+# CPU use is bounded (plans per turn, estimated cost per plan, share of one core)
+# and `stats` tracks how many lookups were answered from prefetched results
+
+import os
+import json
+import time
+import queue
+import threading
+from typing import List, Optional
+from src.config import config
+from src.utils.cache import make_key, result_cache
+from src.utils.data_loader import data_loader
+from src.utils.plan_compiler import plan_compiler, PlanValidationError
+
+
+class Prefetcher:
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=config.PREFETCH_QUEUE_SIZE)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._data_tool = None
+        self.stats = {
+            'predicted': 0, 'executed': 0, 'dropped': 0, 'skipped_cost': 0, 'uncompilable': 0,
+            'lookups': 0, 'hits': 0, 'cpu_seconds': 0.0,
+        }
+
+    # ---------- prediction ----------
+
+    def predict(self, execution_plan: dict, analysis_results: dict = None) -> List[dict]:
+        """Likely follow-up plans for a finished plan, most likely first"""
+        groupby = list(execution_plan.get('groupby') or [])
+        aggregations = execution_plan.get('aggregations') or []
+        filters = list(execution_plan.get('filters') or [])
+        if not groupby or not aggregations or execution_plan.get('resample'):
+            return []
+
+        used = set(groupby) | {f.get('column') for f in filters}
+        candidates = [dim for dim in config.PREFETCH_DIMENSIONS if dim not in used]
+        # Computations come along: the sort may use them, and real follow-ups carry them too
+        base = {key: execution_plan.get(key) for key in ('aggregations', 'computations', 'sort', 'limit')}
+        plans = []
+
+        # Siblings: swap the last grouping dimension for a neighbouring one
+        for dim in candidates[:config.PREFETCH_SIBLINGS]:
+            plans.append({**base, 'filters': filters, 'groupby': groupby[:-1] + [dim]})
+
+        # Drill-down: the top group of this answer, split by the next dimension
+        top_value = self._top_value(analysis_results, groupby[0])
+        if top_value is not None and candidates:
+            drill_filters = filters + [{'column': groupby[0], 'operator': '==', 'value': top_value}]
+            plans.append({**base, 'filters': drill_filters, 'groupby': [candidates[0]]})
+
+        # Same slice over time
+        plans.append({'filters': filters, 'groupby': [], 'aggregations': [],
+                      'resample': {'freq': config.TREND_DEFAULT_FREQ}})
+
+        return plans[:config.PREFETCH_MAX_PLANS]
+
+    def _top_value(self, analysis_results: dict, column: str):
+        """Value of `column` in the first row of the first query result"""
+        for item in (analysis_results or {}).get('results', []):
+            try:
+                rows = json.loads(item.get('result', '')).get('data')
+            except (TypeError, ValueError, AttributeError):
+                continue
+            if isinstance(rows, list) and rows and isinstance(rows[0], dict) and column in rows[0]:
+                return rows[0][column]
+        return None
+
+    # ---------- cache keys ----------
+
+    def _key(self, execution_plan: dict) -> Optional[tuple]:
+        """Key on the compiled plan so equivalent spellings (value case, filter order) share results"""
+        plan = {k: v for k, v in execution_plan.items() if v not in (None, [], {})}
+        try:
+            compiled = plan_compiler.compile(plan)
+        except (PlanValidationError, ValueError, TypeError, KeyError):
+            return None
+        canonical = dict(compiled['plan'])
+        canonical['filters'] = sorted(canonical.get('filters') or [], key=lambda f: json.dumps(f, sort_keys=True, default=str))
+        mode = plan.get('mode') or config.QUERY_MODE
+        return make_key('prefetch', canonical, data_loader.version, mode, data_loader.backend), compiled
+
+    def lookup(self, execution_plan: dict) -> Optional[str]:
+        """Prefetched data-tool output for this plan, if any"""
+        if not config.PREFETCH_ENABLED or not execution_plan:
+            return None
+        keyed = self._key(execution_plan)
+        cached = result_cache.get(keyed[0]) if keyed else None
+        with self._lock:
+            self.stats['lookups'] += 1
+            if cached is not None:
+                self.stats['hits'] += 1
+        return cached
+
+    def hit_rate(self) -> float:
+        """Share of analyses answered from prefetched results"""
+        with self._lock:
+            return self.stats['hits'] / self.stats['lookups'] if self.stats['lookups'] else 0.0
+
+    # ---------- background execution ----------
+
+    def submit(self, execution_plan: dict, analysis_results: dict = None):
+        """Queue the predicted follow-ups (never blocks the caller)"""
+        if not config.PREFETCH_ENABLED or not execution_plan:
+            return
+        plans = self.predict(execution_plan, analysis_results)
+        with self._lock:
+            self.stats['predicted'] += len(plans)
+        for plan in plans:
+            try:
+                self._queue.put_nowait(plan)
+            except queue.Full:
+                with self._lock:
+                    self.stats['dropped'] += 1
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='prefetch', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        # Lowest scheduling priority for this thread only (Linux); foreground requests win
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+        while True:
+            plan = self._queue.get()
+            started = time.thread_time()
+            try:
+                self._execute(plan)
+            except Exception as e:
+                print(f"  ⚠️ Prefetch failed: {e}")
+            spent = time.thread_time() - started
+            with self._lock:
+                self.stats['cpu_seconds'] += spent
+            # Idle long enough that prefetching uses at most PREFETCH_CPU_SHARE of one core
+            time.sleep(spent * (1 / config.PREFETCH_CPU_SHARE - 1))
+
+    def _execute(self, plan: dict):
+        keyed = self._key(plan)
+        if keyed is None:
+            with self._lock:
+                self.stats['uncompilable'] += 1
+            return
+        key, compiled = keyed
+        if result_cache.get(key) is not None:
+            return
+        if min(compiled['cost'].values()) > config.PREFETCH_MAX_COST:
+            with self._lock:
+                self.stats['skipped_cost'] += 1
+            return
+
+        if self._data_tool is None:
+            from src.tools.data_tools import DataQueryTool
+            self._data_tool = DataQueryTool()
+        output = self._data_tool.execute_query(json.dumps(plan, default=str))
+        if json.loads(output).get('success'):
+            result_cache.set(key, output)
+            with self._lock:
+                self.stats['executed'] += 1
+
+
+# Global shared instance, like data_loader
+prefetcher = Prefetcher()
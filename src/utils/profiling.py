@@ -0,0 +1,186 @@
+# Opt-in operator-level profiling for the tools' hot path.
+# A request is profiled when it asks for it ("profile": true in the plan / parameters)
+# or is picked by PROFILE_SAMPLE_RATE. While a profile is active, every
+#   with operator('filter', rows_in=...) as op: ... ; op.rows_out = ...
+# block records its wall time, input/output rows and the memory it allocated
+# (tracemalloc peak). The profile is attached to the tool result, printed to the trace,
+# and folded into `profile_report`, which keeps the slowest plan shapes.
+# Without an active profile, operator() is a shared no-op.
+
+import json
+import time
+import random
+import threading
+import tracemalloc
+from contextvars import ContextVar
+from typing import Optional
+from src.config import config
+
+_active: ContextVar[Optional["QueryProfile"]] = ContextVar('active_profile', default=None)
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+class _NoOp:
+    rows_in = None
+    rows_out = None
+
+    def __setattr__(self, name, value):
+        # shared by every thread, so it never keeps what callers assign
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoOp()
+
+
+class _Operator:
+    def __init__(self, profile: "QueryProfile", name: str, rows_in: Optional[int]):
+        self.profile = profile
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+    def __enter__(self):
+        if self.profile.trace_memory:
+            self._memory_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record = {'op': self.name, 'ms': round((time.perf_counter() - self._started) * 1000, 3)}
+        if self.rows_in is not None:
+            record['rows_in'] = int(self.rows_in)
+        if self.rows_out is not None:
+            record['rows_out'] = int(self.rows_out)
+        if self.profile.trace_memory:
+            record['alloc_kb'] = round(max(tracemalloc.get_traced_memory()[1] - self._memory_before, 0) / 1024, 1)
+        self.profile.operators.append(record)
+        return False
+
+
+class QueryProfile:
+    def __init__(self, tool: str, trace_memory: bool):
+        self.tool = tool
+        self.trace_memory = trace_memory
+        self.operators = []
+        self.started = time.perf_counter()
+
+    def to_dict(self) -> dict:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return {
+            'total_ms': round(total_ms, 3),
+            'other_ms': round(max(total_ms - sum(op['ms'] for op in self.operators), 0.0), 3),
+            'operators': self.operators,
+        }
+
+
+def begin(tool: str, requested: bool = False) -> Optional[QueryProfile]:
+    """Start profiling this request if it asked for it or the sampler picks it"""
+    global _tracing_users
+    if not requested and not (config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE):
+        return None
+    profile = QueryProfile(tool, config.PROFILE_TRACE_MEMORY)
+    if profile.trace_memory:
+        with _tracing_lock:
+            if _tracing_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _tracing_users += 1
+    profile._token = _active.set(profile)
+    return profile
+
+
+def end(profile: Optional[QueryProfile], shape: dict) -> Optional[dict]:
+    """Stop profiling; returns the profile to attach to the result"""
+    global _tracing_users
+    if profile is None:
+        return None
+    _active.reset(profile._token)
+    if profile.trace_memory:
+        with _tracing_lock:
+            _tracing_users -= 1
+            if _tracing_users == 0:
+                tracemalloc.stop()
+
+    result = profile.to_dict()
+    profile_report.record(profile.tool, shape, result)
+    if config.VERBOSE:
+        ops = ", ".join(f"{op['op']}={op['ms']:.1f}ms" for op in result['operators'])
+        print(f"  ⏱️ {profile.tool} {result['total_ms']:.1f}ms [{ops}]")
+    return result
+
+
+def operator(name: str, rows_in: Optional[int] = None):
+    """Time one operator of the active profile (no-op when nothing is being profiled)"""
+    profile = _active.get()
+    if profile is None:
+        return _NOOP
+    return _Operator(profile, name, rows_in)
+
+
+def plan_shape(plan: dict, access_path: str = None) -> dict:
+    """A plan without its literal values, so similar plans aggregate together"""
+    return {
+        'filters': sorted(f"{f.get('column')} {f.get('operator', '==')}" for f in plan.get('filters') or []),
+        'groupby': list(plan.get('groupby') or []),
+        'aggregations': sorted(f"{a.get('function')}({a.get('column')})" for a in plan.get('aggregations') or []),
+        'resample': (plan.get('resample') or {}).get('freq'),
+        'access_path': access_path,
+    }
+
+
+class ProfileReport:
+    """Per plan shape: how often it was profiled, how slow it was, and where the time went"""
+
+    def __init__(self):
+        self._shapes = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool: str, shape: dict, profile: dict):
+        key = json.dumps([tool, shape], sort_keys=True, default=str)
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                if len(self._shapes) >= config.PROFILE_REPORT_MAX_SHAPES:
+                    # Forget the least profiled shape
+                    del self._shapes[min(self._shapes, key=lambda k: self._shapes[k]['count'])]
+                entry = self._shapes[key] = {'tool': tool, 'shape': shape, 'count': 0,
+                                             'total_ms': 0.0, 'max_ms': 0.0, 'operators': {}}
+            entry['count'] += 1
+            entry['total_ms'] += profile['total_ms']
+            entry['max_ms'] = max(entry['max_ms'], profile['total_ms'])
+            for op in profile['operators']:
+                stats = entry['operators'].setdefault(op['op'], {'ms': 0.0, 'alloc_kb': 0.0})
+                stats['ms'] += op['ms']
+                stats['alloc_kb'] += op.get('alloc_kb', 0.0)
+
+    def slowest(self, n: int = 10) -> list:
+        """Plan shapes with the highest mean time, with the mean time and allocation per operator"""
+        with self._lock:
+            entries = [{**entry, 'operators': {k: dict(v) for k, v in entry['operators'].items()}}
+                       for entry in self._shapes.values()]
+        report = []
+        for entry in sorted(entries, key=lambda e: e['total_ms'] / e['count'], reverse=True)[:n]:
+            count = entry['count']
+            report.append({
+                'tool': entry['tool'],
+                'shape': entry['shape'],
+                'count': count,
+                'mean_ms': round(entry['total_ms'] / count, 3),
+                'max_ms': round(entry['max_ms'], 3),
+                'operators': {
+                    name: {'mean_ms': round(stats['ms'] / count, 3), 'mean_alloc_kb': round(stats['alloc_kb'] / count, 1)}
+                    for name, stats in sorted(entry['operators'].items(), key=lambda item: -item[1]['ms'])
+                },
+            })
+        return report
+
+
+# Global shared instance, like data_loader
+profile_report = ProfileReport()
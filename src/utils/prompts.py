@@ -8,14 +8,40 @@ def format_schema(schema: dict) -> str:
 
 SCHEMA_TEXT = format_schema(config.TRANSACTION_COLUMNS)
 
+
+# builds the schema text from the real dataset profile so values and ranges can't drift from the data
+def build_schema_text(profile: dict, max_values: int = 12) -> str:
+    lines = []
+    if profile.get('date_range'):
+        lines.append(f"Data covers {profile['rows']:,} transactions from {profile['date_range']['min']} to {profile['date_range']['max']}")
+
+    for col in profile['columns']:
+        desc = config.TRANSACTION_COLUMNS.get(col, '')
+        if col in profile['categorical'] and 'values' in profile['categorical'][col]:
+            values = [str(value) for value, _ in profile['categorical'][col]['values'][:max_values]]
+            more = len(profile['categorical'][col]['values']) - len(values)
+            detail = "values: " + ", ".join(values) + (f" (+{more} more)" if more > 0 else "")
+        elif col in profile['numeric']:
+            rng = profile['numeric'][col]
+            detail = f"range: {rng['min']:g} to {rng['max']:g}"
+        else:
+            detail = ""
+        text = "; ".join(part for part in (desc, detail) if part)
+        lines.append(f"- {col}: {text}" if text else f"- {col}")
+
+    # the prompt is a template, so literal braces must be escaped
+    return "\n".join(lines).replace("{", "{{").replace("}", "}}")
+
 # print(SCHEMA_TEXT)
 
 # PROMPT 1: Query Understanding
-QUERY_UNDERSTANDING_PROMPT = """You are an expert at understanding business questions about payment transaction data.
+_QUERY_UNDERSTANDING_HEADER = """You are an expert at understanding business questions about payment transaction data.
 
 
 Available Data Schema:
-""" + SCHEMA_TEXT + """
+"""
+
+_QUERY_UNDERSTANDING_BODY = """
 
 
 
@@ -57,6 +83,15 @@ Return your analysis as a JSON object with these exact keys:
 }}
 """
 
+QUERY_UNDERSTANDING_PROMPT = _QUERY_UNDERSTANDING_HEADER + SCHEMA_TEXT + _QUERY_UNDERSTANDING_BODY
+
+
+def build_query_understanding_prompt(profile: dict = None) -> str:
+    """Query understanding prompt with the schema taken from the dataset profile when available"""
+    if not profile:
+        return QUERY_UNDERSTANDING_PROMPT
+    return _QUERY_UNDERSTANDING_HEADER + build_schema_text(profile) + _QUERY_UNDERSTANDING_BODY
+
 
 
 # PROMPT 2: Planning
@@ -70,9 +105,15 @@ Create a detailed execution plan with these steps:
 1. **Filters to Apply**: List all WHERE conditions
 2. **Grouping Dimensions**: What columns to GROUP BY
 3. **Aggregations Needed**: What to calculate (COUNT, SUM, AVG, etc.)
-4. **Computations**: Any derived metrics (failure_rate = failed/total * 100)
+4. **Computations**: Any derived metrics, as formulas over the result (see below)
 5. **Sorting**: How to order results
 6. **Limit**: Top N results if applicable
+7. **Resample** (only for temporal/trend questions): bucket the timestamp by "minute", "hour", "day" or "week";
+   optional "window" (rolling window in buckets), "start" and "end" dates. Results include volume,
+   failure_rate, fraud_rate, rolling rates and period-over-period deltas per bucket.
+
+If the query understanding contains "previous_execution_plan" (a follow-up question), start from that
+plan and only change what the new question changes (e.g. swap a filter value, add a grouping).
 
 Return as JSON:
 {{
@@ -84,13 +125,75 @@ Return as JSON:
         {{"column": "transaction_id", "function": "count", "alias": "total_transactions"}}
     ],
     "computations": [
-        {{"name": "failure_rate", "formula": "failed_count / total_count * 100"}}
+        {{"name": "failure_rate", "formula": "count_where(transaction_status == 'FAILED') / count() * 100"}}
     ],
     "sort": {{"by": "total_transactions", "ascending": false}},
     "limit": 5
 }}
+
+Computation formulas are arithmetic (+ - * / **) over:
+- aggregation aliases, groupby columns and earlier computation names
+- row aggregates of data columns: count(), count(col), sum(col), mean(col), min(col), max(col), median(col), std(col), nunique(col)
+- conditional aggregates: count_where(cond), sum_where(col, cond), mean_where(col, cond), min_where(col, cond), max_where(col, cond)
+  where cond is  column == value  (also != > < >= <= in [...]) joined with "and"
+- pct(x, y) = x / y * 100, ratio(x, y), share(x [, groupby_col]) (% of total), rank(x [, groupby_col]) (1 = largest),
+  total(x [, groupby_col]), diff(x), pct_change(x), cumsum(x), round(x, digits), abs, sqrt, log
+e.g. average ticket size: "sum(amount_inr) / count()", share of volume: "share(total_amount)"
+
+For a trend question, add a resample block instead of time-of-day grouping, e.g.:
+{{
+    "filters": [],
+    "groupby": ["device_type"],
+    "resample": {{"freq": "day", "window": 7}}
+}}
+"""
+
+
+# PROMPT 1+2: Understanding and planning in a single structured-output call
+_UNDERSTAND_AND_PLAN_BODY = """
+
+
+
+Analyze the question and produce BOTH the query understanding and the execution plan.
+
+query_plan:
+- intent: one of descriptive, comparative, temporal, segmentation, correlation, risk_analysis, trend
+- entities: mentioned transaction_type, merchant_category, time_period, age_group, state, bank, device_type, network_type
+- metrics: what needs to be calculated (count, sum, average, percentage, failure_rate, fraud_rate, ...)
+- filters: conditions to apply
+- grouping: dimensions to group by
+- is_followup: whether the question builds on the conversation history
+
+execution_plan (column names must come from the schema above):
+- filters: [{{"column": ..., "operator": one of ==, !=, >, <, >=, <=, in, "value": ...}}]
+- groupby: columns to GROUP BY
+- aggregations: [{{"column": ..., "function": one of count, size, sum, mean, median, min, max, nunique, std, "alias": ...}}]
+- computations: derived metrics, e.g. {{"name": "failure_rate", "formula": "count_where(transaction_status == 'FAILED') / count() * 100"}}
+  formulas may use aggregation aliases, groupby columns, count()/sum(col)/mean(col)/..., count_where(cond)/sum_where(col, cond)/mean_where(col, cond),
+  pct(x, y), ratio(x, y), share(x [, groupby_col]), rank(x [, groupby_col]), total(x), diff(x), pct_change(x), round(x, n)
+- sort: {{"by": <alias, groupby column or computation name>, "ascending": true/false}} or null
+- limit: top N or null
+- resample: only for temporal/trend questions, {{"freq": "minute"|"hour"|"day"|"week", "window": 7}}, otherwise null
+If the history shows a previous plan and this is a follow-up, start from that plan and only change what the question changes.
+
+Return ONLY a JSON object of this shape:
+{{
+    "query_plan": {{"intent": "...", "entities": {{}}, "metrics": [], "filters": [], "grouping": [], "is_followup": false}},
+    "execution_plan": {{"filters": [], "groupby": [], "aggregations": [], "computations": [], "sort": null, "limit": null, "resample": null}}
+}}
 """
 
+UNDERSTAND_AND_PLAN_REPAIR_PROMPT = """That response failed validation:
+{error}
+
+Return the corrected JSON object only, with the same two keys "query_plan" and "execution_plan"."""
+
+
+def build_understand_and_plan_prompt(profile: dict = None) -> str:
+    """Single-call understanding + planning prompt, schema from the dataset profile when available"""
+    schema = build_schema_text(profile) if profile else SCHEMA_TEXT
+    return _QUERY_UNDERSTANDING_HEADER + schema + _UNDERSTAND_AND_PLAN_BODY
+
 
 # PROMPT 3: Insight Generation
 INSIGHT_GENERATION_PROMPT = """You are a senior business analyst explaining payment transaction insights to non-technical stakeholders.
@@ -0,0 +1,136 @@
+# This file defines the StratifiedSampler used by the approximate query mode:
+# Draws a sample stratified on the main dimensions once per dataset version
+# Guarantees a minimum number of rows per stratum so rare segments stay represented
+# Estimates counts, sums, means and rates (with confidence intervals) from the sample
+
+import pandas as pd
+import numpy as np
+from scipy import stats
+from typing import List, Optional, Tuple
+from src.config import config
+from src.utils.data_loader import data_loader
+
+
+class StratifiedSampler:
+    def __init__(self):
+        self._sample = None
+        self._strata = None
+        self._version = None
+
+    def get_sample(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Return (sample rows, per-stratum sizes), rebuilding when the dataset changes"""
+        if self._sample is None or self._version != data_loader.version:
+            self._build()
+            self._version = data_loader.version
+        return self._sample, self._strata
+
+    def _build(self):
+        """Draw the stratified sample with a vectorised per-stratum rank.
+        Only the strata columns are read in full; the sampled rows are gathered afterwards."""
+        strata_cols = [col for col in config.SAMPLE_STRATA if col in data_loader.get_schema().columns]
+        df = data_loader.read_columns(strata_cols)
+        stratum = df.groupby(strata_cols, observed=True, dropna=False).ngroup().to_numpy()
+
+        population = np.bincount(stratum)
+        target = np.ceil(population * config.SAMPLE_FRACTION).astype('int64')
+        target = np.minimum(population, np.maximum(target, config.SAMPLE_MIN_PER_STRATUM))
+
+        # Random order within each stratum, then keep the first `target` rows of each
+        rng = np.random.default_rng(config.SAMPLE_SEED)
+        order = np.lexsort((rng.random(len(df)), stratum))
+        starts = np.concatenate(([0], np.cumsum(population)[:-1]))
+        rank = np.empty(len(df), dtype='int64')
+        rank[order] = np.arange(len(df)) - np.repeat(starts, population)
+        keep = np.flatnonzero(rank < target[stratum])
+
+        self._sample = data_loader.take(keep).reset_index(drop=True)
+        self._sample['_stratum'] = stratum[keep]
+        self._strata = pd.DataFrame({
+            'population': population,
+            'sampled': target,
+        })
+        print(f"Built stratified sample: {len(keep):,} rows over {len(population):,} strata")
+
+    def estimate(self, sample: pd.DataFrame, mask: np.ndarray, groupby: List[str],
+                 measures: List[Tuple[str, str, Optional[pd.Series]]]) -> pd.DataFrame:
+        """Estimate measures per group from the sample.
+
+        `mask` marks sample rows that pass the query filters and each measure is
+        (alias, kind, values) with kind one of count / sum / mean. Every alias gets
+        `_ci_low` / `_ci_high` columns at the configured confidence level.
+        """
+        _, strata = self.get_sample()
+        z = stats.norm.ppf(0.5 + config.APPROX_CONFIDENCE / 2)
+
+        frame = pd.DataFrame({'_stratum': sample['_stratum'].to_numpy()})
+        frame['d'] = mask.astype('float64')
+        for col in groupby:
+            frame[col] = sample[col].to_numpy()
+
+        value_cols = []
+        for i, (alias, kind, values) in enumerate(measures):
+            if kind == 'count':
+                continue
+            y = np.nan_to_num(values.to_numpy(dtype='float64')) * frame['d'].to_numpy()
+            frame[f'y{i}'] = y
+            frame[f'yy{i}'] = y * y
+            value_cols += [f'y{i}', f'yy{i}']
+
+        # One grouped pass gives every per (group, stratum) moment we need
+        frame = frame[mask]
+        keys = groupby + ['_stratum']
+        moments = frame.groupby(keys, observed=True, dropna=True)[['d'] + value_cols].sum().reset_index()
+
+        n_h = strata['sampled'].to_numpy()[moments['_stratum']]
+        N_h = strata['population'].to_numpy()[moments['_stratum']]
+        expansion = N_h / n_h
+        variance_factor = np.where(n_h > 1, N_h ** 2 * (1 - n_h / N_h) / (n_h * np.maximum(n_h - 1, 1)), 0)
+
+        def stratum_variance(s, ss):
+            # Stratum contribution to the variance of an expanded total (rows outside the group count as 0)
+            return variance_factor * (ss - s ** 2 / n_h)
+
+        parts = pd.DataFrame({col: moments[col] for col in groupby})
+        parts['d_total'] = expansion * moments['d']
+        parts['d_var'] = stratum_variance(moments['d'], moments['d'])
+        for i, (alias, kind, values) in enumerate(measures):
+            if kind == 'count':
+                continue
+            parts[f'y{i}_total'] = expansion * moments[f'y{i}']
+            parts[f'y{i}_var'] = stratum_variance(moments[f'y{i}'], moments[f'yy{i}'])
+
+        grouped = parts.groupby(groupby, observed=True) if groupby else None
+        totals = grouped.sum(numeric_only=True).reset_index() if groupby else parts.sum(numeric_only=True).to_frame().T
+
+        result = totals[groupby].copy() if groupby else pd.DataFrame(index=[0])
+        for i, (alias, kind, values) in enumerate(measures):
+            if kind == 'count':
+                estimate, se = totals['d_total'], np.sqrt(totals['d_var'])
+            elif kind == 'sum':
+                estimate, se = totals[f'y{i}_total'], np.sqrt(totals[f'y{i}_var'])
+            else:
+                # Ratio estimator with linearised variance: e = y - R * d (y is already zero where d is)
+                ratio = totals[f'y{i}_total'] / totals['d_total']
+                r_h = ratio.to_numpy()[self._group_index(parts, totals, groupby)]
+                e_sum = moments[f'y{i}'] - r_h * moments['d']
+                e_sq = moments[f'yy{i}'] - 2 * r_h * moments[f'y{i}'] + r_h ** 2 * moments['d']
+                e_var = pd.Series(stratum_variance(e_sum, e_sq), index=parts.index)
+                e_var = e_var.groupby([parts[col] for col in groupby], observed=True).sum().to_numpy() if groupby else e_var.sum()
+                estimate, se = ratio, np.sqrt(e_var) / totals['d_total']
+
+            result[alias] = np.asarray(estimate, dtype='float64')
+            result[f'{alias}_ci_low'] = np.asarray(estimate - z * se, dtype='float64')
+            result[f'{alias}_ci_high'] = np.asarray(estimate + z * se, dtype='float64')
+
+        return result
+
+    def _group_index(self, parts: pd.DataFrame, totals: pd.DataFrame, groupby: List[str]) -> np.ndarray:
+        """Position of each (group, stratum) row's group inside `totals`"""
+        if not groupby:
+            return np.zeros(len(parts), dtype='int64')
+        lookup = pd.MultiIndex.from_frame(totals[groupby])
+        return lookup.get_indexer(pd.MultiIndex.from_frame(parts[groupby]))
+
+
+# Global shared instance, like data_loader
+stratified_sampler = StratifiedSampler()
@@ -0,0 +1,56 @@
+# Streaming summaries used for approximate answers over very large group cardinalities.
+# SpaceSaving keeps a bounded set of counters and reports how far each count can be off,
+# so "top N" questions can be answered without materialising every group.
+
+import numpy as np
+import pandas as pd
+
+
+class SpaceSaving:
+    """Mergeable Space-Saving summary over integer keys.
+
+    Invariants after every update:
+    - a monitored key's true count lies in [count - error, count]
+    - an unmonitored key's true count is at most `floor`
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype='int64')
+        self.errors = pd.Series(dtype='int64')
+        self.floor = 0
+        self.total = 0
+
+    def update(self, keys: np.ndarray, counts: np.ndarray = None):
+        """Fold a chunk of keys (or pre-counted keys) into the summary"""
+        if counts is None:
+            keys, counts = np.unique(keys, return_counts=True)
+        if len(keys) == 0:
+            return
+
+        chunk = pd.Series(counts.astype('int64'), index=keys)
+        self.total += int(chunk.sum())
+
+        # Keys we were not tracking may have been evicted with up to `floor` occurrences
+        is_new = ~chunk.index.isin(self.counts.index)
+        new_errors = pd.Series(self.floor, index=chunk.index[is_new], dtype='int64')
+
+        self.counts = self.counts.add(chunk, fill_value=0).astype('int64')
+        self.counts.loc[new_errors.index] += self.floor
+        self.errors = pd.concat([self.errors, new_errors])
+
+        if len(self.counts) > self.capacity:
+            ranked = self.counts.sort_values(ascending=False, kind='stable')
+            dropped = ranked.iloc[self.capacity:]
+            self.floor = max(self.floor, int(dropped.max()))
+            self.counts = ranked.iloc[:self.capacity]
+            self.errors = self.errors.loc[self.counts.index]
+
+    def top(self, k: int) -> pd.DataFrame:
+        """Top-k keys by estimated count with their per-key error"""
+        best = self.counts.nlargest(k)
+        return pd.DataFrame({
+            'key': best.index,
+            'count': best.to_numpy(),
+            'error': self.errors.loc[best.index].to_numpy(),
+        })
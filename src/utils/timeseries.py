@@ -0,0 +1,239 @@
+# This file defines the TimeSeriesEngine used for `temporal` and `trend` questions:
+# Buckets the sorted timestamp column into minute / hour / day / week periods
+# Keeps additive per-bucket partial aggregates (total, failed, flagged, amount)
+# Derives rates, rolling-window rates and period-over-period deltas from them
+# Caches the partials so repeated trend queries over the same window are near-instant
+# Timestamp range filters narrow the (time-ordered) rows to one contiguous range before bucketing
+
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Tuple
+from src.config import config
+from src.utils.data_loader import data_loader
+
+FREQUENCIES = {
+    'minute': 'min',
+    'hour': 'h',
+    'day': 'D',
+    'week': 'W',
+}
+
+# Only equality-style filters can be applied on top of the pre-aggregated partials
+SUPPORTED_OPERATORS = ('==', '!=', 'in')
+# Timestamp filters become a row range of the (time-ordered) data instead
+TIMESTAMP_OPERATORS = ('>', '>=', '<', '<=')
+# Columns the partial aggregates are built from (plus the segment / filter dimensions)
+PARTIAL_COLUMNS = ['timestamp', 'transaction_status', 'fraud_flag', 'amount_inr']
+
+
+class TimeSeriesEngine:
+    def __init__(self):
+        # (dataset version, freq, dimensions) -> per-bucket partial aggregates
+        self._partials: Dict[Tuple, pd.DataFrame] = {}
+
+    def _bucket(self, timestamps: pd.Series, freq: str) -> pd.Series:
+        """Floor timestamps to the start of their bucket"""
+        if freq == 'week':
+            days = timestamps.dt.floor('D')
+            return days - pd.to_timedelta(days.dt.dayofweek, unit='D')
+        return timestamps.dt.floor(FREQUENCIES[freq])
+
+    def get_partials(self, freq: str, dimensions: List[str], time_filters: List[dict] = None) -> pd.DataFrame:
+        """Per-bucket (and per-dimension) partial aggregates, computed once per dataset version.
+        Timestamp range filters are aggregated on demand (only their rows) and not cached."""
+        columns = list(dict.fromkeys(PARTIAL_COLUMNS + dimensions))
+        if time_filters:
+            return self._aggregate(self._time_range(time_filters, columns), freq, dimensions)
+
+        key = (data_loader.version, freq, tuple(dimensions))
+        if key not in self._partials:
+            # Drop partials that belong to an older dataset version
+            self._partials = {k: v for k, v in self._partials.items() if k[0] == data_loader.version}
+            self._partials[key] = self._aggregate(data_loader.read_columns(columns), freq, dimensions)
+
+        return self._partials[key]
+
+    def _aggregate(self, df: pd.DataFrame, freq: str, dimensions: List[str]) -> pd.DataFrame:
+        frame = pd.DataFrame({
+            'bucket': self._bucket(df['timestamp'], freq),
+            'failed': (df['transaction_status'] == 'FAILED').astype('int64'),
+            'flagged': df['fraud_flag'].astype('int64'),
+            'amount_sum': df['amount_inr'].fillna(0),
+        })
+        for dim in dimensions:
+            frame[dim] = df[dim]
+
+        return (
+            frame.groupby(['bucket'] + dimensions, observed=True, dropna=False)
+            .agg(
+                total=('failed', 'size'),
+                failed=('failed', 'sum'),
+                flagged=('flagged', 'sum'),
+                amount_sum=('amount_sum', 'sum'),
+            )
+            .reset_index()
+        )
+
+    def _time_range(self, filters: List[dict], columns: List[str]) -> pd.DataFrame:
+        """Rows passing the timestamp range filters, only `columns`"""
+        bounds = []
+        for filter_cond in filters:
+            operator = filter_cond.get('operator', '==')
+            if operator not in TIMESTAMP_OPERATORS:
+                raise ValueError(f"Trend timestamp filters support {TIMESTAMP_OPERATORS}, got '{operator}'")
+            try:
+                bounds.append((operator, pd.Timestamp(filter_cond['value'])))
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid timestamp filter value '{filter_cond['value']}'")
+
+        if data_loader.is_partitioned:
+            # Partitions outside the range are never opened (the mask keeps this exact either way)
+            frame = data_loader.read_columns(columns, [
+                {'column': 'timestamp', 'operator': operator, 'value': value.isoformat()} for operator, value in bounds
+            ])
+            mask = np.ones(len(frame), dtype=bool)
+            for operator, value in bounds:
+                mask &= {'>': frame['timestamp'] > value, '>=': frame['timestamp'] >= value,
+                         '<': frame['timestamp'] < value, '<=': frame['timestamp'] <= value}[operator].to_numpy()
+            return frame[mask]
+
+        # Rows are kept in time order, so the range is one contiguous slice (NaT rows sort last)
+        timestamps = data_loader.read_columns(['timestamp'])['timestamp']
+        low, high = 0, int(timestamps.notna().sum())
+        valid = timestamps.iloc[:high]
+        for operator, value in bounds:
+            if operator in ('>', '>='):
+                low = max(low, int(valid.searchsorted(value, side='right' if operator == '>' else 'left')))
+            else:
+                high = min(high, int(valid.searchsorted(value, side='right' if operator == '<=' else 'left')))
+        return data_loader.take(np.arange(low, max(low, high)), columns)
+
+    def _apply_filters(self, partials: pd.DataFrame, filters: List[dict]) -> pd.DataFrame:
+        """Apply dimension filters on the partial aggregates instead of the raw rows"""
+        mask = np.ones(len(partials), dtype=bool)
+        for filter_cond in filters:
+            col = filter_cond['column']
+            operator = filter_cond.get('operator', '==')
+            value = filter_cond['value']
+
+            if operator == '==':
+                mask &= (partials[col] == value).to_numpy()
+            elif operator == '!=':
+                mask &= (partials[col] != value).to_numpy()
+            elif operator == 'in':
+                mask &= partials[col].isin(value).to_numpy()
+        return partials[mask]
+
+    def trend(self, params: dict) -> dict:
+        """Resample to time buckets and compute rates, rolling rates and deltas"""
+        freq = params.get('freq', config.TREND_DEFAULT_FREQ)
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Unsupported freq '{freq}', choose from {list(FREQUENCIES)}")
+
+        window = int(params.get('window', config.TREND_DEFAULT_WINDOW))
+        max_points = int(params.get('max_points', config.TREND_MAX_POINTS))
+
+        segment = params.get('segment_by') or []
+        if isinstance(segment, str):
+            segment = [segment]
+
+        filters = [f for f in params.get('filters', []) if f['column'] != 'timestamp']
+        time_filters = [f for f in params.get('filters', []) if f['column'] == 'timestamp']
+        for filter_cond in filters:
+            if filter_cond.get('operator', '==') not in SUPPORTED_OPERATORS:
+                raise ValueError(f"Trend filters support {SUPPORTED_OPERATORS}, got '{filter_cond.get('operator')}'")
+
+        # Filter columns become extra dimensions of the partials so they can be applied post-aggregation
+        dimensions = list(dict.fromkeys(segment + sorted({f['column'] for f in filters})))
+        partials = self._apply_filters(self.get_partials(freq, dimensions, time_filters), filters)
+
+        if params.get('start'):
+            partials = partials[partials['bucket'] >= pd.Timestamp(params['start'])]
+        if params.get('end'):
+            partials = partials[partials['bucket'] <= pd.Timestamp(params['end'])]
+
+        # Collapse the filter-only dimensions back down to the requested segments
+        series = (
+            partials.groupby(segment + ['bucket'], observed=True, dropna=False)
+            [['total', 'failed', 'flagged', 'amount_sum']]
+            .sum()
+        )
+        series = self._fill_missing_buckets(series, segment, freq)
+        series = self._derive_metrics(series, segment, window)
+
+        if segment:
+            truncated = bool((series.groupby(segment, observed=True, dropna=False).size() > max_points).any())
+            series = series.groupby(segment, observed=True, dropna=False).tail(max_points)
+        else:
+            truncated = len(series) > max_points
+            series = series.tail(max_points)
+
+        series['bucket'] = series['bucket'].astype(str)
+        return {
+            'freq': freq,
+            'window': window,
+            'segment_by': segment,
+            'points': len(series),
+            'truncated': truncated,
+            'series': series.replace({np.nan: None}).to_dict('records'),
+        }
+
+    def _fill_missing_buckets(self, series: pd.DataFrame, segment: List[str], freq: str) -> pd.DataFrame:
+        """Insert empty buckets so rolling windows span real time, not just active buckets"""
+        if series.empty:
+            return series.reset_index()
+
+        buckets = series.index.get_level_values('bucket')
+        step = pd.Timedelta(weeks=1) if freq == 'week' else pd.Timedelta(1, unit=FREQUENCIES[freq])
+        full_range = pd.date_range(buckets.min(), buckets.max(), freq=step)
+
+        if segment:
+            segments = series.index.droplevel('bucket').unique()
+            if len(segment) == 1:
+                full_index = pd.MultiIndex.from_product([segments, full_range], names=segment + ['bucket'])
+            else:
+                # Observed segment combinations only (a product of the levels would invent new ones),
+                # each repeated over the full range: built from arrays, never per-row tuples
+                full_index = pd.MultiIndex.from_arrays(
+                    [segments.get_level_values(i).repeat(len(full_range)) for i in range(segments.nlevels)]
+                    + [full_range[np.tile(np.arange(len(full_range)), len(segments))]],
+                    names=segment + ['bucket']
+                )
+        else:
+            full_index = pd.Index(full_range, name='bucket')
+
+        return series.reindex(full_index, fill_value=0).reset_index()
+
+    def _derive_metrics(self, series: pd.DataFrame, segment: List[str], window: int) -> pd.DataFrame:
+        """Turn additive partials into rates, rolling rates and period-over-period deltas"""
+        total = series['total'].replace(0, np.nan)
+        series['failure_rate'] = series['failed'] / total * 100
+        series['fraud_rate'] = series['flagged'] / total * 100
+        series['avg_amount'] = series['amount_sum'] / total
+
+        grouped = series.groupby(segment, observed=True, dropna=False) if segment else None
+
+        def rolling_sum(col):
+            if grouped is None:
+                return series[col].rolling(window, min_periods=1).sum()
+            return grouped[col].transform(lambda s: s.rolling(window, min_periods=1).sum())
+
+        def previous(col):
+            return series[col].shift(1) if grouped is None else grouped[col].shift(1)
+
+        rolling_total = rolling_sum('total').replace(0, np.nan)
+        series['rolling_failure_rate'] = rolling_sum('failed') / rolling_total * 100
+        series['rolling_fraud_rate'] = rolling_sum('flagged') / rolling_total * 100
+
+        previous_total = previous('total').replace(0, np.nan)
+        series['total_delta_pct'] = (series['total'] - previous_total) / previous_total * 100
+        series['failure_rate_delta'] = series['failure_rate'] - previous('failure_rate')
+        series['fraud_rate_delta'] = series['fraud_rate'] - previous('fraud_rate')
+
+        numeric = series.select_dtypes('number').columns
+        series[numeric] = series[numeric].round(4)
+        return series
+
+
+# Global shared instance, like data_loader
+timeseries_engine = TimeSeriesEngine()
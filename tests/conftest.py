@@ -0,0 +1,34 @@
+# Shared fixtures: one small synthetic dataset (benchmarks/synthetic_data.py), written as a single
+# csv and as monthly partitions, and a helper that points the DataLoader singleton at one backend
+
+import pytest
+
+from benchmarks.synthetic_data import generate
+from src.config import config
+from src.utils.data_loader import data_loader
+
+ROWS = 20_000
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp("data")
+    paths = generate(ROWS, str(out_dir), formats=("csv", "partitioned"), chunk_rows=2_000)
+    config.CACHE_ENABLED = False
+    config.QUERY_MODE = "exact"
+    return {'csv': paths['csv'], 'partitioned': paths['partitioned'], 'cache_dir': str(out_dir / ".cache")}
+
+
+@pytest.fixture
+def use_backend(dataset, monkeypatch):
+    """use_backend('pandas' | 'columnar' | 'partitioned'): reopen the dataset that way"""
+    def use(backend: str):
+        monkeypatch.setattr(config, 'DATA_PATH', dataset['partitioned'] if backend == 'partitioned' else dataset['csv'])
+        monkeypatch.setattr(config, 'STORAGE_BACKEND', 'columnar' if backend == 'columnar' else 'pandas')
+        monkeypatch.setattr(config, 'CACHE_DIR', dataset['cache_dir'])
+        for attr in ('_df', '_version', '_profile', '_column_store', '_partitions'):
+            setattr(data_loader, attr, None)
+        data_loader._indexes = {}
+        data_loader.open()
+        return data_loader
+    return use
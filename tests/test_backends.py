@@ -0,0 +1,134 @@
+import json
+
+import pandas as pd
+import pytest
+
+from src.config import config
+from src.tools.data_tools import DataQueryTool
+
+BACKENDS = ['pandas', 'columnar', 'partitioned']
+FAILURE_RATE = "count_where(transaction_status == 'FAILED') / count() * 100"
+
+PLANS = {
+    'groupby': {
+        'groupby': ['device_type'],
+        'aggregations': [{'column': 'amount_inr', 'function': 'sum'},
+                         {'column': 'transaction_id', 'function': 'count', 'alias': 'transactions'}],
+    },
+    'filters': {
+        'filters': [{'column': 'sender_state', 'operator': '==', 'value': 'Delhi'},
+                    {'column': 'network_type', 'operator': 'in', 'value': ['4G', '5G']},
+                    {'column': 'amount_inr', 'operator': '>', 'value': 1000}],
+        'groupby': ['transaction_type'],
+        'aggregations': [{'column': 'amount_inr', 'function': 'mean'},
+                         {'column': 'amount_inr', 'function': 'max'}],
+    },
+    'time_range': {
+        'filters': [{'column': 'timestamp', 'operator': '>=', 'value': '2024-11-01'},
+                    {'column': 'timestamp', 'operator': '<', 'value': '2024-12-15'}],
+        'groupby': ['sender_bank', 'network_type'],
+        'aggregations': [{'column': 'transaction_id', 'function': 'count', 'alias': 'transactions'}],
+    },
+    'computations': {
+        'groupby': ['network_type'],
+        'aggregations': [{'column': 'transaction_id', 'function': 'count', 'alias': 'transactions'}],
+        'computations': [{'name': 'failure_rate', 'formula': FAILURE_RATE},
+                         {'name': 'rate_rank', 'formula': 'rank(failure_rate)'}],
+        'sort': {'by': 'failure_rate', 'ascending': False},
+    },
+    'where': {
+        'groupby': ['device_type'],
+        'aggregations': [{'column': 'transaction_id', 'function': 'count', 'alias': 'failed',
+                          'where': {'column': 'transaction_status', 'operator': '==', 'value': 'FAILED'}}],
+    },
+    'sort_limit': {
+        'filters': [{'column': 'transaction_type', 'operator': '==', 'value': 'P2M'}],
+        'sort': {'by': 'amount_inr', 'ascending': False},
+        'limit': 7,
+    },
+}
+
+
+def run(plan: dict) -> dict:
+    result = json.loads(DataQueryTool().execute_query(json.dumps(dict(plan, mode='exact'))))
+    assert result['success'], result.get('error')
+    return result
+
+
+def as_frame(result: dict, plan: dict) -> pd.DataFrame:
+    df = pd.DataFrame(result['data'], columns=result['columns'])
+    if not plan.get('sort'):
+        df = df.sort_values(list(plan['groupby'])).reset_index(drop=True)
+    if not plan.get('groupby'):
+        df = df[['transaction_id', 'amount_inr', 'transaction_type']]
+    return df
+
+
+@pytest.mark.parametrize('name', list(PLANS))
+def test_backends_return_the_same_result(use_backend, name):
+    plan = PLANS[name]
+    results = {}
+    for backend in BACKENDS:
+        use_backend(backend)
+        results[backend] = as_frame(run(plan), plan)
+
+    assert len(results['pandas']) > 0
+    for backend in BACKENDS[1:]:
+        pd.testing.assert_frame_equal(results[backend], results['pandas'], check_dtype=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('dense_keys', [10_000_000, 0])
+def test_top_groups_by_count_match_the_groupby(use_backend, monkeypatch, backend, dense_keys):
+    # dense_keys=0 forces the Space-Saving summary; it has room for every group here, so it is exact too
+    monkeypatch.setattr(config, 'HEAVY_HITTER_DENSE_KEYS', dense_keys)
+    use_backend(backend)
+    plan = {
+        # (the amount filter keeps cubes built by other tests from answering)
+        'filters': [{'column': 'transaction_type', 'operator': '!=', 'value': 'Recharge'},
+                    {'column': 'amount_inr', 'operator': '>', 'value': 100}],
+        'groupby': ['sender_state', 'sender_bank', 'network_type'],
+        'aggregations': [{'column': 'transaction_id', 'function': 'count', 'alias': 'transactions'}],
+        'sort': {'by': 'transactions', 'ascending': False},
+        'limit': 10,
+    }
+    exact = run(dict(plan, topk_mode='exact'))
+    top = run(dict(plan, topk_mode='heavy_hitters'))
+    assert top['method'] == ('bincount' if dense_keys else 'space_saving')
+    counts = lambda result: [row['transactions'] for row in result['data']]
+    assert counts(top) == counts(exact)
+    assert {row['sender_state'] for row in top['data']} == {row['sender_state'] for row in exact['data']}
+
+
+def test_sort_limit_pages_the_top_rows(use_backend):
+    use_backend('pandas')
+    result = run(PLANS['sort_limit'])
+    amounts = [row['amount_inr'] for row in result['data']]
+    assert len(amounts) == 7 and amounts == sorted(amounts, reverse=True)
+
+
+@pytest.mark.parametrize('filters, months', [
+    ([{'column': 'timestamp', 'operator': '>=', 'value': '2024-11-01'}], ['2024-11', '2024-12']),
+    ([{'column': 'timestamp', 'operator': '>=', 'value': '2024-03-10'},
+      {'column': 'timestamp', 'operator': '<=', 'value': '2024-03-20'}], ['2024-03']),
+    ([{'column': 'timestamp', 'operator': '<', 'value': '2023-06-01'}], []),
+    ([{'column': 'device_type', 'operator': '==', 'value': 'Web'}], None),
+])
+def test_partition_pruning_counts(use_backend, filters, months):
+    loader = use_backend('partitioned')
+    catalog = loader.get_partitions()
+    files, rows = {}, {}
+    for partition in catalog.partitions:
+        month = partition.keys['dt']
+        files[month] = files.get(month, 0) + 1
+        rows[month] = rows.get(month, 0) + partition.rows
+    assert len(files) == 12
+    expected = sorted(files) if months is None else months
+
+    result = run({'filters': filters, 'groupby': ['device_type'],
+                  'aggregations': [{'column': 'transaction_id', 'function': 'count', 'alias': 'transactions'}]})
+    partitions = result['optimizer']['partitions']
+    assert result['optimizer']['access_path'] == 'partitions'
+    assert partitions['total'] == len(catalog.partitions)
+    assert partitions['scanned'] == sum(files[month] for month in expected)
+    assert partitions['rows'] == sum(rows[month] for month in expected)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.expressions import ExpressionError, MAX_EXPONENT, apply_computations, compile_computation
+
+RESULT_COLUMNS = ['device_type', 'transactions', 'amount']
+DATA_COLUMNS = ['transaction_id', 'device_type', 'transaction_status', 'amount_inr', 'fraud_flag']
+
+
+def compile_formula(formula: str, hidden: dict = None):
+    return compile_computation({'name': 'value', 'formula': formula}, RESULT_COLUMNS, DATA_COLUMNS,
+                               {} if hidden is None else hidden)
+
+
+def result_frame() -> pd.DataFrame:
+    return pd.DataFrame({'device_type': ['Android', 'iOS', 'Web'], 'transactions': [10, 4, 0],
+                         'amount': [250.0, 100.0, 0.0]})
+
+
+@pytest.mark.parametrize('formula', [
+    "__import__('os')",
+    "open('x')",
+    "transactions.real",
+    "amount[0]",
+    "(lambda: 1)()",
+    "[transactions]",
+    "transactions if amount else 0",
+    "transactions > 1",
+    "'text'",
+    "round(amount, digits=2)",
+    "getattr(amount, 'sum')()",
+    "amount_inr * 2",
+    "unknown_name + 1",
+])
+def test_rejects_disallowed_syntax_and_calls(formula):
+    with pytest.raises(ExpressionError):
+        compile_formula(formula)
+
+
+@pytest.mark.parametrize('formula', [
+    "9 ** 9 ** 9",
+    "amount ** transactions",
+    f"amount ** {MAX_EXPONENT + 1}",
+    f"amount ** -{MAX_EXPONENT + 1}",
+    "2 ** 0.5 ** 100",
+])
+def test_power_needs_a_small_literal_exponent(formula):
+    with pytest.raises(ExpressionError):
+        compile_formula(formula)
+
+
+def test_power_with_small_exponent_evaluates():
+    computation = compile_formula(f"transactions ** 2 + 2 ** -{MAX_EXPONENT}")
+    values = computation.evaluate(result_frame())
+    assert np.allclose(values, [100 + 2 ** -MAX_EXPONENT, 16 + 2 ** -MAX_EXPONENT, 2 ** -MAX_EXPONENT])
+
+
+def test_huge_constants_overflow_to_nan_not_python_ints():
+    values = compile_formula("1e308 * 1e308 + transactions").evaluate(result_frame())
+    assert values.isna().all()
+
+
+def test_round_digits_must_be_a_literal():
+    with pytest.raises(ExpressionError):
+        compile_formula("round(amount, transactions)")
+    with pytest.raises(ExpressionError):
+        compile_formula("round(amount, 1.5)")
+    values = compile_formula("round(amount / 3, 1)").evaluate(result_frame())
+    assert values.tolist() == [83.3, 33.3, 0.0]
+
+
+def test_division_by_zero_is_nan():
+    values = compile_formula("amount / transactions").evaluate(result_frame())
+    assert values.tolist()[:2] == [25.0, 25.0] and np.isnan(values.iloc[2])
+
+
+def test_row_aggregates_become_shared_hidden_aggregations():
+    hidden = {}
+    rate = compile_formula("count_where(transaction_status == 'FAILED') / count() * 100", hidden)
+    share = compile_computation({'name': 'failed_share', 'formula': "share(count_where(transaction_status == 'FAILED'))"},
+                                RESULT_COLUMNS + ['value'], DATA_COLUMNS, hidden)
+    assert len(hidden) == 2
+    assert {'column': 'transaction_id', 'function': 'size', 'where': []} in \
+        [{k: agg[k] for k in ('column', 'function', 'where')} for agg in hidden.values()]
+
+    aliases = {agg['function'] + str(bool(agg['where'])): agg['alias'] for agg in hidden.values()}
+    df = result_frame().assign(**{aliases['sizeTrue']: [2, 1, 0], aliases['sizeFalse']: [10, 4, 0]})
+    out = apply_computations(df, [rate, share])
+    assert list(out.columns) == RESULT_COLUMNS + ['value', 'failed_share']
+    assert out['value'].tolist()[:2] == [20.0, 25.0]
+    assert np.allclose(out['failed_share'], [200 / 3, 100 / 3, 0])